@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, print_function, unicode_literals
+import hashlib
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
+
+logger = logging.getLogger(__name__)
+
+
+def read_repos(lines):
+    """
+    Reads repository names, one per line. Blank lines and comments are skipped.
+    :param lines: iterable of strings, e.g. a file
+    :return: generator of repository names
+    """
+    for line in lines:
+        line = line.split("#", 1)[0].strip()
+        if line:
+            yield line
+
+
+def parse_shard(shard):
+    """
+    Parses a shard given as `i/N`, the i-th of N shards counting from 0.
+    :return: tuple (i, N)
+    """
+    try:
+        index, count = (int(part) for part in shard.split("/"))
+    except ValueError:
+        raise ValueError("Shard {} is not of the form i/N".format(shard))
+    if not 0 <= index < count:
+        raise ValueError("Shard {} is out of range, expected 0 <= i < N".format(shard))
+    return index, count
+
+
+def in_shard(repos, index, count):
+    """
+    Filters repositories down to the ones assigned to shard `index` of `count`. The
+    assignment depends on the name of the repository only, every node gets the same answer
+    no matter in which order or from which list it reads the repositories.
+    """
+    for repo in repos:
+        digest = hashlib.sha1(repo.encode("utf-8")).hexdigest()
+        if int(digest, 16) % count == index:
+            yield repo
+
+
+def update_repo(create_bot, repo, **kwargs):
+    """
+    Runs `Bot.update` for a single repository. Errors are reported in the result instead of
+    being raised, so that one broken repository doesn't stop the batch.
+    :param create_bot: callable taking the repository name and returning a Bot
+    :param repo: string, name of the repository
+    :param kwargs: passed to `Bot.update`
+    :return: dict, JSON compatible result
+    """
+    started_at = time.time()
+    result = {"repo": repo}
+    try:
+        bot = create_bot(repo)
+        bundle = bot.update(**kwargs)
+        result.update(
+            ok=True,
+            skipped=bot.skipped,
+            postponed=bot.postponed,
+            **bundle.as_dict()
+        )
+    except Exception as e:
+        logger.error("Unable to update {}".format(repo), exc_info=True)
+        result.update(ok=False, error="{}: {}".format(e.__class__.__name__, e))
+    result["seconds"] = round(time.time() - started_at, 3)
+    return result
+
+
+def run(create_bot, repos, workers=4, **kwargs):
+    """
+    Updates many repositories in this process, `workers` of them at a time. All bots share the
+    package, vulnerability, hash and changelog caches in `pyup.cache` and the provider clients.
+    :param create_bot: callable taking the repository name and returning a Bot
+    :param repos: iterable of repository names
+    :param workers: int, number of repositories updated concurrently
+    :param kwargs: passed to `Bot.update`
+    :return: generator of results as returned by `update_repo`, in the order they finish in
+    """
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(update_repo, create_bot, repo, **kwargs) for repo in repos]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def run_queue(create_bot, queue, worker, workers=4, **kwargs):
+    """
+    Updates repositories claimed from `queue` until there are none left, `workers` of them at
+    a time. Leases of running repositories are renewed while they are updated and each one is
+    released with its result.
+    :param queue: pyup.jobs.JobQueue
+    :param worker: string identifying this worker
+    :return: generator of results as returned by `update_repo`, in the order they finish in
+    """
+    running = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while True:
+            while len(running) < workers:
+                repo = queue.claim(worker)
+                if repo is None:
+                    break
+                running[executor.submit(update_repo, create_bot, repo, **kwargs)] = repo
+            if not running:
+                return
+            done, _ = wait(running, timeout=queue.lease / 3, return_when=FIRST_COMPLETED)
+            for future in done:
+                repo = running.pop(future)
+                result = future.result()
+                queue.release(repo, worker, result)
+                yield result
+            queue.heartbeat(worker, running.values())
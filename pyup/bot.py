@@ -1,16 +1,28 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import, print_function, unicode_literals
+import json
 import logging
 import yaml
-from .requirements import RequirementsBundle
+from datetime import datetime, timedelta
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pyup import settings, cache
+from .package import fetch_package
+from .requirements import RequirementsBundle, Requirement
 from .providers.github import Provider as GithubProvider
-from .errors import NoPermissionError, BranchExistsError, ConfigError
+from .errors import NoPermissionError, BranchExistsError, ConfigError, BranchDoesNotExistError
 from .config import Config
+from .webhooks import parse_push_event
+from .dependents import get_index
 
 logger = logging.getLogger(__name__)
 
 
 class Bot(object):
+    # rough number of API calls it takes to open a pull request: branch, commits, the pull
+    # request itself, labels and assignees
+    API_CALLS_PER_PULL_REQUEST = 10
+
     def __init__(self, repo, user_token, bot_token=None,
                  provider=GithubProvider, bundle=RequirementsBundle, config=Config,
                  integration=False, provider_url=None, ignore_ssl=False):
@@ -19,6 +31,8 @@ class Bot(object):
         self.user_token = user_token
         self.bot_token = bot_token
         self.fetched_files = []
+        # path -> future of a requirement file fetched while the tree is still being walked
+        self._prefetched_files = OrderedDict()
         self.repo_name = repo
 
         self._user = None
@@ -26,9 +40,16 @@ class Bot(object):
         self._bot = None
         self._bot_repo = None
         self.config = config()
+        self.config_branch = None
         self.write_config = {}
 
         self._fetched_prs = False
+        self._branches = None
+        self._base_sha = None
+        # titles of updates skipped because the API budget ran out
+        self.postponed = []
+        # set if the run was skipped because nothing changed since the last one
+        self.skipped = False
 
         self.integration = integration
 
@@ -56,19 +77,80 @@ class Bot(object):
             self._bot_repo = self.provider.get_repo(token=self.bot_token, name=self.repo_name)
         return self._bot_repo
 
+    @property
+    def branches(self):
+        """
+        The bot branches on the repo, listed once per run and kept up to date as branches are
+        created and deleted.
+        :return: dict, branch name -> head sha
+        """
+        if self._branches is None:
+            self._branches = dict(
+                self.provider.iter_branches(self.user_repo, self.config.branch_prefix))
+        return self._branches
+
+    @property
+    def base_sha(self):
+        """
+        Head sha of the base branch, resolved once per run.
+        """
+        if self._base_sha is None:
+            self._base_sha = self.provider.get_branch_sha(self.user_repo, self.config.branch)
+        return self._base_sha
+
     @property
     def pull_requests(self):
         if not self._fetched_prs:
             self.req_bundle.pull_requests = [
-                pr for pr in self.provider.iter_issues(
-                    repo=self.user_repo,
-                    creator=self.bot if self.bot_token else self.user
-                )
-                if pr.is_valid
+                pr for pr in self.sync_pull_requests() if pr.is_valid
             ]
             self._fetched_prs = True
         return self.req_bundle.pull_requests
 
+    def sync_pull_requests(self):
+        """
+        Lists the open pull requests of the bot. With a cache dir configured, a mirror of them
+        is kept between runs and only pull requests that changed since the last sync are
+        fetched.
+        :return: list of PullRequest
+        """
+        kwargs = dict(
+            repo=self.user_repo,
+            creator=self.bot if self.bot_token else self.user,
+            # pull requests and issues opened before `label_prs` was set, or while the label
+            # couldn't be created, aren't labeled. Filtering by label has to be enabled.
+            label=self.config.label_prs or None if settings.filter_by_label else None,
+        )
+        if not settings.cache_dir:
+            return list(self.provider.iter_issues(**kwargs))
+
+        # the mirror is only valid for the same set of filters
+        filters = [kwargs["label"], bool(self.bot_token)]
+        started_at = datetime.utcnow()
+        mirror = cache.pull_requests.get(self.fingerprint_key)
+        pull_requests = OrderedDict()
+        if mirror is None or mirror["filters"] != filters:
+            for pr in self.provider.iter_issues(**kwargs):
+                pull_requests[pr.number] = pr
+        else:
+            klass = self.req_bundle.get_pull_request_class()
+            for data in mirror["pull_requests"]:
+                pull_requests[data["number"]] = klass.from_dict(data)
+            # leave some room for clock skew between us and the provider
+            since = datetime.strptime(mirror["synced_at"], "%Y-%m-%dT%H:%M:%S") - \
+                timedelta(minutes=5)
+            for pr in self.provider.iter_issues(since=since, **kwargs):
+                if pr.is_open:
+                    pull_requests[pr.number] = pr
+                else:
+                    pull_requests.pop(pr.number, None)
+        cache.pull_requests.set(self.fingerprint_key, {
+            "filters": filters,
+            "synced_at": started_at.strftime("%Y-%m-%dT%H:%M:%S"),
+            "pull_requests": [pr.as_dict() for pr in pull_requests.values()],
+        })
+        return list(pull_requests.values())
+
     def get_repo_config(self, repo, branch=None, create_error_issue=True):
         branch = self.config.branch if branch is None else branch
         content, _ = self.provider.get_file(repo, ".pyup.yml", branch)
@@ -102,6 +184,8 @@ class Bot(object):
             self.config.branch = self.provider.get_default_branch(repo=self.user_repo)
         # set the config for this update run
         self.config.update_config(kwargs)
+        # the branch .pyup.yml is read from, the repo config may switch to another branch
+        self.config_branch = self.config.branch
         repo_config = self.get_repo_config(
             repo=self.user_repo,
             create_error_issue=create_error_issue
@@ -112,21 +196,137 @@ class Bot(object):
             self.config.update_config(self.write_config)
         logger.info("Runtime config is: {}".format(self.config))
 
-    def update(self, **kwargs):
+    def update(self, push=None, **kwargs):
         """
         Main entrypoint to kick off an update run.
+        :param push: dict, payload of the push webhook that triggered this run. Only the
+                     requirement files changed by the push are read again.
         :param kwargs:
         :return: RequirementsBundle
         """
+        if self.is_unchanged(**kwargs):
+            logger.info("Nothing changed on {} since the last run, skipping".format(
+                self.repo_name))
+            self.skipped = True
+            return self.req_bundle
         self.configure(**kwargs)
-        self.get_all_requirements()
+        # look up the branch heads before reading anything, pushes during the run have to
+        # invalidate the fingerprint
+        refs = self.get_fingerprint_refs()
+        # files of the previous run are only kept with a cache dir
+        head = refs.get(self.config.branch)
+        if head is None or not (
+                self.read_kept_requirements(head) or
+                (push is not None and self.read_pushed_requirements(push, head))):
+            self.get_all_requirements()
+        if head is not None:
+            self.save_requirement_files(head)
+            self.save_dependents()
         self.apply_updates(
             initial=kwargs.get("initial", False),
             scheduled=kwargs.get("scheduled", False)
         )
+        # a run that had to postpone updates isn't done yet
+        if not self.postponed:
+            self.save_fingerprint(refs, **kwargs)
 
         return self.req_bundle
 
+    @property
+    def fingerprint_key(self):
+        return "{}/{}".format(getattr(self.provider, "name", ""), self.repo_name)
+
+    @staticmethod
+    def get_run_fingerprint(**kwargs):
+        """
+        Serializes the arguments of an update run. Scheduled runs include the current date
+        because their titles and branches change over time.
+        :return: string
+        """
+        run = dict(kwargs)
+        if run.get("scheduled", False):
+            run["date"] = datetime.now().strftime("%Y-%m-%d")
+        return json.dumps(run, sort_keys=True, default=str)
+
+    def get_fingerprint_refs(self):
+        """
+        Looks up the head SHAs of the branches the config and the requirements are read from.
+        :return: dict, branch -> sha
+        """
+        if not settings.cache_dir:
+            return {}
+        refs = {self.config.branch: self.base_sha}
+        if self.config_branch not in refs:
+            refs[self.config_branch] = self.provider.get_branch_sha(
+                self.user_repo, self.config_branch)
+        return refs
+
+    def save_fingerprint(self, refs, **kwargs):
+        """
+        Persists everything the outcome of this run depends on: the branch heads in `refs`, the
+        newest release of every package and, with an API key, whether the pinned releases are
+        insecure. Only done if a cache dir is configured.
+        """
+        if not settings.cache_dir:
+            return
+        packages = {}
+        insecure = {} if settings.api_key else None
+        for requirement in self.req_bundle.requirements:
+            package = requirement.package
+            packages[requirement.name] = [
+                requirement.index_server,
+                package.versions[0] if package and package.versions else None
+            ]
+            if insecure is not None:
+                insecure["{}{}".format(requirement.name, requirement.specs)] = \
+                    requirement.is_insecure
+        cache.fingerprints.set(self.fingerprint_key, {
+            "run": self.get_run_fingerprint(**kwargs),
+            "refs": refs,
+            "packages": packages,
+            "insecure": insecure,
+        })
+
+    def is_unchanged(self, **kwargs):
+        """
+        Checks the fingerprint of the last run. If neither the repo nor any of its packages
+        changed, this run can't produce anything new.
+        :return: bool
+        """
+        if not settings.cache_dir or kwargs.get("initial", False):
+            return False
+        fingerprint = cache.fingerprints.get(self.fingerprint_key)
+        if fingerprint is None or fingerprint["run"] != self.get_run_fingerprint(**kwargs):
+            return False
+        for branch, sha in fingerprint["refs"].items():
+            try:
+                if self.provider.get_branch_sha(self.user_repo, branch) != sha:
+                    return False
+            except BranchDoesNotExistError:
+                # deleted or renamed since the last run, e.g. a new default branch
+                return False
+        # a new advisory turns a pinned release insecure without a new release
+        insecure = fingerprint.get("insecure")
+        if (insecure is not None) != bool(settings.api_key):
+            return False
+        for line, is_insecure in (insecure or {}).items():
+            if Requirement.parse(line, 0).is_insecure != is_insecure:
+                return False
+
+        def newest_release(name, index_server):
+            package = fetch_package(name, index_server)
+            return package.versions[0] if package and package.versions else None
+
+        with ThreadPoolExecutor(max_workers=settings.max_workers) as executor:
+            futures = {
+                name: executor.submit(newest_release, name, index_server)
+                for name, (index_server, _) in fingerprint["packages"].items()
+            }
+        return all(
+            futures[name].result() == newest
+            for name, (_, newest) in fingerprint["packages"].items()
+        )
+
     def can_pull(self, initial, scheduled):
         """
         Determines if pull requests should be created
@@ -137,6 +337,20 @@ class Bot(object):
             return scheduled
         return True
 
+    def pull_request_budget(self):
+        """
+        Estimates how many pull requests can be opened with the API budget that's left.
+        :return: int, or None if the budget is unknown
+        """
+        budgets = [
+            self.provider.get_rate_limit(token)
+            for token in (self.user_token, self.bot_token) if token
+        ]
+        budgets = [budget for budget in budgets if budget is not None]
+        if not budgets:
+            return None
+        return min(budgets) // self.API_CALLS_PER_PULL_REQUEST
+
     def apply_updates(self, initial, scheduled):
 
         InitialUpdateClass = self.req_bundle.get_initial_update_class()
@@ -179,7 +393,31 @@ class Bot(object):
         if initial and self.write_config:
             self.pull_config(self.write_config)
 
-        # todo: This block needs to be refactored
+        for updates, pull_request in self.iter_pull_requests(initial, scheduled, initial_pr):
+            logger.info("Have updates {} and pr {}".format(updates, pull_request))
+            for update in updates:
+                update.requirement.pull_request = pull_request
+                if self.config.close_prs and pull_request and not initial:
+                    self.close_stale_prs(
+                        update=update,
+                        pull_request=pull_request,
+                        scheduled=scheduled
+                    )
+                    # if this is a scheduled update, break since it's bundled
+                    if pull_request.is_scheduled:
+                        break
+
+    def iter_pull_requests(self, initial, scheduled, initial_pr):
+        """
+        Opens the pull requests for all pending updates, if they don't exist yet.
+        :return: generator of (updates, pull request) tuples, in the order of the updates
+        """
+        # each sequential update gets its own branch off the base branch, their pull requests
+        # are independent of each other and can be opened concurrently
+        concurrent = settings.pr_workers > 1 and not initial_pr and \
+            self.req_bundle.get_update_class(initial, scheduled, self.config) is \
+            self.req_bundle.get_sequential_update_class()
+        planned, jobs = [], []
         for title, body, update_branch, updates in self.iter_updates(initial, scheduled):
             # some scheduled updates don't have commits in them. This happens if a package is
             # outdated, but the config file is blocking the update (insecure, no updates).
@@ -193,29 +431,76 @@ class Bot(object):
                 pull_request = initial_pr
             elif self.can_pull(initial, scheduled) and \
                     title not in [pr.title for pr in self.pull_requests]:
-                update_branch = self.config.branch_prefix + update_branch
-                pull_request = self.commit_and_pull(
-                    initial=initial,
-                    new_branch=update_branch,
-                    title=title,
-                    body=body,
-                    updates=updates,
-                )
+                if concurrent:
+                    # opened below, once all of them are known
+                    jobs.append((title, body, update_branch, updates))
+                    planned.append((updates, None, title))
+                    continue
+                pull_request = self.open_pull_request(initial, title, body, update_branch,
+                                                      updates)
             else:
                 pull_request = next((pr for pr in self.pull_requests if pr.title == title), None)
+            if concurrent:
+                planned.append((updates, pull_request, None))
+            else:
+                yield updates, pull_request
+
+        if concurrent:
+            opened = self.open_pull_requests(jobs)
+            for updates, pull_request, title in planned:
+                if title is not None:
+                    pull_request = opened.get(title)
+                yield updates, pull_request
+
+    def open_pull_request(self, initial, title, body, update_branch, updates):
+        if self.pull_request_budget() == 0:
+            # the provider would pause until the rate limit resets, leave this one
+            # for the next run instead
+            logger.warning("API budget exhausted, postponing {}".format(title))
+            self.postponed.append(title)
+            return None
+        return self.commit_and_pull(
+            initial=initial,
+            new_branch=self.config.branch_prefix + update_branch,
+            title=title,
+            body=body,
+            updates=updates,
+        )
 
-            logger.info("Have updates {} and pr {}".format(updates, pull_request))
-            for update in updates:
-                update.requirement.pull_request = pull_request
-                if self.config.close_prs and pull_request and not initial:
-                    self.close_stale_prs(
-                        update=update,
-                        pull_request=pull_request,
-                        scheduled=scheduled
-                    )
-                    # if this is a scheduled update, break since it's bundled
-                    if pull_request.is_scheduled:
-                        break
+    def open_pull_requests(self, jobs):
+        """
+        Opens the pull requests for sequential updates concurrently, with at most
+        `settings.pr_workers` of them in flight. Updates beyond the API budget are postponed.
+        :param jobs: list of (title, body, update branch, updates) tuples
+        :return: dict, title -> PullRequest or None
+        """
+        budget = self.pull_request_budget()
+        if budget is not None and budget < len(jobs):
+            for title, _, _, _ in jobs[budget:]:
+                logger.warning("API budget exhausted, postponing {}".format(title))
+                self.postponed.append(title)
+            jobs = jobs[:budget]
+        if not jobs:
+            return {}
+
+        # resolve everything the pipelines share before the threads race for it
+        shared = ["branches", "base_sha", "user_repo"]
+        shared += ["bot", "bot_repo"] if self.bot_token else ["user"]
+        for name in shared:
+            getattr(self, name)
+        existing = list(self.pull_requests)
+        with ThreadPoolExecutor(max_workers=min(settings.pr_workers, len(jobs))) as executor:
+            futures = [
+                executor.submit(self.commit_and_pull, initial=False,
+                                new_branch=self.config.branch_prefix + update_branch,
+                                title=title, body=body, updates=updates)
+                for title, body, update_branch, updates in jobs
+            ]
+            opened = [future.result() for future in futures]
+        # pull requests have been appended in the order they were opened in, restore the
+        # order of the updates so that runs stay reproducible
+        self.pull_requests[:] = existing + [pr for pr in opened if pr is not None]
+        return {job[0]: pr for job, pr in zip(jobs, opened)}
 
     def close_stale_prs(self, update, pull_request, scheduled):
         """
@@ -228,7 +513,7 @@ class Bot(object):
         :param update:
         :param pull_request:
         """
-        closed = []
+        stale = []
         if self.bot_token and not pull_request.is_initial:
             for pr in self.pull_requests:
                 close_pr = False
@@ -257,41 +542,68 @@ class Bot(object):
                         if not self.has_conflicting_update(update):
                             close_pr = True
 
-                if close_pr and self.is_bot_the_only_committer(pr=pr):
-                    logger.info("Closing stale PR {} for {}".format(pr.title, pull_request.title))
-                    self.provider.close_pull_request(
-                        bot_repo=self.bot_repo,
-                        user_repo=self.user_repo,
-                        pull_request=pr,
-                        comment="Closing this in favor of #{}".format(
-                            pull_request.number),
-                        prefix=self.config.branch_prefix
-                    )
-                    pr.state = "closed"
-                    closed.append(pr)
-        for closed_pr in closed:
-            self.pull_requests.remove(closed_pr)
+                if close_pr:
+                    stale.append(pr)
+
+        def close(pr):
+            if not self.is_bot_the_only_committer(pr=pr):
+                return None
+            logger.info("Closing stale PR {} for {}".format(pr.title, pull_request.title))
+            self.provider.close_pull_request(
+                bot_repo=self.bot_repo,
+                user_repo=self.user_repo,
+                pull_request=pr,
+                comment="Closing this in favor of #{}".format(
+                    pull_request.number),
+                prefix=self.config.branch_prefix
+            )
+            pr.state = "closed"
+            cache.committers.delete(self.committer_key(pr))
+            return pr
+
+        if stale:
+            with ThreadPoolExecutor(max_workers=settings.max_workers) as executor:
+                closed = [pr for pr in executor.map(close, stale) if pr is not None]
+            for closed_pr in closed:
+                self.pull_requests.remove(closed_pr)
 
     def is_bot_the_only_committer(self, pr):
         """
-        Checks if the bot is the only committer for the given pull request.
-        :param update: Update to check
-        :return: bool - True if conflict found
+        Checks if the bot is the only committer for the given pull request. The verdict is
+        cached by the head sha of the pull request, unchanged pull requests are checked once.
+        :param pr: PullRequest to check
+        :return: bool - True if the bot is the only committer
         """
-        committer = self.provider.get_pull_request_committer(
-            self.user_repo,
-            pr)
-        # flatten the list and remove duplicates
-        committer_set = set([c.login for c in committer])
-
+        if not pr.head_sha:
+            # a single request, the commits are only listed if the head is new
+            self.provider.get_pull_request_head(self.user_repo, pr)
+        if pr.head_sha:
+            verdict = cache.committers.get(self.committer_key(pr))
+            if verdict is not None:
+                return verdict
+        verdict = self.check_committers(pr)
+        # the head sha may have been recorded while iterating over the committers
+        if pr.head_sha:
+            cache.committers.set(self.committer_key(pr), verdict)
+        return verdict
+
+    def committer_key(self, pr):
+        return "{}/{}".format(self.fingerprint_key, pr.head_sha)
+
+    def check_committers(self, pr):
         # it's impossible to get the bots login if this is an integration, just check that
-        # there's only one commit in the commit history.
-        if self.integration or getattr(self.provider, 'name', '') == 'gitlab':
-            return len(committer_set) == 1
-
-        # check that there's exactly one committer in this PRs commit history and
-        # that the committer is the bot
-        return len(committer_set) == 1 and self.provider.is_same_user(self.bot, committer[0])
+        # there's only one committer in the commit history.
+        check_login = not self.integration and getattr(self.provider, 'name', '') != 'gitlab'
+        first = None
+        for committer in self.provider.iter_pull_request_committer(self.user_repo, pr):
+            if first is None:
+                if check_login and not self.provider.is_same_user(self.bot, committer):
+                    return False
+                first = committer
+            elif committer.login != first.login:
+                # a second committer, no need to look any further
+                return False
+        return first is not None
 
     def has_conflicting_update(self, update):
         """
@@ -328,27 +640,35 @@ class Bot(object):
         :return: bool -- True if successfull
         """
         logger.info("Preparing to create branch {} from {}".format(new_branch, self.config.branch))
-        try:
-            # create new branch
-            self.provider.create_branch(
-                base_branch=self.config.branch,
-                new_branch=new_branch,
-                repo=self.user_repo
-            )
-            logger.info("Created branch {} from {}".format(new_branch, self.config.branch))
-            return True
-        except BranchExistsError:
-            logger.info("Branch {} exists.".format(new_branch))
-            # if the branch exists, is empty and delete_empty is set, delete it and call
-            # this function again
-            if delete_empty:
-                if self.provider.is_empty_branch(self.user_repo, self.config.branch, new_branch,
-                                                 self.config.branch_prefix):
-                    self.provider.delete_branch(self.user_repo, new_branch,
-                                                self.config.branch_prefix)
-                    logger.info("Branch {} was empty and has been deleted".format(new_branch))
-                    return self.create_branch(new_branch, delete_empty=False)
-                logger.info("Branch {} is not empty".format(new_branch))
+        if new_branch not in self.branches:
+            try:
+                # create new branch
+                self.provider.create_branch(
+                    base_branch=self.config.branch,
+                    new_branch=new_branch,
+                    repo=self.user_repo,
+                    sha=self.base_sha
+                )
+                self.branches[new_branch] = self.base_sha
+                logger.info("Created branch {} from {}".format(new_branch, self.config.branch))
+                return True
+            except BranchExistsError:
+                # the branch doesn't match the prefix or has been created after the listing
+                pass
+        logger.info("Branch {} exists.".format(new_branch))
+        # if the branch exists, is empty and delete_empty is set, delete it and call
+        # this function again
+        if delete_empty:
+            if self.provider.is_empty_branch(self.user_repo, self.config.branch, new_branch,
+                                             self.config.branch_prefix,
+                                             base_sha=self.base_sha,
+                                             head_sha=self.branches.get(new_branch)):
+                self.provider.delete_branch(self.user_repo, new_branch,
+                                            self.config.branch_prefix)
+                self.branches.pop(new_branch, None)
+                logger.info("Branch {} was empty and has been deleted".format(new_branch))
+                return self.create_branch(new_branch, delete_empty=False)
+            logger.info("Branch {} is not empty".format(new_branch))
         return False
 
     def pull_config(self, new_config):  # pragma: no cover
@@ -403,11 +723,53 @@ class Bot(object):
             )
             return pr
 
+    def checkpoint_key(self, branch):
+        return "{}/{}".format(self.fingerprint_key, branch)
+
+    def get_checkpoint(self, new_branch):
+        """
+        Loads the checkpoint of an earlier, unfinished attempt to commit to `new_branch`.
+        :param new_branch: string name of the bot branch
+        :return: tuple (updated_files, committed), or None if there's nothing to resume
+        """
+        checkpoint = cache.checkpoints.get(self.checkpoint_key(new_branch))
+        if checkpoint is None:
+            return None
+        logger.info("Resuming {} from checkpoint".format(new_branch))
+        updated_files = {}
+        for path, sha in checkpoint["files"].items():
+            content, _ = self.provider.get_file(self.user_repo, path, new_branch)
+            if content is None:
+                # the branch is gone or has been tampered with, we can't resume
+                cache.checkpoints.delete(self.checkpoint_key(new_branch))
+                return None
+            updated_files[path] = {"sha": sha, "content": content}
+        committed = set(tuple(commit) for commit in checkpoint["commits"])
+        return updated_files, committed
+
+    def save_checkpoint(self, new_branch, updated_files, committed):
+        cache.checkpoints.set(self.checkpoint_key(new_branch), {
+            "files": {path: f["sha"] for path, f in updated_files.items()},
+            "commits": sorted(committed),
+        })
+
     def commit_and_pull(self, initial, new_branch, title, body, updates):
         logger.info("Preparing commit {}".format(title))
         if self.create_branch(new_branch, delete_empty=False):
-            updated_files = {}
+            # a fresh branch, any checkpoint left over is stale
+            cache.checkpoints.delete(self.checkpoint_key(new_branch))
+            checkpoint = {}, set()
+        else:
+            checkpoint = self.get_checkpoint(new_branch)
+        if checkpoint is not None:
+            updated_files, committed = checkpoint
+            if self.config.update_hashes:
+                # resolve all hashes up front so that the loop below only rewrites content
+                self.req_bundle.resolve_hashes(updates)
             for update in self.iter_changes(initial, updates):
+                commit = (update.requirement_file.path, update.commit_message)
+                if commit in committed:
+                    continue
                 if update.requirement_file.path in updated_files:
                     sha = updated_files[update.requirement_file.path]["sha"]
                     content = updated_files[update.requirement_file.path]["content"]
@@ -428,6 +790,8 @@ class Bot(object):
                     )
                     updated_files[update.requirement_file.path] = {"sha": new_sha,
                                                                    "content": content}
+                    committed.add(commit)
+                    self.save_checkpoint(new_branch, updated_files, committed)
                 else:
                     if hasattr(self.user_repo, 'path_with_namespace'):
                         repo_name = self.user_repo.path_with_namespace
@@ -445,6 +809,7 @@ class Bot(object):
                     body=body,
                     new_branch=new_branch,
                 )
+                cache.checkpoints.delete(self.checkpoint_key(new_branch))
                 self.pull_requests.append(pr)
                 return pr
         return None
@@ -454,6 +819,8 @@ class Bot(object):
             repo=self.bot_repo if self.bot_token else self.user_repo,
             title=title,
             body=body,
+            # label issues as well, the label is used to narrow down the listing
+            label=self.config.label_prs or None,
         )
 
     def create_pull_request(self, title, body, new_branch):
@@ -491,28 +858,147 @@ class Bot(object):
 
     # if this function gets updated, the gist at https://gist.github.com/jayfk/45862b05836701b49b01
     # needs to be updated too
+    @staticmethod
+    def is_requirement_file_path(path):
+        """
+        Checks whether a file found while searching the tree is read as a requirement file.
+        """
+        if "requirements" in path:
+            if path.endswith("txt") or path.endswith("pip"):
+                return True
+        return "setup.cfg" in path
+
     def get_all_requirements(self, sha=None):
         if self.config.search:
             logger.info("Searching requirement files")
-            for file_type, path in self.iter_git_tree(sha=sha):
-                if file_type == "blob":
-                    if "requirements" in path:
-                        if path.endswith("txt") or path.endswith("pip"):
-                            self.add_requirement_file(path, sha)
-                    if "setup.cfg" in path:
-                        self.add_requirement_file(path, sha)
+            # start fetching matching files while the tree is still being paged through
+            with ThreadPoolExecutor(max_workers=settings.max_workers) as executor:
+                for file_type, path in self.iter_git_tree(sha=sha):
+                    if file_type == "blob" and self.is_requirement_file_path(path):
+                        self.prefetch_requirement_file(executor, path, sha)
+                for path in list(self._prefetched_files):
+                    self.add_requirement_file(path, sha)
+                self._prefetched_files.clear()
         for req_file in self.config.requirements:
             self.add_requirement_file(req_file.path, sha=sha)
         self.req_bundle.resolve_pipfiles()
 
+    @property
+    def requirement_files_key(self):
+        return "{}/{}".format(self.fingerprint_key, self.config.branch)
+
+    @property
+    def requirement_files_config(self):
+        # the settings that decide which files are read
+        return {
+            "search": bool(self.config.search),
+            "requirements": sorted(req_file.path for req_file in self.config.requirements),
+        }
+
+    def save_requirement_files(self, sha):
+        """
+        Keeps the requirement files read at commit `sha` of the base branch for the next run.
+        """
+        cache.requirement_files.set(self.requirement_files_key, {
+            "sha": sha,
+            "config": self.requirement_files_config,
+            "files": [
+                {"path": f.path, "content": f.content, "sha": f.sha} for f in self.req_bundle
+            ],
+        })
+
+    def get_kept_requirement_files(self, sha):
+        """
+        :return: list of requirement files a previous run read at commit `sha`, or None
+        """
+        snapshot = cache.requirement_files.get(self.requirement_files_key)
+        if snapshot is None or snapshot["sha"] != sha or \
+                snapshot.get("config") != self.requirement_files_config:
+            return None
+        return snapshot["files"]
+
+    def add_kept_requirement_file(self, data):
+        self.req_bundle.append(self.req_bundle.get_requirement_file_class()(
+            path=data["path"], content=data["content"], sha=data["sha"]))
+
+    def read_kept_requirements(self, head):
+        """
+        Reads the requirement files from the previous run if the base branch didn't move since,
+        e.g. when a new release of a package triggered this run.
+        :param head: string, current head sha of the base branch
+        :return: bool -- False if the files have to be read from the repo
+        """
+        files = self.get_kept_requirement_files(head)
+        if files is None:
+            return False
+        logger.info("Base branch unchanged, reusing {} requirement files".format(len(files)))
+        for data in files:
+            self.add_kept_requirement_file(data)
+        self.req_bundle.resolve_pipfiles()
+        return True
+
+    def save_dependents(self):
+        """
+        Records which packages the requirement files of the base branch depend on, see
+        `pyup.dependents`.
+        """
+        index = get_index()
+        if index is not None:
+            index.update(getattr(self.provider, "name", ""), self.repo_name,
+                         self.config.branch, self.req_bundle)
+
+    def read_pushed_requirements(self, payload, head):
+        """
+        Reads the requirement files after a push to the base branch. Files the push didn't
+        touch are taken from the previous run, only changed ones are fetched again.
+        :param payload: dict, push webhook payload
+        :param head: string, current head sha of the base branch
+        :return: bool -- False if the push doesn't follow up on the previous run and all
+                 requirement files have to be searched
+        """
+        event = parse_push_event(payload)
+        if event is None or event.paths is None or event.branch != self.config.branch or \
+                event.after != head or ".pyup.yml" in event.paths:
+            return False
+        files = self.get_kept_requirement_files(event.before)
+        if files is None:
+            return False
+
+        logger.info("Reading {} changed paths of push to {}".format(
+            len(event.paths), event.branch))
+        for data in files:
+            if data["path"] not in event.paths:
+                self.add_kept_requirement_file(data)
+        known = set(data["path"] for data in files)
+        configured = set(req_file.path for req_file in self.config.requirements)
+        for path in sorted(event.paths):
+            if path in known or path in configured or \
+                    (self.config.search and self.is_requirement_file_path(path)):
+                # removed files are gone, get_requirement_file returns None for them
+                self.add_requirement_file(path)
+        self.req_bundle.resolve_pipfiles()
+        return True
+
+    def prefetch_requirement_file(self, executor, path, sha=None):
+        if path in self._prefetched_files:
+            return
+        branch = sha if sha is not None else self.config.branch
+        self._prefetched_files[path] = executor.submit(
+            self.provider.get_requirement_file,
+            path=path, repo=self.user_repo, branch=branch
+        )
+
     # if this function gets updated, the gist at https://gist.github.com/jayfk/c6509bbaf4429052ca3f
     # needs to be updated too
     def add_requirement_file(self, path, sha=None):
         logger.info("Adding requirement file at {}".format(path))
         branch = sha if sha is not None else self.config.branch
         if not self.req_bundle.has_file_in_path(path):
-            req_file = self.provider.get_requirement_file(
-                path=path, repo=self.user_repo, branch=branch)
+            if path in self._prefetched_files:
+                req_file = self._prefetched_files.pop(path).result()
+            else:
+                req_file = self.provider.get_requirement_file(
+                    path=path, repo=self.user_repo, branch=branch)
             if req_file is not None:
                 self.req_bundle.append(req_file)
                 for other_file in req_file.other_files:
@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, print_function, unicode_literals
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+from pyup import settings
+
+logger = logging.getLogger(__name__)
+
+
+class Cache(object):
+    """
+    Thread safe in-memory key/value store. The module level instances below are shared by all
+    bots running in the same process.
+    """
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            return self._data.get(key, default)
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+
+    def get_or_set(self, key, factory):
+        """
+        Returns the value for `key`, calling `factory` to create it if it's missing.
+        """
+        with self._lock:
+            if key not in self._data:
+                self._data[key] = factory()
+            return self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._data
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+
+class Store(object):
+    """
+    Key/value store that persists its entries as JSON files below `settings.cache_dir/<name>`.
+    Entries keep the time they were stored at and an optional ETag, so callers can revalidate
+    expired entries with a conditional request. Without a configured cache dir the store lives
+    in memory only.
+    """
+
+    def __init__(self, name, ttl=None):
+        self.name = name
+        self.ttl = ttl
+        self._data = {}
+        # key -> stamp of the file the in-memory entry was read from or written to
+        self._stamps = {}
+        self._lock = threading.Lock()
+
+    @property
+    def path(self):
+        if settings.cache_dir:
+            return os.path.join(settings.cache_dir, self.name)
+        return None
+
+    def _file(self, key):
+        return os.path.join(
+            self.path, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".json")
+
+    def _stamp(self, key):
+        # replacing a file gives it a new inode, deleting it leaves no stamp
+        try:
+            stat = os.stat(self._file(key))
+        except OSError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def _read(self, key):
+        if self.path is None:
+            return None
+        try:
+            with open(self._file(key)) as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+
+    def _write(self, key, entry):
+        if self.path is None:
+            return
+        try:
+            if not os.path.isdir(self.path):
+                os.makedirs(self.path)
+            tmp = "{}.{}.tmp".format(self._file(key), threading.current_thread().ident)
+            with open(tmp, "w") as f:
+                json.dump(entry, f)
+            os.replace(tmp, self._file(key))
+            self._stamps[key] = self._stamp(key)
+        except (IOError, OSError):
+            logger.warning("Unable to write {} cache entry {}".format(self.name, key),
+                           exc_info=True)
+
+    def get_entry(self, key):
+        """
+        Returns the raw entry for `key`, even if it is expired. Entries kept in memory are read
+        again if another process replaced or deleted their file in the meantime.
+        :param key: string
+        :return: dict with `value`, `etag` and `stored_at`, or None
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if self.path is None:
+                return entry
+            stamp = self._stamp(key)
+            if entry is None or stamp != self._stamps.get(key):
+                entry = self._read(key) if stamp is not None else None
+                self._stamps[key] = stamp
+                if entry is not None:
+                    self._data[key] = entry
+                else:
+                    self._data.pop(key, None)
+            return entry
+
+    def is_fresh(self, entry):
+        return self.ttl is None or time.time() - entry["stored_at"] < self.ttl
+
+    def get(self, key, default=None):
+        entry = self.get_entry(key)
+        if entry is not None and self.is_fresh(entry):
+            return entry["value"]
+        return default
+
+    def set(self, key, value, etag=None):
+        entry = {"value": value, "etag": etag, "stored_at": time.time()}
+        with self._lock:
+            self._data[key] = entry
+            self._write(key, entry)
+
+    def touch(self, key):
+        """
+        Marks an existing entry as fresh again, e.g. after the server answered with a 304.
+        """
+        entry = self.get_entry(key)
+        if entry is not None:
+            self.set(key, entry["value"], etag=entry["etag"])
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+            self._stamps.pop(key, None)
+            if self.path is not None:
+                try:
+                    os.remove(self._file(key))
+                except OSError:
+                    pass
+
+    def clear(self):
+        """
+        Clears the in-memory layer. Persisted entries are left untouched.
+        """
+        with self._lock:
+            self._data.clear()
+            self._stamps.clear()
+
+
+# index server + package key -> list of releases, newest first, or None if it doesn't exist
+packages = Store("packages", ttl=60 * 10)
+
+# api key + requirement -> whether the requirement is insecure
+vulnerabilities = Store("vulnerabilities", ttl=60 * 60)
+
+# (package key, version) -> list of hashes
+hashes = Cache()
+
+# package key -> list of [version, changelog] pairs, newest release first
+changelogs = Store("changelogs", ttl=60 * 60 * 24)
+
+# provider/repo -> fingerprint of the last successful run, see Bot.is_unchanged
+fingerprints = Store("fingerprints")
+
+# provider/repo/branch -> files and commits already pushed to a bot branch, see
+# Bot.commit_and_pull
+checkpoints = Store("checkpoints")
+
+# provider/repo -> open bot pull requests as of the last sync, see Bot.sync_pull_requests
+pull_requests = Store("pull_requests")
+
+# provider/repo/head sha -> whether the bot is the only committer of the pull request, see
+# Bot.is_bot_the_only_committer. Dropped when the bot closes the pull request.
+committers = Store("committers", ttl=60 * 60 * 24 * 7)
+
+# provider/repo/branch -> requirement files read at a commit, see Bot.read_pushed_requirements
+requirement_files = Store("requirement_files")
@@ -1,5 +1,11 @@
 # -*- coding: utf-8 -*-
 from pyup import __version__, settings
+from pyup.batch import read_repos, run, run_queue, parse_shard, in_shard
+from pyup.jobs import JobQueue, default_worker_id
+from pyup.dependents import get_index, enqueue_dependents
+from pyup.mirror import Mirror, PYPI_XMLRPC_URL
+from pyup.snapshot import get_snapshot
+from pyup.server import make_server
 from pyup.bot import Bot
 from pyup.requirements import RequirementFile, RequirementsBundle
 from pyup.providers.github import Provider as GithubProvider
@@ -7,7 +13,9 @@ from pyup.providers.gitlab import Provider as GitlabProvider
 
 import click
 from tqdm import tqdm
+import json
 import logging
+import sys
 
 
 @click.command()
@@ -25,29 +33,277 @@ import logging
               default=False, is_flag=True)
 @click.option('--ignore_ssl', help='Set this to ignore SSL Certificate',
               default=False, is_flag=True)
+@click.option('--cache-dir', help='Directory to persist caches between runs', default=None)
+@click.option('--mirror', help='SQLite file with a local copy of PyPI release lists, see '
+                               'pyup-mirror', default=None)
+@click.option('--snapshot', help='JSON file to read package data from instead of PyPI and '
+                                 'pyup.io, runs fail on anything missing from it', default=None)
+@click.option('--record-snapshot', help='Fetch package data missing from --snapshot and write it '
+                                        'to the file afterwards', default=False, is_flag=True)
+@click.option('--pr-workers', help='Number of update pull requests opened concurrently',
+              default=1, type=int)
+@click.option('--filter-by-label', help='List bot pull requests and issues by the label_prs '
+                                        'label only, all of them have to carry it',
+              default=False, is_flag=True)
+@click.option('--push-event', help='JSON file with the push webhook payload that triggered '
+                                   'this run, only changed requirement files are read again',
+              default=None, type=click.File('r'))
 @click.option('--log', help='Set the log level', default="ERROR")
-def main(repo, user_token, bot_token, key, provider, provider_url, branch, initial, ignore_ssl, log):
+def main(repo, user_token, bot_token, key, provider, provider_url, branch, initial, ignore_ssl,
+         cache_dir, mirror, snapshot, record_snapshot, pr_workers, filter_by_label, push_event,
+         log):
     logging.basicConfig(level=getattr(logging, log.upper(), None))
 
-    settings.configure(key=key)
-
-    if provider == 'github':
-        ProviderClass = GithubProvider
-    elif provider == 'gitlab':
-        ProviderClass = GitlabProvider
-    else:
-        raise NotImplementedError
+    check_snapshot_options(snapshot, record_snapshot)
+    settings.configure(key=key, cache=cache_dir, pull_request_workers=pr_workers, mirror=mirror,
+                       snapshot=snapshot, record=record_snapshot, label_filter=filter_by_label)
 
     bot = CLIBot(
         repo=repo,
         user_token=user_token,
         bot_token=bot_token,
-        provider=ProviderClass,
+        provider=get_provider_class(provider),
         provider_url=provider_url,
         ignore_ssl=ignore_ssl,
     )
 
-    bot.update(branch=branch, initial=initial)
+    push = json.load(push_event) if push_event is not None else None
+    try:
+        bot.update(branch=branch, initial=initial, push=push)
+    finally:
+        save_snapshot()
+
+
+@click.command()
+@click.version_option(__version__, '-v', '--version')
+@click.argument('repos', type=click.File('r'), required=False)
+@click.option('--user-token', required=True, help='')
+@click.option('--bot-token', help='', default=None)
+@click.option("--key", default="",
+              help="API Key for pyup.io's vulnerability database. Can be set as SAFETY_API_KEY "
+                   "environment variable. Default: empty")
+@click.option('--provider', help='API to use; either github or gitlab', default="github")
+@click.option('--provider_url', help='Optional custom URL to your provider', default=None)
+@click.option('--branch', help='Set the branch the bot should use', default='master')
+@click.option('--initial', help='Set this to bundle all PRs into a large one',
+              default=False, is_flag=True)
+@click.option('--ignore_ssl', help='Set this to ignore SSL Certificate',
+              default=False, is_flag=True)
+@click.option('--cache-dir', help='Directory to persist caches between runs', default=None)
+@click.option('--mirror', help='SQLite file with a local copy of PyPI release lists, see '
+                               'pyup-mirror', default=None)
+@click.option('--snapshot', help='JSON file to read package data from instead of PyPI and '
+                                 'pyup.io, runs fail on anything missing from it', default=None)
+@click.option('--record-snapshot', help='Fetch package data missing from --snapshot and write it '
+                                        'to the file afterwards', default=False, is_flag=True)
+@click.option('--workers', help='Number of repositories updated concurrently', default=4,
+              type=int)
+@click.option('--pr-workers', help='Number of update pull requests opened concurrently',
+              default=1, type=int)
+@click.option('--filter-by-label', help='List bot pull requests and issues by the label_prs '
+                                        'label only, all of them have to carry it',
+              default=False, is_flag=True)
+@click.option('--output', help='File to write the JSON lines results to', default='-',
+              type=click.File('w'))
+@click.option('--shard', help='Only update the repositories of shard i/N, counting from 0',
+              default=None)
+@click.option('--queue', help='SQLite file to claim repositories from, REPOS are added to it',
+              default=None)
+@click.option('--retry-failed', help='Queue failed repositories again', default=False,
+              is_flag=True)
+@click.option('--log', help='Set the log level', default="ERROR")
+def batch(repos, user_token, bot_token, key, provider, provider_url, branch, initial, ignore_ssl,
+          cache_dir, mirror, snapshot, record_snapshot, workers, pr_workers, filter_by_label,
+          output, shard, queue, retry_failed, log):
+    """
+    Updates every repository listed in REPOS (one per line, default: stdin) and writes one
+    JSON result per repository. With --queue, any number of workers can share the work.
+    """
+    logging.basicConfig(level=getattr(logging, log.upper(), None))
+    if repos is None and queue is None:
+        repos = click.open_file('-')
+    repos = read_repos(repos) if repos is not None else []
+    if shard is not None:
+        try:
+            repos = in_shard(repos, *parse_shard(shard))
+        except ValueError as e:
+            raise click.BadParameter(str(e), param_hint="--shard")
+
+    check_snapshot_options(snapshot, record_snapshot)
+    settings.configure(key=key, cache=cache_dir, pull_request_workers=pr_workers, mirror=mirror,
+                       snapshot=snapshot, record=record_snapshot, label_filter=filter_by_label)
+    ProviderClass = get_provider_class(provider)
+
+    def create_bot(repo):
+        return Bot(
+            repo=repo,
+            user_token=user_token,
+            bot_token=bot_token,
+            provider=ProviderClass,
+            provider_url=provider_url,
+            ignore_ssl=ignore_ssl,
+        )
+
+    if queue is not None:
+        job_queue = JobQueue(queue)
+        job_queue.add(repos)
+        if retry_failed:
+            job_queue.retry_failed()
+        results = run_queue(create_bot, job_queue, default_worker_id(), workers=workers,
+                            branch=branch, initial=initial)
+    else:
+        results = run(create_bot, repos, workers=workers, branch=branch, initial=initial)
+
+    failed = False
+    try:
+        for result in results:
+            failed = failed or not result["ok"]
+            output.write(json.dumps(result) + "\n")
+            output.flush()
+    finally:
+        save_snapshot()
+    if failed:
+        sys.exit(1)
+
+
+@click.command()
+@click.version_option(__version__, '-v', '--version')
+@click.option('--host', help='Address to listen on', default='127.0.0.1')
+@click.option('--port', help='Port to listen on', default=8642, type=int)
+@click.option('--socket', 'socket_path', help='Unix socket to listen on instead of a port',
+              default=None)
+@click.option('--user-token', required=True, help='')
+@click.option('--bot-token', help='', default=None)
+@click.option("--key", default="",
+              help="API Key for pyup.io's vulnerability database. Can be set as SAFETY_API_KEY "
+                   "environment variable. Default: empty")
+@click.option('--provider', help='Default API to use; either github or gitlab',
+              default="github")
+@click.option('--provider_url', help='Optional custom URL to your provider', default=None)
+@click.option('--ignore_ssl', help='Set this to ignore SSL Certificate',
+              default=False, is_flag=True)
+@click.option('--cache-dir', help='Directory to persist caches between runs', default=None)
+@click.option('--mirror', help='SQLite file with a local copy of PyPI release lists, see '
+                               'pyup-mirror', default=None)
+@click.option('--workers', help='Number of jobs run concurrently', default=4, type=int)
+@click.option('--pr-workers', help='Number of update pull requests opened concurrently',
+              default=1, type=int)
+@click.option('--filter-by-label', help='List bot pull requests and issues by the label_prs '
+                                        'label only, all of them have to carry it',
+              default=False, is_flag=True)
+@click.option('--log', help='Set the log level', default="INFO")
+def serve(host, port, socket_path, user_token, bot_token, key, provider, provider_url,
+          ignore_ssl, cache_dir, mirror, workers, pr_workers, filter_by_label, log):
+    """
+    Runs update jobs posted as JSON to /update, e.g.
+    {"repo": "user/repo", "branch": "master", "initial": false, "scheduled": false}.
+    A job may pick its own "provider".
+    """
+    logging.basicConfig(level=getattr(logging, log.upper(), None))
+
+    settings.configure(key=key, cache=cache_dir, pull_request_workers=pr_workers, mirror=mirror,
+                       label_filter=filter_by_label)
+
+    def create_bot(job):
+        return Bot(
+            repo=job["repo"],
+            user_token=user_token,
+            bot_token=bot_token,
+            provider=get_provider_class(job.get("provider", provider)),
+            provider_url=provider_url,
+            ignore_ssl=ignore_ssl,
+        )
+
+    server = make_server(create_bot, host=host, port=port, socket_path=socket_path,
+                         workers=workers)
+    logging.getLogger(__name__).info("Listening on {}".format(
+        socket_path or "{}:{}".format(host, port)))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+@click.command()
+@click.version_option(__version__, '-v', '--version')
+@click.argument('package')
+@click.option('--queue', required=True, help='SQLite file of the pyup-batch workers to add '
+                                             'the affected repositories to')
+@click.option('--cache-dir', required=True, help='Directory the update runs persist their '
+                                                 'caches in')
+@click.option('--index-server', help='Index the package is released on. Default: PyPI',
+              default=None)
+@click.option('--provider', help='Only queue repositories of this provider', default=None)
+@click.option('--branch', help='Only queue repositories depending on the package on this branch',
+              default=None)
+@click.option('--log', help='Set the log level', default="ERROR")
+def release(package, queue, cache_dir, index_server, provider, branch, log):
+    """
+    Queues the repositories that depend on PACKAGE after a new release of it, as recorded by
+    earlier update runs using the same --cache-dir. Writes one JSON line per repository.
+    """
+    logging.basicConfig(level=getattr(logging, log.upper(), None))
+
+    settings.configure(cache=cache_dir)
+    job_queue = JobQueue(queue)
+    try:
+        dependents = enqueue_dependents(get_index(), job_queue, package,
+                                        index_server=index_server, provider=provider,
+                                        branch=branch)
+    finally:
+        job_queue.close()
+    for dependent in dependents:
+        click.echo(json.dumps(dependent))
+
+
+@click.command()
+@click.version_option(__version__, '-v', '--version')
+@click.argument('path')
+@click.option('--load', help='Load a JSON dump instead of syncing with the index',
+              default=None, type=click.File('r'))
+@click.option('--dump', help='Write the mirror to a JSON dump afterwards', default=None,
+              type=click.File('w'))
+@click.option('--url', help='XML-RPC endpoint of the index to sync with',
+              default=PYPI_XMLRPC_URL)
+@click.option('--log', help='Set the log level', default="INFO")
+def mirror(path, load, dump, url, log):
+    """
+    Brings the local PyPI mirror at PATH up to date, by replaying the changelog of the index
+    since the last sync or by loading a dump. Packages are added to the mirror by update runs
+    using it with --mirror.
+    """
+    logging.basicConfig(level=getattr(logging, log.upper(), None))
+
+    local = Mirror(path)
+    try:
+        if load is not None:
+            local.load_dump(load)
+        else:
+            local.sync(url)
+        if dump is not None:
+            local.write_dump(dump)
+    finally:
+        local.close()
+
+
+def check_snapshot_options(snapshot, record_snapshot):
+    if record_snapshot and snapshot is None:
+        raise click.BadParameter("requires --snapshot", param_hint="--record-snapshot")
+
+
+def save_snapshot():
+    if settings.record_snapshot:
+        get_snapshot().save(settings.snapshot_path)
+
+
+def get_provider_class(provider):
+    if provider == 'github':
+        return GithubProvider
+    elif provider == 'gitlab':
+        return GitlabProvider
+    raise NotImplementedError
 
 
 if __name__ == '__main__':
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, print_function, unicode_literals
+import os
+import sqlite3
+import threading
+
+from pyup import settings, cache
+from .cache import Cache
+from .mirror import normalize
+
+# path -> DependentsIndex, shared by all bots in this process
+indexes = Cache()
+
+
+class DependentsIndex(object):
+    """
+    Inverted index of the requirements read by update runs: package -> repositories, branches,
+    files and specs. Kept in a SQLite file, so that any number of worker processes sharing the
+    file can keep it up to date.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=60, isolation_level=None,
+                                   check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS dependents ("
+            "package TEXT NOT NULL, index_server TEXT NOT NULL, provider TEXT NOT NULL, "
+            "repo TEXT NOT NULL, branch TEXT NOT NULL, path TEXT NOT NULL, specs TEXT NOT NULL, "
+            "PRIMARY KEY (package, index_server, provider, repo, branch, path))"
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS dependents_repo ON dependents (provider, repo, branch)"
+        )
+
+    def update(self, provider, repo, branch, req_bundle):
+        """
+        Replaces everything known about `branch` of `repo` with the requirements in
+        `req_bundle`.
+        """
+        rows = set()
+        for req_file in req_bundle:
+            for requirement in req_file.requirements:
+                rows.add((normalize(requirement.key), requirement.index_server or "", provider,
+                          repo, branch, req_file.path, str(requirement.specs)))
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.execute(
+                    "DELETE FROM dependents WHERE provider = ? AND repo = ? AND branch = ?",
+                    (provider, repo, branch)
+                )
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO dependents VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+
+    def lookup(self, package, index_server=None):
+        """
+        Lists the repositories depending on `package`.
+        :param package: string, name of the package in any spelling, see PEP 503
+        :param index_server: string, index the package is released on. Default: PyPI
+        :return: list of dicts with `provider`, `repo`, `branch` and `files`, a dict of
+                 path -> specs
+        """
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT provider, repo, branch, path, specs FROM dependents "
+                "WHERE package = ? AND index_server = ? ORDER BY provider, repo, branch, path",
+                (normalize(package), index_server or "")
+            ).fetchall()
+        dependents = []
+        for provider, repo, branch, path, specs in rows:
+            if not dependents or (dependents[-1]["provider"], dependents[-1]["repo"],
+                                  dependents[-1]["branch"]) != (provider, repo, branch):
+                dependents.append(
+                    {"provider": provider, "repo": repo, "branch": branch, "files": {}})
+            dependents[-1]["files"][path] = specs
+        return dependents
+
+    def close(self):
+        self._db.close()
+
+
+def get_index():
+    """
+    :return: DependentsIndex kept in the cache dir, or None if no cache dir is configured
+    """
+    if not settings.cache_dir:
+        return None
+    if not os.path.isdir(settings.cache_dir):
+        os.makedirs(settings.cache_dir)
+    path = os.path.join(settings.cache_dir, "dependents.sqlite")
+    return indexes.get_or_set(path, lambda: DependentsIndex(path))
+
+
+def enqueue_dependents(index, job_queue, package, index_server=None, provider=None, branch=None):
+    """
+    Queues every repository that depends on `package` after a new release, so that only those
+    are updated. The cached releases of the package are dropped, the runs fetch them again.
+    :param index: DependentsIndex
+    :param job_queue: pyup.jobs.JobQueue
+    :param provider: string, only queue repositories of this provider
+    :param branch: string, only queue repositories that depend on the package on this branch
+    :return: list of dependents as returned by `DependentsIndex.lookup`
+    """
+    dependents = [
+        dependent for dependent in index.lookup(package, index_server)
+        if provider in (None, dependent["provider"]) and branch in (None, dependent["branch"])
+    ]
+    cache.packages.delete("{}{}".format(index_server or "", normalize(package)))
+    job_queue.requeue(sorted(set(dependent["repo"] for dependent in dependents)))
+    return dependents
@@ -10,6 +10,10 @@ class RepoDoesNotExistError(Exception):  # pragma: no cover
     pass
 
 
+class BranchDoesNotExistError(Exception):  # pragma: no cover
+    pass
+
+
 class UnsupportedScheduleError(Exception):  # pragma: no cover
     pass
 
@@ -18,3 +22,11 @@ class ConfigError(Exception):
     def __init__(self, content, error):
         self.error = error
         self.content = content
+
+
+class SnapshotMissError(Exception):
+    def __init__(self, section, key):
+        super(SnapshotMissError, self).__init__(
+            "{} for {} missing from the snapshot".format(section, key))
+        self.section = section
+        self.key = key
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, print_function, unicode_literals
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+def default_worker_id():
+    return "{}:{}".format(socket.gethostname(), os.getpid())
+
+
+class JobQueue(object):
+    """
+    Queue of repositories to update, kept in a SQLite file. Any number of worker processes,
+    on this host or on others sharing the file, can claim repositories from it. A claimed
+    repository is leased to its worker for `lease` seconds. The worker renews the lease with
+    heartbeats while it runs. Once a lease expires, another worker can claim the repository
+    again.
+    """
+
+    def __init__(self, path, lease=300, clock=time.time):
+        self.path = path
+        self.lease = lease
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=60, isolation_level=None,
+                                   check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "repo TEXT PRIMARY KEY, status TEXT NOT NULL, worker TEXT, heartbeat REAL, "
+            "attempts INTEGER NOT NULL DEFAULT 0, result TEXT)"
+        )
+
+    @contextmanager
+    def _transaction(self):
+        # take the write lock up front, so that no other worker can read rows that are about
+        # to change
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._db
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+
+    def add(self, repos):
+        """
+        Adds repositories as pending jobs. Repositories that are already queued are left alone.
+        """
+        with self._transaction() as db:
+            db.executemany(
+                "INSERT OR IGNORE INTO jobs (repo, status) VALUES (?, ?)",
+                ((repo, PENDING) for repo in repos)
+            )
+
+    def requeue(self, repos):
+        """
+        Adds repositories as pending jobs, queueing those that are done or failed again.
+        Repositories currently claimed by a worker are left alone.
+        """
+        with self._transaction() as db:
+            for repo in repos:
+                db.execute("INSERT OR IGNORE INTO jobs (repo, status) VALUES (?, ?)",
+                           (repo, PENDING))
+                db.execute(
+                    "UPDATE jobs SET status = ?, worker = NULL WHERE repo = ? AND status IN (?, ?)",
+                    (PENDING, repo, DONE, FAILED)
+                )
+
+    def claim(self, worker):
+        """
+        Claims the next pending repository, or one whose lease has expired.
+        :param worker: string identifying the worker
+        :return: string, name of the repository or None if there's nothing left to do
+        """
+        now = self.clock()
+        with self._transaction() as db:
+            row = db.execute(
+                "SELECT repo FROM jobs WHERE status = ? OR (status = ? AND heartbeat < ?) "
+                "ORDER BY attempts, repo LIMIT 1",
+                (PENDING, RUNNING, now - self.lease)
+            ).fetchone()
+            if row is not None:
+                db.execute(
+                    "UPDATE jobs SET status = ?, worker = ?, heartbeat = ?, "
+                    "attempts = attempts + 1 WHERE repo = ?",
+                    (RUNNING, worker, now, row[0])
+                )
+        return row[0] if row is not None else None
+
+    def heartbeat(self, worker, repos):
+        """
+        Renews the lease on the given repositories, as long as they are still claimed by
+        `worker`.
+        """
+        with self._lock:
+            self._db.executemany(
+                "UPDATE jobs SET heartbeat = ? WHERE repo = ? AND worker = ? AND status = ?",
+                ((self.clock(), repo, worker, RUNNING) for repo in repos)
+            )
+
+    def release(self, repo, worker, result):
+        """
+        Marks a claimed repository as done or failed, depending on `result["ok"]`.
+        :param result: dict, as returned by `pyup.batch.update_repo`
+        """
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = ?, result = ? WHERE repo = ? AND worker = ?",
+                (DONE if result.get("ok") else FAILED, json.dumps(result), repo, worker)
+            )
+
+    def retry_failed(self):
+        """
+        Puts all failed repositories back into the queue.
+        :return: int, number of repositories queued again
+        """
+        with self._lock:
+            return self._db.execute(
+                "UPDATE jobs SET status = ?, worker = NULL WHERE status = ?", (PENDING, FAILED)
+            ).rowcount
+
+    def counts(self):
+        """
+        :return: dict, status -> number of repositories
+        """
+        with self._lock:
+            return dict(self._db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status"))
+
+    def close(self):
+        self._db.close()
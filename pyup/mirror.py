@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, print_function, unicode_literals
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+from packaging.version import parse as parse_version, Version, InvalidVersion
+
+try:
+    from xmlrpc.client import ServerProxy
+except ImportError:  # pragma: no cover
+    from xmlrpclib import ServerProxy
+
+from pyup import settings
+from .cache import Cache
+
+logger = logging.getLogger(__name__)
+
+PYPI_XMLRPC_URL = "https://pypi.org/pypi"
+
+# path -> Mirror, shared by all bots in this process
+mirrors = Cache()
+
+
+def normalize(name):
+    # PEP 503
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+
+def is_valid_version(version):
+    """
+    :return: bool, whether `version` is a PEP 440 version. Releases with legacy versions can't be
+             ordered and are skipped. File names of some distribution types (bdist_dumb, e.g.
+             `numpy-1.0.win32.zip`) don't tell the version apart from the platform either.
+    """
+    try:
+        Version(version)
+    except InvalidVersion:
+        return False
+    return True
+
+
+class Mirror(object):
+    """
+    Local copy of the release lists of the PyPI packages the bot has come across, kept in a
+    SQLite file. Packages are added as they are fetched for the first time, `sync` keeps them up
+    to date by replaying the PyPI changelog since the last serial seen.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=60, isolation_level=None,
+                                   check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS packages (package TEXT PRIMARY KEY)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS releases (package TEXT NOT NULL, version TEXT NOT NULL, "
+            "PRIMARY KEY (package, version))"
+        )
+        self._db.execute("CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT)")
+
+    def _execute(self, statements):
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                for sql, params in statements:
+                    self._db.execute(sql, params)
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+
+    @property
+    def serial(self):
+        """
+        :return: int, serial of the last PyPI event applied, or None if never synced
+        """
+        with self._lock:
+            row = self._db.execute("SELECT value FROM state WHERE key = 'serial'").fetchone()
+        return int(row[0]) if row is not None else None
+
+    def get_versions(self, name):
+        """
+        :return: list of the releases of package `name`, newest first, or None if the package
+                 isn't mirrored
+        """
+        key = normalize(name)
+        with self._lock:
+            if self._db.execute("SELECT 1 FROM packages WHERE package = ?",
+                                (key,)).fetchone() is None:
+                return None
+            versions = [version for version, in self._db.execute(
+                "SELECT version FROM releases WHERE package = ?", (key,))]
+        # mirrors written by older versions may still hold legacy versions
+        return sorted(filter(is_valid_version, versions), key=parse_version, reverse=True)
+
+    def _set_statements(self, name, versions):
+        key = normalize(name)
+        yield "INSERT OR IGNORE INTO packages VALUES (?)", (key,)
+        yield "DELETE FROM releases WHERE package = ?", (key,)
+        for version in filter(is_valid_version, versions):
+            yield "INSERT OR IGNORE INTO releases VALUES (?, ?)", (key, version)
+
+    def set_versions(self, name, versions):
+        """
+        Mirrors package `name` with the given releases from now on.
+        """
+        self._execute(self._set_statements(name, versions))
+
+    def apply(self, events):
+        """
+        Applies PyPI changelog events to the mirrored packages, others are skipped.
+        :param events: list of (name, version, timestamp, action, serial) tuples
+        """
+        if not events:
+            return
+        with self._lock:
+            known = set(package for package, in self._db.execute("SELECT package FROM packages"))
+        statements = []
+        for name, version, _, action, _ in events:
+            key = normalize(name)
+            if key not in known:
+                continue
+            # yanked releases are left out, like in pyup.package.fetch_versions
+            if action in ("new release", "unyank release") and is_valid_version(version):
+                statements.append(("INSERT OR IGNORE INTO releases VALUES (?, ?)", (key, version)))
+            elif action in ("remove release", "yank release"):
+                statements.append(
+                    ("DELETE FROM releases WHERE package = ? AND version = ?", (key, version)))
+            elif action == "remove project":
+                statements.append(("DELETE FROM releases WHERE package = ?", (key,)))
+                statements.append(("DELETE FROM packages WHERE package = ?", (key,)))
+                known.discard(key)
+        serial = max(event[4] for event in events)
+        statements.append(
+            ("INSERT OR REPLACE INTO state VALUES ('serial', ?)", (str(serial),)))
+        self._execute(statements)
+
+    def sync(self, url=PYPI_XMLRPC_URL):
+        """
+        Replays the PyPI changelog since the last serial seen. A mirror that has never been
+        synced starts at the current serial.
+        :param url: string, XML-RPC endpoint of the index
+        :return: int, number of events read
+        """
+        proxy = ServerProxy(url)
+        serial = self.serial
+        if serial is None:
+            serial = proxy.changelog_last_serial()
+            self._execute([("INSERT OR REPLACE INTO state VALUES ('serial', ?)", (str(serial),))])
+        count = 0
+        while True:
+            # the index answers with a bounded batch of events, continue until there are none
+            events = proxy.changelog_since_serial(serial)
+            if not events:
+                break
+            self.apply(events)
+            count += len(events)
+            serial = self.serial
+        logger.info("Applied {} PyPI events, now at serial {}".format(count, serial))
+        return count
+
+    def load_dump(self, f):
+        """
+        Loads packages and the serial they are current as of from a JSON dump, as written by
+        `write_dump`.
+        """
+        dump = json.load(f)
+        statements = []
+        for name, versions in dump["packages"].items():
+            statements.extend(self._set_statements(name, versions))
+        if dump.get("serial") is not None:
+            statements.append(
+                ("INSERT OR REPLACE INTO state VALUES ('serial', ?)", (str(dump["serial"]),)))
+        self._execute(statements)
+
+    def write_dump(self, f):
+        packages = {}
+        with self._lock:
+            for package, in self._db.execute("SELECT package FROM packages"):
+                packages[package] = []
+            for package, version in self._db.execute("SELECT package, version FROM releases"):
+                packages[package].append(version)
+        json.dump({"serial": self.serial, "packages": packages}, f)
+
+    def close(self):
+        self._db.close()
+
+
+def get_mirror():
+    """
+    :return: Mirror configured in `settings.mirror_path`, or None
+    """
+    if not settings.mirror_path:
+        return None
+    directory = os.path.dirname(os.path.abspath(settings.mirror_path))
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    return mirrors.get_or_set(settings.mirror_path, lambda: Mirror(settings.mirror_path))
@@ -1,21 +1,180 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import, print_function, unicode_literals
 from packaging.version import parse as parse_version
+from collections import OrderedDict
 import requests
 
+try:
+    from html.parser import HTMLParser
+except ImportError:  # pragma: no cover
+    from HTMLParser import HTMLParser
+
+from pyup import cache
+from .mirror import get_mirror, normalize, is_valid_version
+from .snapshot import from_snapshot
+
+# PEP 691 JSON flavour of the simple repository API
+SIMPLE_JSON = "application/vnd.pypi.simple.v1+json"
+# PEP 503 HTML pages, served by indexes that don't support PEP 691
+SIMPLE_HTML = ("application/vnd.pypi.simple.v1+html", "text/html")
+ACCEPT = "{}, application/json;q=0.5, {};q=0.2, text/html;q=0.01".format(
+    SIMPLE_JSON, SIMPLE_HTML[0])
+
+SDIST_EXTENSIONS = (".tar.gz", ".tar.bz2", ".tar.xz", ".tgz", ".zip", ".tar")
+
 
 def fetch_package(name, index_server=None):
-    url = index_server + name if index_server else \
-        "https://pypi.org/pypi/{name}/json".format(name=name)
-    r = requests.get(url, timeout=3)
+    versions = from_snapshot(
+        "packages", "{}{}".format(index_server or "", normalize(name)),
+        lambda: fetch_versions(name, index_server)
+    )
+    return Package(name, versions) if versions is not None else None
+
+
+def fetch_versions(name, index_server=None):
+    """
+    :return: list of the releases of package `name`, newest first, or None if it doesn't exist
+    """
+    # PyPI packages are looked up in the local mirror first, if there is one
+    mirror = get_mirror() if not index_server else None
+    if mirror is not None:
+        versions = mirror.get_versions(name)
+        if versions is not None:
+            return versions
+    r = requests.get(get_project_url(name, index_server), timeout=3, headers={"Accept": ACCEPT})
     if r.status_code != 200:
         return None
-    json = r.json()
-    if index_server:
-        releases = sorted(json["result"].keys(), key=lambda v: parse_version(v), reverse=True)
+    content_type = r.headers.get("Content-Type", "").split(";")[0].strip()
+    if content_type == SIMPLE_JSON:
+        data = r.json()
+        # PEP 700 lists releases without files too
+        releases = get_simple_releases(name, data.get("files", []), data.get("versions"),
+                                       index_server)
+    elif content_type in SIMPLE_HTML:
+        releases = get_simple_releases(name, parse_simple_html(r.text),
+                                       index_server=index_server)
     else:
-        releases = sorted(json["releases"].keys(), key=lambda v: parse_version(v), reverse=True)
-    return Package(name, releases)
+        # indexes that don't implement the simple API answer with their own JSON flavour
+        data = r.json()
+        releases = list(data["result"].keys() if "result" in data else data["releases"].keys())
+    releases = sorted(set(filter(is_valid_version, releases)), key=lambda v: parse_version(v),
+                      reverse=True)
+    if mirror is not None:
+        mirror.set_versions(name, releases)
+    return releases
+
+
+def get_project_url(name, index_server=None):
+    """
+    :return: string, URL of the page listing the releases of package `name`
+    """
+    if not index_server:
+        index_server = "https://pypi.org/simple/"
+    if index_server.rstrip("/").endswith("/simple"):
+        # PEP 503 indexes serve the project under its normalized name, with a trailing slash
+        return "{}/{}/".format(index_server.rstrip("/"), normalize(name))
+    # devpi and PyPI-style JSON APIs are asked for the name as it is spelled
+    return index_server + name
+
+
+def get_simple_releases(name, files, versions=None, index_server=None):
+    """
+    :param files: list of dicts with `filename`, `hashes` and `yanked`, as in PEP 691
+    :param versions: list of all releases, if the index lists them
+    :return: list of releases that aren't yanked
+    """
+    files = parse_simple_files(name, files)
+    releases = [
+        version for version in versions or files
+        # releases where every file is yanked are ignored, like pip does
+        if version not in files or not all(f["yanked"] for f in files[version])
+    ]
+    if not index_server:
+        # spares hash-pinned requirements a request per release, see Requirement.get_hashes
+        for version in releases:
+            hashes = [{"hash": f["sha256"]} for f in files.get(version, []) if f["sha256"]]
+            if hashes:
+                cache.hashes.set((name.lower(), version), hashes)
+    return releases
+
+
+def parse_simple_files(name, files):
+    """
+    Groups the files of a simple API project page by release.
+    :param name: string, name of the project
+    :param files: list of dicts with `filename`, `hashes` and `yanked`, as in PEP 691
+    :return: dict, version -> list of dicts with `filename`, `yanked` and `sha256`
+    """
+    versions = OrderedDict()
+    for item in files:
+        version = get_filename_version(name, item["filename"])
+        if version is not None:
+            versions.setdefault(version, []).append({
+                "filename": item["filename"],
+                "yanked": bool(item.get("yanked", False)),
+                "sha256": (item.get("hashes") or {}).get("sha256"),
+            })
+    return versions
+
+
+class SimpleHTMLParser(HTMLParser):
+
+    def __init__(self):
+        HTMLParser.__init__(self)
+        self.files = []
+        self._file = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "a":
+            attrs = dict(attrs)
+            _, _, fragment = (attrs.get("href") or "").partition("#")
+            method, _, digest = fragment.partition("=")
+            self._file = {
+                "filename": "",
+                "hashes": {method: digest} if digest else {},
+                "yanked": "data-yanked" in attrs,
+            }
+
+    def handle_data(self, data):
+        if self._file is not None:
+            self._file["filename"] += data
+
+    def handle_endtag(self, tag):
+        if tag == "a" and self._file is not None:
+            self._file["filename"] = self._file["filename"].strip()
+            self.files.append(self._file)
+            self._file = None
+
+
+def parse_simple_html(html):
+    """
+    Reads the files of a PEP 503 project page, for indexes that don't serve PEP 691 JSON.
+    :return: list of dicts with `filename`, `hashes` and `yanked`, as in PEP 691
+    """
+    parser = SimpleHTMLParser()
+    parser.feed(html)
+    parser.close()
+    return parser.files
+
+
+def get_filename_version(name, filename):
+    """
+    Extracts the version from the filename of a wheel, sdist or egg.
+    :return: string, or None for unknown distribution types
+    """
+    if filename.endswith(".whl") or filename.endswith(".egg"):
+        parts = filename.split("-")
+        return parts[1] if len(parts) > 2 else None
+    for extension in SDIST_EXTENSIONS:
+        if filename.endswith(extension):
+            stem = filename[:-len(extension)]
+            # the project name may contain dashes itself
+            parts = stem.split("-")
+            for i in range(1, len(parts)):
+                if normalize("-".join(parts[:i])) == normalize(name):
+                    return "-".join(parts[i:])
+            return stem.rsplit("-", 1)[1] if "-" in stem else None
+    return None
 
 
 class Package(object):
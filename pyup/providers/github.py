@@ -2,36 +2,104 @@
 from __future__ import absolute_import, print_function
 import time
 import logging
-from github import Github, GithubException, UnknownObjectException, InputGitAuthor
-from ..errors import BranchExistsError, NoPermissionError, RepoDoesNotExistError
+import threading
+from github import Github, GithubException, UnknownObjectException, InputGitAuthor, \
+    RateLimitExceededException
+from github.GitRef import GitRef
+from github.Issue import Issue
+from github.PullRequest import PullRequest as GithubPullRequest
+from ..errors import BranchExistsError, NoPermissionError, RepoDoesNotExistError, \
+    BranchDoesNotExistError
+from ..cache import Cache
+from . import ratelimit
 
 logger = logging.getLogger(__name__)
 
+# (token, base url, ssl verification, limiter) -> Github client, kept for the lifetime of the
+# process so every token keeps its persistent connection
+clients = Cache()
+
+
+class ThreadLocalConnection(object):
+    """
+    PyGithub keeps a single connection per client and stores every request on it before
+    sending it, so concurrent requests would overwrite each other. This proxy gives every
+    thread a connection of its own.
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._local = threading.local()
+
+    def __getattr__(self, name):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._local.connection = self._factory()
+        return getattr(connection, name)
+
 
 class Provider(object):
-    def __init__(self, bundle, integration=False, url=None, ignore_ssl=False):
+    name = 'github'
+
+    def __init__(self, bundle, integration=False, url=None, ignore_ssl=False,
+                 limiter=ratelimit.limiter):
         self.bundle = bundle
         self.integration = integration
         self.url = url
         self.ignore_ssl = ignore_ssl
-        self.__api = None
-        self.__token = ''
+        self.limiter = limiter
+        # (repo, label name) -> label, looked up once per run
+        self._labels = {}
+        self._labels_lock = threading.Lock()
 
     @classmethod
     def is_same_user(cls, this, that):
         return this.login == that.login
 
     def _api(self, token):
-        if self.__api and token == self.__token:
-            return self.__api
-
-        # If we don't already have an instance or for some reason the token has changed
-        # we create a new instance
         verify = not self.ignore_ssl
-        self.__token = token
-        self.__api = Github(self.__token, base_url=self.url, timeout=50, verify=verify)
-        return self.__api
 
+        def create_client():
+            client = Github(token, base_url=self.url, timeout=50, verify=verify)
+            self._throttle(client, token)
+            return client
+
+        return clients.get_or_set((token, self.url, verify, self.limiter), create_client)
+
+    def _throttle(self, client, token):
+        # PyGithub doesn't expose its HTTP session, so we wrap the requester instead. Every
+        # request waits for the rate limiter and reports the budget of its response back. If
+        # the limit is hit anyway, we wait for the reset and try once more.
+        requester = client._Github__requester
+
+        def throttled(method):
+            def request(*args, **kwargs):
+                for attempt in range(2):
+                    self.limiter.wait(token)
+                    try:
+                        return method(*args, **kwargs)
+                    except RateLimitExceededException:
+                        if attempt:
+                            raise
+                    finally:
+                        if requester.rate_limiting_resettime:
+                            self.limiter.update(token, requester.rate_limiting[0],
+                                                requester.rate_limiting_resettime)
+            return request
+
+        for name in ("requestJsonAndCheck", "requestMultipartAndCheck", "requestBlobAndCheck"):
+            setattr(requester, name, throttled(getattr(requester, name)))
+
+        # the client is shared by threads, see ThreadLocalConnection
+        connection_class = requester._Requester__connectionClass
+        requester._Requester__connectionClass = lambda *args, **kwargs: ThreadLocalConnection(
+            lambda: connection_class(*args, **kwargs))
+
+    def get_rate_limit(self, token):
+        """
+        :return: int, API calls left for `token` or None if unknown
+        """
+        return self.limiter.remaining(token)
 
     def get_user(self, token):
         return self._api(token).get_user()
@@ -116,16 +184,38 @@ class Provider(object):
             )
         return None
 
-    def create_branch(self, repo, base_branch, new_branch):
+    def create_branch(self, repo, base_branch, new_branch, sha=None):
         try:
-            ref = repo.get_git_ref("/".join(["heads", base_branch]))
-            repo.create_git_ref(ref="refs/heads/" + new_branch, sha=ref.object.sha)
+            if sha is None:
+                sha = self.get_branch_sha(repo, base_branch)
+            repo.create_git_ref(ref="refs/heads/" + new_branch, sha=sha)
         except GithubException:
             raise BranchExistsError("The branch {} already exists on {}".format(
                 new_branch, repo.full_name
             ))
 
-    def is_empty_branch(self, repo, base_branch, new_branch, prefix):
+    def get_branch_sha(self, repo, branch):
+        try:
+            ref = repo.get_git_ref("/".join(["heads", branch]))
+        except UnknownObjectException:
+            raise BranchDoesNotExistError(branch)
+        return ref.object.sha
+
+    def iter_branches(self, repo, prefix):
+        """
+        Lists all branches starting with `prefix` in a single call.
+        :return: generator of (branch name, head sha) tuples
+        """
+        try:
+            for ref in repo.get_git_matching_refs("/".join(["heads", prefix])):
+                yield ref.ref[len("refs/heads/"):], ref.object.sha
+        except GithubException as e:
+            # a 409 status code means the repo is empty
+            if e.status != 409:
+                raise
+
+    def is_empty_branch(self, repo, base_branch, new_branch, prefix, base_sha=None,
+                        head_sha=None):
         """
         Compares the top commits of two branches.
         Please note: This function isn't checking if `base_branch` is a direct
@@ -135,10 +225,16 @@ class Provider(object):
         :param base_branch: string name of the base branch
         :param new_branch: string name of the new branch
         :param prefix: string branch prefix, default 'pyup-'
+        :param base_sha: string head sha of the base branch, if known
+        :param head_sha: string head sha of the new branch, if known
         :return: bool -- True if empty
         """
         # extra safeguard to make sure we are handling a bot branch here
         assert new_branch.startswith(prefix)
+        # both branches point to the same commit, no need to compare them
+        if base_sha is not None and base_sha == head_sha:
+            logger.info("{} points to the head of {}".format(new_branch, base_branch))
+            return True
         comp = repo.compare(base_branch, new_branch)
         logger.info("Got a total of {} commits in {}".format(comp.total_commits, new_branch))
         return comp.total_commits == 0
@@ -204,22 +300,59 @@ class Provider(object):
         )
 
     def get_pull_request_committer(self, repo, pull_request):
+        return list(self.iter_pull_request_committer(repo, pull_request))
+
+    def get_pull_request_head(self, repo, pull_request):
+        """
+        Records the head branch and sha of the pull request on `pull_request`.
+        """
         try:
-            return [
-                commit.committer
-                for commit in repo.get_pull(pull_request.number).get_commits()
-            ]
+            pr = repo.get_pull(pull_request.number)
         except UnknownObjectException:
-            return []
+            return
+        pull_request.head_ref = pr.head.ref
+        pull_request.head_sha = pr.head.sha
+
+    def iter_pull_request_committer(self, repo, pull_request):
+        """
+        Yields the committer of every commit in the pull request. Further pages of commits are
+        only fetched if the caller keeps iterating. The head of the pull request is recorded on
+        `pull_request` along the way, unless it is known already.
+        """
+        try:
+            if pull_request.head_sha is None:
+                pr = repo.get_pull(pull_request.number)
+                pull_request.head_ref = pr.head.ref
+                pull_request.head_sha = pr.head.sha
+            else:
+                # list the commits without fetching the pull request again
+                pr = GithubPullRequest(repo._requester, {}, {
+                    "url": "{}/pulls/{}".format(repo.url, pull_request.number),
+                    "number": pull_request.number,
+                }, completed=False)
+            for commit in pr.get_commits():
+                yield commit.committer
+        except UnknownObjectException:
+            return
 
     def close_pull_request(self, bot_repo, user_repo, pull_request, comment, prefix):
         try:
-            pull_request = bot_repo.get_pull(pull_request.number)
-            pull_request.create_issue_comment(comment)
-            pull_request.edit(state="closed")
+            head_ref = pull_request.head_ref
+            if head_ref is None:
+                head_ref = bot_repo.get_pull(pull_request.number).head.ref
             # make sure that the name of the branch begins with pyup.
-            assert pull_request.head.ref.startswith(prefix)
-            ref = user_repo.get_git_ref("/".join(["heads", pull_request.head.ref]))
+            assert head_ref.startswith(prefix)
+            # comment on and close the pull request through its issue and delete the branch
+            # without fetching any of them first
+            issue = Issue(bot_repo._requester, {}, {
+                "url": "{}/issues/{}".format(bot_repo.url, pull_request.number),
+                "number": pull_request.number,
+            }, completed=False)
+            issue.create_comment(comment)
+            issue.edit(state="closed")
+            ref = GitRef(user_repo._requester, {}, {
+                "url": "{}/git/refs/heads/{}".format(user_repo.url, head_ref),
+            }, completed=False)
             ref.delete()
         except UnknownObjectException:
             return False
@@ -235,17 +368,17 @@ class Provider(object):
                 base=base_branch,
                 head=new_branch
             )
-            if pr_label or assignees:
-                # we have to convert the PR to an issue internally because PRs don't
-                # support labels or assignees
-                issue = repo.get_issue(number=pr.number)
-
-                if pr_label:
-                    label = self.get_or_create_label(repo=repo, name=pr_label)
-                    if label:
-                        issue.add_to_labels(label)
-                if assignees:
-                    issue.edit(assignees=assignees)
+            extra_kwargs = {}
+            if pr_label and self.get_or_create_label(repo=repo, name=pr_label):
+                extra_kwargs["labels"] = [pr_label]
+            if assignees:
+                extra_kwargs["assignees"] = assignees
+            if extra_kwargs:
+                # PRs don't support labels or assignees, we have to edit the underlying issue.
+                # The issue is built lazily from the PR, fetching it would cost another call.
+                issue = Issue(pr._requester, {}, {"url": pr.issue_url, "number": pr.number},
+                              completed=False)
+                issue.edit(**extra_kwargs)
 
             return self.bundle.get_pull_request_class()(
                 state=pr.state,
@@ -260,6 +393,13 @@ class Provider(object):
                 "Unable to create pull request on {repo}".format(repo=repo))
 
     def get_or_create_label(self, repo, name):
+        key = (repo.full_name, name)
+        with self._labels_lock:
+            if key not in self._labels:
+                self._labels[key] = self._get_or_create_label(repo, name)
+            return self._labels[key]
+
+    def _get_or_create_label(self, repo, name):
         try:
             label = repo.get_label(name=name)
         except UnknownObjectException:
@@ -272,11 +412,15 @@ class Provider(object):
                 return None
         return label
 
-    def create_issue(self, repo, title, body):
+    def create_issue(self, repo, title, body, label=None):
+        extra_kwargs = {}
+        if label:
+            extra_kwargs["labels"] = [label]
         try:
             return repo.create_issue(
                 title=title,
                 body=body,
+                **extra_kwargs
             )
         except GithubException as e:
             # a 404/410 status code means the repo has issues disabled, return
@@ -285,12 +429,20 @@ class Provider(object):
                 return False
             raise
 
-    def iter_issues(self, repo, creator):
+    def iter_issues(self, repo, creator, label=None, since=None):
         # integrations don't support the creator param. Add this as extra kwarg
         # if we're not dealing with an integration token
         extra_kwargs = {}
+        # when syncing changes, closed issues are needed as well to drop them
+        if since is not None:
+            extra_kwargs["state"] = "all"
+            extra_kwargs["since"] = since
         if not self.integration:
             extra_kwargs["creator"] = creator.login
+        # if the bot labels its pull requests and issues, let the API do the filtering. This
+        # is the only way to narrow the listing down for integrations.
+        if label:
+            extra_kwargs["labels"] = [label]
 
         for issue in repo.get_issues(**extra_kwargs):
             yield self.bundle.get_pull_request_class()(
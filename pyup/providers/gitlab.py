@@ -3,11 +3,23 @@ from __future__ import absolute_import, print_function
 import logging
 from gitlab import Gitlab
 from gitlab.exceptions import GitlabGetError, GitlabCreateError
-from ..errors import BranchExistsError, RepoDoesNotExistError
+from ..errors import BranchExistsError, RepoDoesNotExistError, BranchDoesNotExistError
+from ..cache import Cache
+from . import ratelimit
 from base64 import b64encode
 
 logger = logging.getLogger(__name__)
 
+# largest page size the GitLab API allows
+PER_PAGE = 100
+
+# (host, token, ssl verification, limiter) -> Gitlab client, shared by all providers in this
+# process so every token keeps its HTTP session
+clients = Cache()
+
+# (host, token) -> the authenticated user
+users = Cache()
+
 
 class BadTokenError(Exception):
     pass
@@ -20,10 +32,12 @@ class Provider(object):
         def __init__(self, login):
             self.login = login
 
-    def __init__(self, bundle, intergration=False, url=None, ignore_ssl=False):
+    def __init__(self, bundle, intergration=False, url=None, ignore_ssl=False,
+                 limiter=ratelimit.limiter):
         self.bundle = bundle
         self.url = url
         self.ignore_ssl = ignore_ssl
+        self.limiter = limiter
         if intergration:
             raise NotImplementedError(
                 'Gitlab provider does not support integration mode')
@@ -32,24 +46,42 @@ class Provider(object):
     def is_same_user(cls, this, that):
         return this.login == that.login
 
-    def _api(self, token):
+    def _parse_token(self, token):
         parts = token.split('@')
         if len(parts) == 1:
-            host = self.url or 'https://gitlab.com'
-            auth = parts[0]
+            return self.url or 'https://gitlab.com', parts[0]
         elif len(parts) == 2:
             auth, host = parts
-        else:
-            raise BadTokenError(
-                'Got token "{}": format should be wither "apikey" for '
-                'gitlab.com, or "apikey@https://yourgitlab.local"'.format(
-                    token))
-        return Gitlab(host, auth, ssl_verify=(not self.ignore_ssl))
+            return host, auth
+        raise BadTokenError(
+            'Got token "{}": format should be wither "apikey" for '
+            'gitlab.com, or "apikey@https://yourgitlab.local"'.format(
+                token))
+
+    def _api(self, token):
+        host, auth = self._parse_token(token)
+        verify = not self.ignore_ssl
+        return clients.get_or_set(
+            (host, auth, verify, self.limiter),
+            lambda: Gitlab(host, auth, ssl_verify=verify,
+                           session=ratelimit.RateLimitedSession(self.limiter, token))
+        )
+
+    def get_rate_limit(self, token):
+        """
+        :return: int, API calls left for `token` or None if unknown
+        """
+        return self.limiter.remaining(token)
 
     def get_user(self, token):
-        gl = self._api(token)
-        gl.auth()
-        return gl.user
+        key = self._parse_token(token)
+        user = users.get(key)
+        if user is None:
+            gl = self._api(token)
+            gl.auth()
+            user = gl.user
+            users.set(key, user)
+        return user
 
     def get_repo(self, token, name):
         try:
@@ -67,7 +99,16 @@ class Provider(object):
         return True
 
     def iter_git_tree(self, repo, branch):
-        for item in repo.repository_tree(ref=branch, recursive=True, all=True):
+        # stream the tree page by page instead of loading all of it up front. Keyset
+        # pagination keeps deep pages cheap on large repos, GitLab versions that don't support
+        # it for the tree endpoint get offset pagination instead.
+        try:
+            items = repo.repository_tree(ref=branch, recursive=True, as_list=False,
+                                         per_page=PER_PAGE, pagination='keyset')
+        except GitlabGetError:
+            items = repo.repository_tree(ref=branch, recursive=True, as_list=False,
+                                         per_page=PER_PAGE)
+        for item in items:
             yield item['type'], item['path']
 
     def get_file(self, repo, path, branch):
@@ -104,15 +145,34 @@ class Provider(object):
             )
         return None
 
-    def create_branch(self, repo, base_branch, new_branch):
+    def create_branch(self, repo, base_branch, new_branch, sha=None):
         try:
             repo.branches.create({"branch": new_branch,
-                                  "ref": base_branch})
+                                  "ref": sha or base_branch})
         except GitlabCreateError as e:
             if e.error_message == 'Branch already exists':
                 raise BranchExistsError(new_branch)
 
-    def is_empty_branch(self, repo, base_branch, new_branch, prefix):
+    def get_branch_sha(self, repo, branch):
+        try:
+            return repo.branches.get(branch).commit['id']
+        except GitlabGetError as e:
+            if e.response_code == 404:
+                raise BranchDoesNotExistError(branch)
+            raise e
+
+    def iter_branches(self, repo, prefix):
+        """
+        Lists all branches starting with `prefix`.
+        :return: generator of (branch name, head sha) tuples
+        """
+        for branch in repo.branches.list(search="^" + prefix, as_list=False, per_page=PER_PAGE):
+            # older GitLab versions don't support anchored searches
+            if branch.name.startswith(prefix):
+                yield branch.name, branch.commit['id']
+
+    def is_empty_branch(self, repo, base_branch, new_branch, prefix, base_sha=None,
+                        head_sha=None):
         """
         Compares the top commits of two branches.
         Please note: This function isn't checking if `base_branch` is a direct
@@ -122,10 +182,16 @@ class Provider(object):
         :param base_branch: string name of the base branch
         :param new_branch: string name of the new branch
         :param prefix: string branch prefix, default 'pyup-'
+        :param base_sha: string head sha of the base branch, if known
+        :param head_sha: string head sha of the new branch, if known
         :return: bool -- True if empty
         """
         # extra safeguard to make sure we are handling a bot branch here
         assert new_branch.startswith(prefix)
+        # both branches point to the same commit, no need to compare them
+        if base_sha is not None and base_sha == head_sha:
+            logger.info("{} points to the head of {}".format(new_branch, base_branch))
+            return True
         comp = repo.repository_compare(base_branch, new_branch)
         n = len(comp.commits)
         logger.info("Got a total of {} commits in {}".format(n, new_branch))
@@ -155,18 +221,25 @@ class Provider(object):
         f.save(branch=branch, commit_message=commit_message)
 
     def get_pull_request_committer(self, repo, pull_request):
-        return [
-            self.Committer(participant['username'])
-            for participant in repo.mergerequests.get(pull_request.number).participants()
-        ]
+        return list(self.iter_pull_request_committer(repo, pull_request))
+
+    def get_pull_request_head(self, repo, pull_request):
+        mr = repo.mergerequests.get(pull_request.number)
+        pull_request.head_ref = mr.source_branch
+        pull_request.head_sha = mr.sha
+
+    def iter_pull_request_committer(self, repo, pull_request):
+        for participant in repo.mergerequests.get(pull_request.number).participants():
+            yield self.Committer(participant['username'])
 
     def close_pull_request(self, bot_repo, user_repo, pull_request, comment, prefix):
-        mr = user_repo.mergerequests.get(pull_request.number)
+        # no need to fetch the merge request to update it
+        mr = user_repo.mergerequests.get(pull_request.number, lazy=True)
         mr.state_event = 'close'
         mr.save()
         mr.notes.create({'body': comment})
 
-        source_branch = mr.changes()['source_branch']
+        source_branch = pull_request.head_ref or mr.changes()['source_branch']
         logger.info("Deleting source branch {}".format(source_branch))
         self.delete_branch(user_repo, source_branch, prefix)
 
@@ -181,14 +254,16 @@ class Provider(object):
                 logger.warning("PR body exceeds maximum length of 65536 chars, reducing")
                 body = body[:65536 - 1]
 
-            mr = repo.mergerequests.create({
+            data = {
                 'source_branch': new_branch,
                 'target_branch': base_branch,
                 'title': title,
                 'description': body,
-                'pr_label': pr_label,
                 'remove_source_branch': config.gitlab.should_remove_source_branch
-            })
+            }
+            if pr_label:
+                data['labels'] = pr_label
+            mr = repo.mergerequests.create(data)
 
             if config.gitlab.merge_when_pipeline_succeeds:
                 self._merge_merge_request(mr, config)
@@ -211,9 +286,9 @@ class Provider(object):
                         base_branch=base_branch))
 
                 comment = '# {title}\n{body}'.format(title=title, body=body)
-                # the exception doesn't say *which* MR is open, so we have to
-                # find it :(
-                for mr in repo.mergerequests.list(state='opened', all=True):
+                # the exception doesn't say *which* MR is open, look it up by its branches
+                for mr in repo.mergerequests.list(state='opened', source_branch=new_branch,
+                                                  target_branch=base_branch):
                     if (mr.source_branch == new_branch and mr.target_branch == base_branch):
                         mr.notes.create({'body': comment})
                         return self.bundle.get_pull_request_class()(
@@ -225,15 +300,26 @@ class Provider(object):
                             issue=False
                         )
 
-    def create_issue(self, repo, title, body):
-        return repo.issues.create({
+    def create_issue(self, repo, title, body, label=None):
+        data = {
             'title': title,
             'description': body
-        })
-
-    def iter_issues(self, repo, creator):
-        # TODO: handle creator
-        for issue in repo.mergerequests.list(state='opened', all=True):
+        }
+        if label:
+            data['labels'] = label
+        return repo.issues.create(data)
+
+    def iter_issues(self, repo, creator, label=None, since=None):
+        extra_kwargs = {}
+        if label:
+            extra_kwargs['labels'] = label
+        # when syncing changes, closed and merged requests are needed as well to drop them
+        if since is not None:
+            extra_kwargs['updated_after'] = since.isoformat()
+        else:
+            extra_kwargs['state'] = 'opened'
+        for issue in repo.mergerequests.list(author_id=creator.id, as_list=False,
+                                             per_page=PER_PAGE, **extra_kwargs):
             yield self.bundle.get_pull_request_class()(
                 state=issue.state,
                 title=issue.title,
@@ -241,4 +327,6 @@ class Provider(object):
                 created_at=issue.created_at,
                 number=issue.iid,
                 issue=True,
+                head_ref=issue.source_branch,
+                head_sha=issue.sha,
             )
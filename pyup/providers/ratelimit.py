@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, print_function
+import time
+import logging
+import threading
+import requests
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter(object):
+    """
+    Tracks the remaining API budget per token and paces calls accordingly. Once the budget is
+    down to `reserve` calls, callers are paused until the budget resets instead of failing
+    half way through a run. Below `pace_below` remaining calls, the remaining budget is spread
+    evenly over the time left until the reset.
+    """
+
+    def __init__(self, reserve=5, pace_below=100, clock=time.time, sleep=time.sleep):
+        self.reserve = reserve
+        self.pace_below = pace_below
+        self.clock = clock
+        self.sleep = sleep
+        self._budgets = {}
+        self._lock = threading.Lock()
+
+    def update(self, key, remaining, reset):
+        """
+        :param key: string, usually the token
+        :param remaining: int, calls left in the current window
+        :param reset: int, epoch seconds when the window resets
+        """
+        with self._lock:
+            self._budgets[key] = (int(remaining), int(reset))
+
+    def update_from_headers(self, key, headers):
+        """
+        Reads the budget from GitHub's `X-RateLimit-*` or GitLab's `RateLimit-*` headers.
+        """
+        for prefix in ("X-RateLimit-", "RateLimit-"):
+            remaining = headers.get(prefix + "Remaining")
+            reset = headers.get(prefix + "Reset")
+            if remaining is not None and reset is not None:
+                try:
+                    self.update(key, remaining, reset)
+                except ValueError:
+                    pass
+                return
+
+    def remaining(self, key):
+        """
+        :return: int, calls left for `key` or None if unknown or already reset
+        """
+        with self._lock:
+            budget = self._budgets.get(key)
+        if budget is None or budget[1] <= self.clock():
+            return None
+        return budget[0]
+
+    def wait(self, key):
+        """
+        Blocks until it's safe to do the next call with `key`.
+        """
+        with self._lock:
+            budget = self._budgets.get(key)
+        if budget is None:
+            return
+        remaining, reset = budget
+        seconds_left = reset - self.clock()
+        if seconds_left <= 0:
+            return
+        if remaining <= self.reserve:
+            logger.warning("API rate limit exhausted, pausing for {:.0f} seconds".format(
+                seconds_left))
+            self.sleep(seconds_left + 1)
+            with self._lock:
+                self._budgets.pop(key, None)
+        elif remaining < self.pace_below:
+            self.sleep(seconds_left / (remaining - self.reserve))
+
+
+class RateLimitedSession(requests.Session):
+    """
+    requests session that paces every request with the given limiter and reads the budget
+    from the response headers.
+    """
+
+    def __init__(self, limiter, key):
+        super(RateLimitedSession, self).__init__()
+        self.limiter = limiter
+        self.key = key
+
+    def send(self, request, **kwargs):
+        self.limiter.wait(self.key)
+        response = super(RateLimitedSession, self).send(request, **kwargs)
+        self.limiter.update_from_headers(self.key, response.headers)
+        return response
+
+
+# shared by all providers in this process
+limiter = RateLimiter()
@@ -13,17 +13,33 @@ class PullRequest(object):
     CONFIG_ERROR_TYPE = "config"
     UNKNOWN_TYPE = "unknown"
 
-    def __init__(self, state, title, url, created_at, number=None, issue=False):
+    def __init__(self, state, title, url, created_at, number=None, issue=False, head_ref=None,
+                 head_sha=None):
         self.state = state
         self.title = title
         self.url = url
         self.created_at = created_at
         self.number = number
         self.issue = issue
+        self.head_ref = head_ref
+        self.head_sha = head_sha
 
     def __eq__(self, other):
         return isinstance(other, self.__class__) and self.number == other.number
 
+    def as_dict(self):
+        """
+        Serializes the pull request to a JSON compatible dict, see `from_dict`.
+        """
+        data = dict(self.__dict__)
+        if hasattr(self.created_at, "isoformat"):
+            data["created_at"] = self.created_at.isoformat()
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
     def canonical_title(self, prefix):
         return self.title.replace("{} ".format(prefix), "") if prefix else self.title
 
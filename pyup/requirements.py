@@ -7,12 +7,15 @@ import requests
 from safety import safety
 from safety.errors import InvalidKeyError
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 from .updates import InitialUpdate, SequentialUpdate, ScheduledUpdate
 from .pullrequest import PullRequest
 import logging
-from .package import Package, fetch_package
-from pyup import settings
+from .package import Package, fetch_versions as fetch_package_versions
+from .mirror import normalize
+from .snapshot import from_snapshot
+from pyup import settings, cache
 from datetime import datetime
 from dparse import parse, parser, updater, filetypes
 from dparse.dependencies import Dependency
@@ -38,6 +41,29 @@ class RequirementsBundle(list):
     def has_file_in_path(self, path):
         return path in [req_file.path for req_file in self]
 
+    def resolve_hashes(self, updates):
+        """
+        Fetches the hashes of all hash-pinned requirements in `updates` concurrently. Once this
+        returns, `Requirement.update_content` is served from the hash cache.
+        :param updates: list of RequirementUpdate
+        """
+        pending = OrderedDict()
+        for update in updates:
+            requirement = update.requirement
+            if requirement.hashes:
+                key = (requirement.key, requirement.latest_version_within_specs)
+                if key not in pending and key not in cache.hashes:
+                    pending[key] = requirement
+        if not pending:
+            return
+        with ThreadPoolExecutor(max_workers=settings.max_workers) as executor:
+            futures = [
+                executor.submit(requirement.get_hashes, version)
+                for (_, version), requirement in pending.items()
+            ]
+            for future in futures:
+                future.result()
+
     def get_updates(self, initial, scheduled, config):
         return self.get_update_class(
             initial=initial,
@@ -58,6 +84,23 @@ class RequirementsBundle(list):
             for req in req_file.requirements:
                 yield req
 
+    def as_dict(self):
+        """
+        Summarizes the bundle as a JSON compatible dict: every requirement file with its
+        requirements and the pull request each requirement is updated in.
+        """
+        return {
+            "files": [{
+                "path": req_file.path,
+                "requirements": [{
+                    "name": req.name,
+                    "specs": str(req.specs),
+                    "latest_version_within_specs": req.latest_version_within_specs,
+                    "pull_request": req.pull_request.url if req.pull_request else None,
+                } for req in req_file.requirements],
+            } for req_file in self],
+        }
+
     def get_pull_request_class(self):  # pragma: no cover
         return PullRequest
 
@@ -390,10 +433,23 @@ class Requirement(object):
     @property
     def package(self):
         if not self._fetched_package:
-            self._package = fetch_package(self.name, self.index_server)
+            # one entry per project, however the requirement spells it
+            key = "{}{}".format(self.index_server or "", normalize(self.key))
+            versions = from_snapshot("packages", key, lambda: self.fetch_versions(key))
+            self._package = Package(self.name, versions) if versions is not None else None
             self._fetched_package = True
         return self._package
 
+    def fetch_versions(self, key):
+        # the releases are shared by all requirements of all repos in this process
+        entry = cache.packages.get_entry(key)
+        if entry is not None and cache.packages.is_fresh(entry):
+            return entry["value"]
+        # the snapshot was checked by the caller already, see `package`
+        versions = fetch_package_versions(self.name, self.index_server)
+        cache.packages.set(key, versions)
+        return versions
+
     @property
     def needs_update(self):
         if self.is_pinned or self.is_ranged:
@@ -406,47 +462,80 @@ class Requirement(object):
             if not settings.api_key:
                 self._is_insecure = False
             else:
-                self._is_insecure = len(safety.check(
-                    packages=(self,),
-                    cached=True,
-                    key=settings.api_key,
-                    db_mirror="",
-                    ignore_ids=()
-                )) != 0
+                self._is_insecure = from_snapshot(
+                    "vulnerabilities", "{}{}".format(self.key, self.specs), self.check_insecure)
 
         return self._is_insecure
 
+    def check_insecure(self):
+        key = "{}|{}{}".format(settings.api_key, self.key, self.specs)
+        is_insecure = cache.vulnerabilities.get(key)
+        if is_insecure is None:
+            is_insecure = len(safety.check(
+                packages=(self,),
+                cached=True,
+                key=settings.api_key,
+                db_mirror="",
+                ignore_ids=()
+            )) != 0
+            cache.vulnerabilities.set(key, is_insecure)
+        return is_insecure
+
     @property
     def changelog(self):
         if self._changelog is None:
             self._changelog = OrderedDict()
-            if settings.api_key:
-                r = requests.get(
-                    "https://pyup.io/api/v1/changelogs/{}/".format(self.key),
-                    headers={"X-Api-Key": settings.api_key}
-                )
-                if r.status_code == 403:
-                    raise InvalidKeyError
-                if r.status_code == 200:
-                    data = r.json()
-                    if data:
-                        # sort the changelog by release
-                        sorted_log = sorted(
-                            data.items(), key=lambda v: parse_version(v[0]), reverse=True)
-                        # go over each release and add it to the log if it's within the "upgrade
-                        # range" e.g. update from 1.2 to 1.3 includes a changelog for 1.2.1 but
-                        # not for 0.4.
-                        for version, log in sorted_log:
-                            parsed_version = parse_version(version)
-                            if self.is_pinned and parsed_version > parse_version(
-                                self.version) and parsed_version <= parse_version(
-                                    self.latest_version_within_specs):
-                                self._changelog[version] = log
-                            elif not self.is_pinned and parsed_version <= parse_version(
-                                    self.latest_version_within_specs):
-                                self._changelog[version] = log
+            releases = self.fetch_changelog() if settings.api_key else []
+            if releases:
+                # go over each release and add it to the log if it's within the "upgrade
+                # range" e.g. update from 1.2 to 1.3 includes a changelog for 1.2.1 but
+                # not for 0.4. Releases are sorted newest first.
+                latest = parse_version(self.latest_version_within_specs)
+                current = parse_version(self.version) if self.is_pinned else None
+                for version, log in releases:
+                    parsed_version = parse_version(version)
+                    if current is not None and parsed_version <= current:
+                        break
+                    if parsed_version <= latest:
+                        self._changelog[version] = log
         return self._changelog
 
+    def fetch_changelog(self):
+        """
+        Fetches the changelog for this package, served from the changelog store as long as
+        the stored entry is fresh. Expired entries are revalidated using their ETag.
+        :return: list of [version, log] pairs, newest release first
+        """
+        return from_snapshot("changelogs", self.key, self._fetch_changelog)
+
+    def _fetch_changelog(self):
+        releases = cache.changelogs.get(self.key)
+        if releases is not None:
+            return releases
+        entry = cache.changelogs.get_entry(self.key)
+        headers = {"X-Api-Key": settings.api_key}
+        if entry is not None and entry["etag"]:
+            headers["If-None-Match"] = entry["etag"]
+        r = requests.get(
+            "https://pyup.io/api/v1/changelogs/{}/".format(self.key),
+            headers=headers
+        )
+        if r.status_code == 403:
+            raise InvalidKeyError
+        if r.status_code == 304 and entry is not None:
+            cache.changelogs.touch(self.key)
+            return entry["value"]
+        if r.status_code != 200:
+            return []
+        data = r.json() or {}
+        # sort the changelog by release
+        releases = [
+            [version, log] for version, log in
+            sorted(data.items(), key=lambda v: parse_version(v[0]), reverse=True)
+        ]
+        cache.changelogs.set(self.key, releases, etag=r.headers.get("ETag"))
+        return releases
+
     @property
     def is_outdated(self):
         if self.version and self.latest_version_within_specs:
@@ -460,6 +549,16 @@ class Requirement(object):
         return self.name
 
     def get_hashes(self, version):
+        def get():
+            key = (self.key, version)
+            hashes = cache.hashes.get(key)
+            if hashes is None:
+                hashes = self.fetch_hashes(version)
+                cache.hashes.set(key, hashes)
+            return hashes
+        return from_snapshot("hashes", "{}=={}".format(self.key, version), get)
+
+    def fetch_hashes(self, version):
         r = requests.get('https://pypi.org/pypi/{name}/{version}/json'.format(
             name=self.key,
             version=version
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, print_function, unicode_literals
+import json
+import logging
+import os
+import socket
+import threading
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn, TCPServer
+except ImportError:  # pragma: no cover
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn, TCPServer
+
+from pyup import __version__
+from .batch import update_repo
+
+logger = logging.getLogger(__name__)
+
+# job keys passed on to Bot.update
+UPDATE_ARGS = ("branch", "initial", "scheduled", "push")
+
+
+class UpdateHandler(BaseHTTPRequestHandler):
+    """
+    `POST /update` runs an update for the JSON job in the request body and answers with the
+    result, see `pyup.batch.update_repo`. `GET /health` answers as long as the server is up.
+    """
+    server_version = "pyup/{}".format(__version__)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self.respond(200, {"ok": True})
+        else:
+            self.respond(404, {"ok": False, "error": "Not found"})
+
+    def do_POST(self):
+        if self.path != "/update":
+            self.respond(404, {"ok": False, "error": "Not found"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            job = json.loads(self.rfile.read(length).decode("utf-8"))
+            if not job.get("repo"):
+                raise ValueError("Job is missing the repo")
+        except (ValueError, AttributeError) as e:
+            self.respond(400, {"ok": False, "error": str(e)})
+            return
+        result = self.server.run_job(job)
+        self.respond(200 if result["ok"] else 500, result)
+
+    def respond(self, status, data):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self):
+        # clients on a unix socket don't have an address
+        return self.client_address[0] if self.client_address else "unix"
+
+    def log_message(self, format, *args):
+        logger.info("{} {}".format(self.address_string(), format % args))
+
+
+class UpdateServer(ThreadingMixIn, HTTPServer):
+    """
+    Long-lived server that runs update jobs. Caches and provider clients stay warm between
+    jobs. At most `workers` jobs run at a time and jobs for the same repository run one after
+    another.
+    :param create_bot: callable taking the job dict and returning a Bot
+    """
+    daemon_threads = True
+
+    def __init__(self, address, create_bot, workers=4):
+        HTTPServer.__init__(self, address, UpdateHandler)
+        self.create_bot = create_bot
+        self._slots = threading.BoundedSemaphore(workers)
+        # repo -> [lock, number of jobs holding or waiting for it]
+        self._repo_locks = {}
+        self._lock = threading.Lock()
+
+    def run_job(self, job):
+        kwargs = {key: job[key] for key in UPDATE_ARGS if key in job}
+        lock = self._acquire_repo(job["repo"])
+        try:
+            # jobs waiting for a busy repository don't take a slot away from other repositories
+            with lock, self._slots:
+                return update_repo(lambda repo: self.create_bot(job), job["repo"], **kwargs)
+        finally:
+            self._release_repo(job["repo"])
+
+    def _acquire_repo(self, repo):
+        with self._lock:
+            entry = self._repo_locks.setdefault(repo, [threading.Lock(), 0])
+            entry[1] += 1
+            return entry[0]
+
+    def _release_repo(self, repo):
+        # the lock is dropped with the last job that needs it
+        with self._lock:
+            entry = self._repo_locks[repo]
+            entry[1] -= 1
+            if not entry[1]:
+                del self._repo_locks[repo]
+
+
+class UnixUpdateServer(UpdateServer):
+    address_family = socket.AF_UNIX
+
+    def server_bind(self):
+        if os.path.exists(self.server_address):
+            # left over by a previous server
+            os.remove(self.server_address)
+        TCPServer.server_bind(self)
+        self.server_name = "localhost"
+        self.server_port = 0
+
+
+def make_server(create_bot, host="127.0.0.1", port=8642, socket_path=None, workers=4):
+    """
+    :param socket_path: string, listen on this unix socket instead of `host` and `port`
+    :return: UpdateServer
+    """
+    if socket_path:
+        return UnixUpdateServer(socket_path, create_bot, workers=workers)
+    return UpdateServer((host, port), create_bot, workers=workers)
@@ -1,6 +1,37 @@
 api_key = None
+# number of threads used to fetch package data concurrently
+max_workers = 10
+# number of sequential update pull requests opened concurrently
+pr_workers = 1
+# directory used to persist caches and state between runs, see pyup.cache.Store
+cache_dir = None
+# SQLite file with a local copy of PyPI release lists, see pyup.mirror
+mirror_path = None
+# JSON file package data is read from instead of the network, see pyup.snapshot
+snapshot_path = None
+# whether data missing from the snapshot is fetched and added to it
+record_snapshot = False
+# whether bot pull requests and issues are listed by their label only, see
+# Bot.sync_pull_requests. Only safe if every one of them carries the label of `label_prs`
+filter_by_label = False
 
 
-def configure(key=None):
-    global api_key
+def configure(key=None, workers=None, cache=None, pull_request_workers=None, mirror=None,
+              snapshot=None, record=None, label_filter=None):
+    global api_key, max_workers, pr_workers, cache_dir, mirror_path, snapshot_path, \
+        record_snapshot, filter_by_label
     api_key = key
+    if workers is not None:
+        max_workers = workers
+    if pull_request_workers is not None:
+        pr_workers = pull_request_workers
+    if cache is not None:
+        cache_dir = cache
+    if mirror is not None:
+        mirror_path = mirror
+    if snapshot is not None:
+        snapshot_path = snapshot
+    if record is not None:
+        record_snapshot = record
+    if label_filter is not None:
+        filter_by_label = label_filter
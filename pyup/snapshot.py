@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, print_function, unicode_literals
+import json
+import os
+import threading
+
+from pyup import settings
+from .cache import Cache
+from .errors import SnapshotMissError
+
+# the kinds of package data a snapshot holds, and what they're keyed by
+SECTIONS = (
+    "packages",  # index server + package key -> list of releases, newest first, or None
+    "hashes",  # package key==version -> list of hashes
+    "changelogs",  # package key -> list of [version, changelog] pairs, newest release first
+    "vulnerabilities",  # package key + specs -> whether the requirement is insecure
+)
+
+# path -> Snapshot
+snapshots = Cache()
+
+
+class Snapshot(object):
+    """
+    Package data for update runs without network access to PyPI and pyup.io. Every lookup is
+    answered from the snapshot, a lookup the snapshot can't answer raises SnapshotMissError.
+    While recording, missing data is fetched as usual and added to the snapshot instead.
+    """
+
+    def __init__(self, data=None, record=False):
+        data = data or {}
+        self.data = dict((section, dict(data.get(section) or {})) for section in SECTIONS)
+        self.record = record
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path, record=False):
+        if record and not os.path.exists(path):
+            return cls(record=True)
+        with open(path) as f:
+            return cls(json.load(f), record=record)
+
+    def save(self, path):
+        with self._lock:
+            data = json.dumps(self.data, indent=2, sort_keys=True)
+        with open(path, "w") as f:
+            f.write(data)
+
+    def lookup(self, section, key, fetch):
+        """
+        :param section: string, one of SECTIONS
+        :param key: string
+        :param fetch: callable returning the value, only called while recording
+        """
+        with self._lock:
+            if key in self.data[section]:
+                return self.data[section][key]
+        if not self.record:
+            raise SnapshotMissError(section, key)
+        value = fetch()
+        with self._lock:
+            self.data[section][key] = value
+        return value
+
+
+def get_snapshot():
+    """
+    :return: Snapshot configured in `settings.snapshot_path`, or None
+    """
+    if not settings.snapshot_path:
+        return None
+    return snapshots.get_or_set(
+        settings.snapshot_path,
+        lambda: Snapshot.load(settings.snapshot_path, record=settings.record_snapshot)
+    )
+
+
+def from_snapshot(section, key, fetch):
+    """
+    Looks up `key` in the configured snapshot, or calls `fetch` if there is none.
+    """
+    snapshot = get_snapshot()
+    if snapshot is None:
+        return fetch()
+    return snapshot.lookup(section, key, fetch)
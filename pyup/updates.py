@@ -1,7 +1,8 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import, print_function, unicode_literals
 import os
-from collections import namedtuple
+from collections import namedtuple, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from jinja2 import Environment, FileSystemLoader
 from .errors import UnsupportedScheduleError
@@ -91,6 +92,21 @@ class BundledUpdate(Update):
                  self.should_update(update.requirement, update.requirement_file)]
             )
 
+    @classmethod
+    def fetch_changelogs(cls, updates):
+        """
+        Fetches the changelogs for all packages in `updates` concurrently, so that rendering
+        the body doesn't have to do one request per requirement.
+        :param updates: list of RequirementUpdate
+        """
+        if not settings.api_key:
+            return
+        requirements = OrderedDict((u.requirement.key, u.requirement) for u in updates)
+        with ThreadPoolExecutor(max_workers=settings.max_workers) as executor:
+            futures = [executor.submit(r.fetch_changelog) for r in requirements.values()]
+            for future in futures:
+                future.result()
+
     @classmethod
     def get_branch(cls):  # pragma: no cover
         raise NotImplementedError
@@ -112,6 +128,7 @@ class ScheduledUpdate(BundledUpdate):
 
     @classmethod
     def get_body(cls, updates):
+        cls.fetch_changelogs(updates)
         env = Environment(loader=FileSystemLoader(TEMPLATES_DIR))
         changelogs = [u.requirement for u in updates if u.requirement.changelog != {}]
         return env.get_template(
@@ -146,6 +163,7 @@ class InitialUpdate(BundledUpdate):
 
     @classmethod
     def get_body(cls, updates):
+        cls.fetch_changelogs(updates)
         env = Environment(loader=FileSystemLoader(TEMPLATES_DIR))
         changelogs = [u.requirement for u in updates if u.requirement.changelog != {}]
         return env.get_template(
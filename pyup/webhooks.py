@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, print_function, unicode_literals
+from collections import namedtuple
+
+# the sha GitHub and GitLab send as `before` when a branch is created
+NULL_SHA = "0" * 40
+
+# branch: name of the pushed branch
+# before/after: head of the branch before and after the push
+# paths: set of paths added, modified or removed by the push, or None if the event doesn't
+#        list all of them
+PushEvent = namedtuple("PushEvent", ["branch", "before", "after", "paths"])
+
+
+def parse_push_event(payload):
+    """
+    Reads a GitHub or GitLab push webhook payload.
+    :param payload: dict, the decoded JSON payload
+    :return: PushEvent, or None if the event isn't a push to a branch
+    """
+    ref = payload.get("ref") or ""
+    if not ref.startswith("refs/heads/"):
+        return None
+    before, after = payload.get("before"), payload.get("after")
+    commits = payload.get("commits") or []
+
+    paths = set()
+    for commit in commits:
+        for key in ("added", "modified", "removed"):
+            paths.update(commit.get(key) or [])
+    complete = (
+        before and before != NULL_SHA and
+        # history has been rewritten, the commits don't describe the difference to `before`
+        not payload.get("forced") and
+        # GitLab only lists the 20 latest commits of a push
+        payload.get("total_commits_count", len(commits)) <= len(commits)
+    )
+    return PushEvent(
+        branch=ref[len("refs/heads/"):],
+        before=before,
+        after=after,
+        paths=paths if complete else None,
+    )
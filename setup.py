@@ -16,7 +16,7 @@ with open('HISTORY.rst') as history_file:
 
 requirements = [
     "requests",
-    "pygithub>=1.43.3",
+    "pygithub>=1.50",
     "click",
     "tqdm",
     "pyyaml>=4.2b4",
@@ -64,6 +64,10 @@ setup(
     entry_points={
         'console_scripts': [
             'pyup = pyup.cli:main',
+            'pyup-batch = pyup.cli:batch',
+            'pyup-serve = pyup.cli:serve',
+            'pyup-release = pyup.cli:release',
+            'pyup-mirror = pyup.cli:mirror',
         ]
     }
 )
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, print_function, unicode_literals
+from unittest import TestCase
+from mock import Mock, patch
+from click.testing import CliRunner
+import json
+import os
+import shutil
+import tempfile
+
+from pyup.batch import read_repos, update_repo, run, run_queue, parse_shard, in_shard
+from pyup.jobs import JobQueue
+from pyup.cli import batch
+from pyup.requirements import RequirementsBundle
+
+
+def bot_factory(repo):
+    bot = Mock(skipped=False, postponed=[])
+    bot.update.return_value = RequirementsBundle()
+    if repo == "broken/repo":
+        bot.update.side_effect = ValueError("broken")
+    return bot
+
+
+class ReadReposTest(TestCase):
+
+    def test_read_repos(self):
+        lines = ["foo/bar\n", "\n", "# a comment\n", "  baz/qux  # trailing comment\n"]
+        self.assertEqual(list(read_repos(lines)), ["foo/bar", "baz/qux"])
+
+
+class ShardTest(TestCase):
+
+    def test_parse_shard(self):
+        self.assertEqual(parse_shard("1/4"), (1, 4))
+        for shard in ("4/4", "-1/4", "1", "a/b"):
+            with self.assertRaises(ValueError):
+                parse_shard(shard)
+
+    def test_in_shard(self):
+        repos = ["repo/{}".format(i) for i in range(100)]
+        shards = [list(in_shard(repos, i, 3)) for i in range(3)]
+        self.assertEqual(sorted(sum(shards, [])), sorted(repos))
+        self.assertTrue(all(shards))
+        # the assignment doesn't depend on the order of the repositories
+        self.assertEqual(sorted(in_shard(reversed(repos), 1, 3)), sorted(shards[1]))
+
+
+class UpdateRepoTest(TestCase):
+
+    def test_success(self):
+        bot = bot_factory("foo/bar")
+        result = update_repo(lambda repo: bot, "foo/bar", branch="master")
+        bot.update.assert_called_once_with(branch="master")
+        self.assertEqual(result["repo"], "foo/bar")
+        self.assertEqual(result["ok"], True)
+        self.assertEqual(result["skipped"], False)
+        self.assertEqual(result["files"], [])
+        self.assertIn("seconds", result)
+
+    def test_error(self):
+        result = update_repo(bot_factory, "broken/repo")
+        self.assertEqual(result["ok"], False)
+        self.assertEqual(result["error"], "ValueError: broken")
+
+
+class RunTest(TestCase):
+
+    def test_run(self):
+        results = list(run(bot_factory, ["foo/bar", "broken/repo", "baz/qux"], workers=2))
+        self.assertEqual(
+            sorted((result["repo"], result["ok"]) for result in results),
+            [("baz/qux", True), ("broken/repo", False), ("foo/bar", True)]
+        )
+
+    def test_run_queue(self):
+        path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, path)
+        queue = JobQueue(os.path.join(path, "jobs.sqlite"))
+        self.addCleanup(queue.close)
+        queue.add(["foo/bar", "broken/repo", "baz/qux"])
+
+        results = list(run_queue(bot_factory, queue, "worker", workers=2))
+        self.assertEqual(sorted(result["repo"] for result in results),
+                         ["baz/qux", "broken/repo", "foo/bar"])
+        self.assertEqual(queue.counts(), {"done": 2, "failed": 1})
+
+    @patch("pyup.cli.Bot")
+    def test_cli(self, bot):
+        bot.side_effect = lambda repo, **kwargs: bot_factory(repo)
+        result = CliRunner().invoke(batch, ["--user-token", "token"], input="foo/bar\nbaz/qux\n")
+        self.assertEqual(result.exit_code, 0)
+        lines = [json.loads(line) for line in result.output.splitlines()]
+        self.assertEqual(sorted(line["repo"] for line in lines), ["baz/qux", "foo/bar"])
+
+        result = CliRunner().invoke(batch, ["--user-token", "token"], input="broken/repo\n")
+        self.assertEqual(result.exit_code, 1)
+
+    @patch("pyup.cli.Bot")
+    def test_cli_shard(self, bot):
+        bot.side_effect = lambda repo, **kwargs: bot_factory(repo)
+        repos = "".join("repo/{}\n".format(i) for i in range(10))
+        seen = []
+        for shard in ("0/2", "1/2"):
+            result = CliRunner().invoke(batch, ["--user-token", "token", "--shard", shard],
+                                        input=repos)
+            seen += [json.loads(line)["repo"] for line in result.output.splitlines()]
+        self.assertEqual(sorted(seen), sorted(repos.split()))
+
+        result = CliRunner().invoke(batch, ["--user-token", "token", "--shard", "2/2"],
+                                    input=repos)
+        self.assertEqual(result.exit_code, 2)
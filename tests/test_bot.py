@@ -4,10 +4,15 @@ from unittest import TestCase
 from pyup.bot import Bot
 from .test_pullrequest import pullrequest_factory
 from pyup.updates import RequirementUpdate, InitialUpdate
-from pyup.requirements import RequirementFile
-from pyup.errors import NoPermissionError, ConfigError
+from pyup.requirements import RequirementFile, Requirement
+from pyup.errors import NoPermissionError, ConfigError, BranchDoesNotExistError
 from pyup.config import RequirementConfig
-from mock import Mock, patch
+from pyup import settings, cache
+from pyup.dependents import indexes
+from mock import Mock, patch, ANY, PropertyMock
+import os
+import shutil
+import tempfile
 
 
 def bot_factory(repo="foo/foo", user_token="foo", bot_token=None,
@@ -21,6 +26,8 @@ def bot_factory(repo="foo/foo", user_token="foo", bot_token=None,
     bot._fetched_prs = True
     bot.req_bundle.pull_requests = prs
     bot.provider = Mock()
+    bot.provider.get_rate_limit.return_value = None
+    bot.provider.iter_branches.return_value = []
     bot.config.update_config({
         "close_prs": True,
         "pin": True,
@@ -74,6 +81,79 @@ class BotPullRequestsTest(TestCase):
         bot.pull_requests
         self.assertEqual(bot.provider.iter_issues.call_count, 1)
 
+    @patch.object(settings, "filter_by_label", True)
+    def test_iter_issues_label(self):
+        bot = bot_factory()
+        bot._fetched_prs = False
+        bot.config.label_prs = "pyup"
+        bot.provider.iter_issues = Mock(return_value=[])
+        bot.pull_requests
+        bot.provider.iter_issues.assert_called_once_with(
+            repo=bot.user_repo, creator=bot.user, label="pyup")
+
+    def test_unlabeled_issues(self):
+        # bot issues opened before label_prs was set aren't labeled
+        bot = bot_factory()
+        bot._fetched_prs = False
+        bot.config.label_prs = "pyup"
+        bot.provider.iter_issues = Mock(
+            side_effect=lambda label, **kwargs: [] if label else [
+                pullrequest_factory("Invalid .pyup.yml detected", number=1),
+                pullrequest_factory("Initial Update", number=2),
+            ])
+        bot.provider.get_file.return_value = "foo: bar: baz: fii:", None
+        with self.assertRaises(ConfigError):
+            bot.get_repo_config(bot.user_repo)
+        self.assertFalse(bot.provider.create_issue.called)
+        self.assertEqual([pr.title for pr in bot.pull_requests],
+                         ["Invalid .pyup.yml detected", "Initial Update"])
+
+
+class BotSyncPullRequestsTest(TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+        patcher = patch.object(settings, "cache_dir", self.cache_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        cache.pull_requests.clear()
+        self.addCleanup(cache.pull_requests.clear)
+
+    def sync(self, prs):
+        bot = bot_factory()
+        bot.provider.name = "github"
+        bot.provider.iter_issues.return_value = prs
+        return bot, bot.sync_pull_requests()
+
+    def test_incremental_sync(self):
+        bot, prs = self.sync([
+            pullrequest_factory("Update foo", number=1),
+            pullrequest_factory("Update bar", number=2),
+        ])
+        self.assertEqual([pr.number for pr in prs], [1, 2])
+        self.assertNotIn("since", bot.provider.iter_issues.call_args[1])
+
+        # the next run only fetches what changed, #1 got closed and #3 is new
+        cache.pull_requests.clear()
+        bot, prs = self.sync([
+            pullrequest_factory("Update foo", number=1, state="closed"),
+            pullrequest_factory("Update baz", number=3),
+        ])
+        self.assertEqual([pr.number for pr in prs], [2, 3])
+        self.assertEqual([pr.title for pr in prs], ["Update bar", "Update baz"])
+        self.assertIn("since", bot.provider.iter_issues.call_args[1])
+
+    @patch.object(settings, "filter_by_label", True)
+    def test_filters_changed(self):
+        self.sync([pullrequest_factory("Update foo", number=1)])
+        bot = bot_factory()
+        bot.provider.name = "github"
+        bot.config.label_prs = "pyup"
+        bot.provider.iter_issues.return_value = []
+        self.assertEqual(bot.sync_pull_requests(), [])
+        self.assertNotIn("since", bot.provider.iter_issues.call_args[1])
+
 
 class BotRepoConfigTest(TestCase):
 
@@ -211,6 +291,78 @@ class BotApplyUpdateTest(TestCase):
 
         self.assertEqual(the_requirement.pull_request, the_pull)
 
+    def test_apply_update_budget_exhausted(self):
+        the_requirement = Mock()
+        bot = bot_factory(bot_token="bot token")
+        bot.provider.get_rate_limit.side_effect = lambda token: {"foo": 4000, "bot token": 9}[token]
+        self.assertEqual(bot.pull_request_budget(), 0)
+
+        bot.req_bundle.get_updates = Mock()
+        update = RequirementUpdate(
+            requirement_file="foo", requirement=the_requirement, commit_message="foo"
+        )
+        bot.req_bundle.get_updates.return_value = [("The PR", "", "", [update])]
+        bot.commit_and_pull = Mock()
+        bot.apply_updates(initial=False, scheduled=False)
+
+        bot.commit_and_pull.assert_not_called()
+        self.assertEqual(bot.postponed, ["The PR"])
+
+        bot.provider.get_rate_limit.side_effect = None
+        bot.provider.get_rate_limit.return_value = None
+        self.assertEqual(bot.pull_request_budget(), None)
+
+    @patch.object(settings, "pr_workers", 3)
+    def test_apply_update_concurrently(self):
+        import time
+        bot = bot_factory(bot_token="bot token", prs=[])
+        bot.req_bundle.get_updates = Mock()
+        requirements = [Mock() for _ in range(3)]
+        bot.req_bundle.get_updates.return_value = [
+            ("PR {}".format(i), "", "branch-{}".format(i), [
+                RequirementUpdate(requirement_file="foo", requirement=req, commit_message="foo")
+            ])
+            for i, req in enumerate(requirements)
+        ]
+        pulls = {}
+
+        def commit_and_pull(initial, new_branch, title, body, updates):
+            # the first pipeline finishes last
+            time.sleep(0.05 if title == "PR 0" else 0)
+            pulls[title] = pullrequest_factory(title)
+            bot.pull_requests.append(pulls[title])
+            return pulls[title]
+
+        bot.commit_and_pull = Mock(side_effect=commit_and_pull)
+        bot.close_stale_prs = Mock()
+        bot.apply_updates(initial=False, scheduled=False)
+
+        self.assertEqual([pr.title for pr in bot.pull_requests], ["PR 0", "PR 1", "PR 2"])
+        self.assertEqual([req.pull_request for req in requirements],
+                         [pulls["PR 0"], pulls["PR 1"], pulls["PR 2"]])
+        self.assertEqual([c[1]["pull_request"] for c in bot.close_stale_prs.call_args_list],
+                         [pulls["PR 0"], pulls["PR 1"], pulls["PR 2"]])
+        bot.commit_and_pull.assert_any_call(initial=False, new_branch="pyup-branch-1",
+                                            title="PR 1", body="", updates=ANY)
+
+    @patch.object(settings, "pr_workers", 3)
+    def test_apply_update_concurrently_budget(self):
+        bot = bot_factory(prs=[])
+        bot.provider.get_rate_limit.return_value = 25
+        bot.req_bundle.get_updates = Mock()
+        bot.req_bundle.get_updates.return_value = [
+            ("PR {}".format(i), "", "branch-{}".format(i), [
+                RequirementUpdate(requirement_file="foo", requirement=Mock(),
+                                  commit_message="foo")
+            ])
+            for i in range(3)
+        ]
+        bot.commit_and_pull = Mock(return_value=None)
+        bot.apply_updates(initial=False, scheduled=False)
+
+        self.assertEqual(bot.commit_and_pull.call_count, 2)
+        self.assertEqual(bot.postponed, ["PR 2"])
+
     def test_apply_update_with_prefix_pull_request_new(self):
         the_requirement = Mock()
         the_pull = pullrequest_factory("The PR")
@@ -381,6 +533,40 @@ class BotCommitAndPullTest(TestCase):
         bot.create_branch = Mock(return_value=False)
         self.assertEqual(bot.commit_and_pull(None, None, None, None, None), None)
 
+    def test_resume_from_checkpoint(self):
+        self.addCleanup(cache.checkpoints.clear)
+        bot = bot_factory()
+        bot.create_pull_request = Mock()
+        requirement = Mock()
+        requirement.update_content.side_effect = lambda content, _: content + " updated"
+        updates = [
+            RequirementUpdate(
+                requirement_file=RequirementFile(path=path, content=path, sha=path + "-sha"),
+                requirement=requirement,
+                commit_message="update " + path
+            ) for path in ("foo.txt", "bar.txt")
+        ]
+        # the first attempt dies after the first commit
+        bot.provider.create_commit.side_effect = ["foo-sha2", Exception("rate limited")]
+        with self.assertRaises(Exception):
+            bot.commit_and_pull(True, "pyup-initial-update", "Initial Update", "", updates)
+        self.assertFalse(bot.create_pull_request.called)
+
+        # the retry finds the existing branch and only commits what's left
+        bot.create_branch = Mock(return_value=False)
+        bot.provider.create_commit.reset_mock()
+        bot.provider.create_commit.side_effect = ["bar-sha2"]
+        bot.provider.get_file.return_value = "foo.txt updated", Mock()
+        bot.commit_and_pull(True, "pyup-initial-update", "Initial Update", "", updates)
+
+        bot.provider.create_commit.assert_called_once()
+        self.assertEqual(bot.provider.create_commit.call_args[1]["path"], "bar.txt")
+        bot.provider.get_file.assert_called_once_with(
+            bot.user_repo, "foo.txt", "pyup-initial-update")
+        self.assertTrue(bot.create_pull_request.called)
+        self.assertEqual(
+            cache.checkpoints.get(bot.checkpoint_key("pyup-initial-update")), None)
+
 
 class CreateBranchTest(TestCase):
 
@@ -388,7 +574,36 @@ class CreateBranchTest(TestCase):
         bot = bot_factory()
         self.assertEqual(bot.create_branch("new-branch", delete_empty=False), True)
         bot.provider.create_branch.assert_called_once_with(
-            base_branch="base_branch", new_branch="new-branch", repo=bot.user_repo)
+            base_branch="base_branch", new_branch="new-branch", repo=bot.user_repo,
+            sha=bot.provider.get_branch_sha.return_value)
+        self.assertIn("new-branch", bot.branches)
+        bot.provider.get_branch_sha.assert_called_once_with(bot.user_repo, "base_branch")
+
+    def test_base_sha_resolved_once(self):
+        bot = bot_factory()
+        bot.create_branch("pyup-one")
+        bot.create_branch("pyup-two")
+        self.assertEqual(bot.provider.create_branch.call_count, 2)
+        self.assertEqual(bot.provider.get_branch_sha.call_count, 1)
+        self.assertEqual(bot.provider.iter_branches.call_count, 1)
+
+    def test_listed_branch_exists(self):
+        bot = bot_factory()
+        bot.provider.iter_branches.return_value = [("pyup-foo", "sha")]
+        self.assertEqual(bot.create_branch("pyup-foo", delete_empty=False), False)
+        bot.provider.create_branch.assert_not_called()
+        bot.provider.iter_branches.assert_called_once_with(bot.user_repo, "pyup-")
+
+    def test_listed_branch_empty(self):
+        bot = bot_factory()
+        bot.provider.iter_branches.return_value = [("pyup-foo", "sha")]
+        bot.provider.is_empty_branch.return_value = True
+        self.assertEqual(bot.create_branch("pyup-foo", delete_empty=True), True)
+        self.assertEqual(bot.provider.delete_branch.call_count, 1)
+        self.assertEqual(bot.provider.create_branch.call_count, 1)
+        bot.provider.is_empty_branch.assert_called_once_with(
+            bot.user_repo, "base_branch", "pyup-foo", "pyup-",
+            base_sha=bot.provider.get_branch_sha.return_value, head_sha="sha")
 
     def test_error_dont_delete(self):
         from pyup.errors import BranchExistsError
@@ -465,6 +680,20 @@ class BotGetAllRequirementsTest(TestCase):
         bot.get_all_requirements()
         self.assertEqual(bot.add_requirement_file.called, True)
 
+    def test_files_fetched_while_walking_tree(self):
+        bot = bot_factory()
+        bot.provider.iter_git_tree.return_value = [
+            ("blob", "requirements/dev.txt"), ("blob", "foo.py"), ("blob", "requirements.txt"),
+            ("blob", "setup.cfg"),
+        ]
+        bot.provider.get_requirement_file.side_effect = \
+            lambda path, repo, branch: RequirementFile(path, "")
+        bot.get_all_requirements()
+        self.assertEqual([f.path for f in bot.req_bundle],
+                         ["requirements/dev.txt", "requirements.txt", "setup.cfg"])
+        self.assertEqual(bot.provider.get_requirement_file.call_count, 3)
+        self.assertEqual(len(bot._prefetched_files), 0)
+
     def test_no_search(self):
         bot = bot_factory()
         bot.config.search = False
@@ -686,29 +915,31 @@ class CloseStalePRsTestCase(TestCase):
         self.other_pr.get_requirement.return_value = "some-req"
         self.other_pr.is_update = True
         self.other_pr.is_initial = False
+        self.other_pr.head_sha = None
+        cache.committers.clear()
 
     def test_scheduled_closing_scheduled(self):
         self.pr.is_scheduled = True
         self.other_pr.is_scheduled = True
         bot = bot_factory(bot_token="foo", prs=[self.other_pr])
         commiter = Mock()
-        bot.provider.get_pull_request_committer.return_value = [commiter]
+        bot.provider.iter_pull_request_committer.return_value = [commiter]
 
         bot.close_stale_prs(self.update, self.pr, True)
 
-        bot.provider.get_pull_request_committer.assert_called_once_with(bot.user_repo,
-                                                                        self.other_pr)
+        bot.provider.iter_pull_request_committer.assert_called_once_with(
+            bot.user_repo, self.other_pr)
 
     def test_scheduled_closing_update(self):
         self.pr.is_scheduled = True
         bot = bot_factory(bot_token="foo", prs=[self.other_pr])
         commiter = Mock()
-        bot.provider.get_pull_request_committer.return_value = [commiter]
+        bot.provider.iter_pull_request_committer.return_value = [commiter]
 
         bot.close_stale_prs(self.update, self.pr, True)
 
-        bot.provider.get_pull_request_committer.assert_called_once_with(bot.user_repo,
-                                                                        self.other_pr)
+        bot.provider.iter_pull_request_committer.assert_called_once_with(
+            bot.user_repo, self.other_pr)
 
     def test_no_bot_token(self):
         bot = bot_factory()
@@ -722,16 +953,17 @@ class CloseStalePRsTestCase(TestCase):
 
         bot.close_stale_prs(self.update, self.pr, False)
 
-        bot.provider.get_pull_request_committer.assert_not_called()
+        bot.provider.iter_pull_request_committer.assert_not_called()
 
     def test_close_success(self):
         bot = bot_factory(bot_token="foo", prs=[self.other_pr])
         commiter = Mock()
-        bot.provider.get_pull_request_committer.return_value = [commiter]
+        bot.provider.iter_pull_request_committer.return_value = [commiter]
 
         bot.close_stale_prs(self.update, self.pr, False)
 
-        bot.provider.get_pull_request_committer.assert_called_once_with(bot.user_repo, self.other_pr)
+        bot.provider.iter_pull_request_committer.assert_called_once_with(
+            bot.user_repo, self.other_pr)
         bot.provider.close_pull_request.assert_called_once_with(
             bot_repo=bot.bot_repo,
             user_repo=bot.user_repo,
@@ -745,11 +977,12 @@ class CloseStalePRsTestCase(TestCase):
         bot.integration = True
         bot.provider.integration = True
         commiter = Mock()
-        bot.provider.get_pull_request_committer.return_value = [commiter]
+        bot.provider.iter_pull_request_committer.return_value = [commiter]
 
         bot.close_stale_prs(self.update, self.pr, False)
 
-        bot.provider.get_pull_request_committer.assert_called_once_with(bot.user_repo, self.other_pr)
+        bot.provider.iter_pull_request_committer.assert_called_once_with(
+            bot.user_repo, self.other_pr)
         bot.provider.close_pull_request.assert_called_once_with(
             bot_repo=bot.bot_repo,
             user_repo=bot.user_repo,
@@ -762,11 +995,12 @@ class CloseStalePRsTestCase(TestCase):
         bot = bot_factory(bot_token="foo", prs=[self.other_pr])
         bot.config.pr_prefix = "Some Prefix"
         commiter = Mock()
-        bot.provider.get_pull_request_committer.return_value = [commiter]
+        bot.provider.iter_pull_request_committer.return_value = [commiter]
 
         bot.close_stale_prs(self.update, self.pr, False)
 
-        bot.provider.get_pull_request_committer.assert_called_once_with(bot.user_repo, self.other_pr)
+        bot.provider.iter_pull_request_committer.assert_called_once_with(
+            bot.user_repo, self.other_pr)
         bot.provider.close_pull_request.assert_called_once_with(
             bot_repo=bot.bot_repo,
             user_repo=bot.user_repo,
@@ -779,22 +1013,22 @@ class CloseStalePRsTestCase(TestCase):
         bot = bot_factory(bot_token="foo", prs=[self.other_pr])
         self.other_pr.is_update = False
         commiter = Mock()
-        bot.provider.get_pull_request_committer.return_value = [commiter]
+        bot.provider.iter_pull_request_committer.return_value = [commiter]
 
         bot.close_stale_prs(self.update, self.pr, False)
 
-        bot.provider.get_pull_request_committer.assert_not_called()
+        bot.provider.iter_pull_request_committer.assert_not_called()
         bot.provider.close_pull_request.assert_not_called()
 
     def test_pr_closed(self):
         bot = bot_factory(bot_token="foo", prs=[self.other_pr])
         self.other_pr.is_open = False
         commiter = Mock()
-        bot.provider.get_pull_request_committer.return_value = [commiter]
+        bot.provider.iter_pull_request_committer.return_value = [commiter]
 
         bot.close_stale_prs(self.update, self.pr, False)
 
-        bot.provider.get_pull_request_committer.assert_not_called()
+        bot.provider.iter_pull_request_committer.assert_not_called()
         bot.provider.close_pull_request.assert_not_called()
 
     def test_same_title(self):
@@ -803,11 +1037,11 @@ class CloseStalePRsTestCase(TestCase):
         self.other_pr.title = "First PR"
         self.other_pr.canonical_title.return_value = "First PR"
         commiter = Mock()
-        bot.provider.get_pull_request_committer.return_value = [commiter]
+        bot.provider.iter_pull_request_committer.return_value = [commiter]
 
         bot.close_stale_prs(self.update, self.pr, False)
 
-        bot.provider.get_pull_request_committer.assert_not_called()
+        bot.provider.iter_pull_request_committer.assert_not_called()
         bot.provider.close_pull_request.assert_not_called()
 
 
@@ -815,34 +1049,100 @@ class CloseStalePRsTestCase(TestCase):
         bot = bot_factory(bot_token="foo", prs=[self.other_pr])
         self.other_pr.get_requirement.return_value = "other-req"
         commiter = Mock()
-        bot.provider.get_pull_request_committer.return_value = [commiter]
+        bot.provider.iter_pull_request_committer.return_value = [commiter]
 
         bot.close_stale_prs(self.update, self.pr, False)
 
-        bot.provider.get_pull_request_committer.assert_not_called()
+        bot.provider.iter_pull_request_committer.assert_not_called()
         bot.provider.close_pull_request.assert_not_called()
 
     def test_more_than_one_committer(self):
         bot = bot_factory(bot_token="foo", prs=[self.other_pr])
         commiter, commiter1 = Mock(), Mock()
-        bot.provider.get_pull_request_committer.return_value = [commiter, commiter1]
+        bot.provider.iter_pull_request_committer.return_value = [commiter, commiter1]
 
         bot.close_stale_prs(self.update, self.pr, False)
 
-        bot.provider.get_pull_request_committer.assert_called_once_with(bot.user_repo, self.other_pr)
+        bot.provider.iter_pull_request_committer.assert_called_once_with(
+            bot.user_repo, self.other_pr)
         bot.provider.close_pull_request.assert_not_called()
 
     def test_committer_is_not_bot_user(self):
         bot = bot_factory(bot_token="foo", prs=[self.other_pr])
         commiter = Mock()
-        bot.provider.get_pull_request_committer.return_value = [commiter]
+        bot.provider.iter_pull_request_committer.return_value = [commiter]
         bot.provider.is_same_user.return_value = False
 
         bot.close_stale_prs(self.update, self.pr, False)
 
-        bot.provider.get_pull_request_committer.assert_called_once_with(bot.user_repo, self.other_pr)
+        bot.provider.iter_pull_request_committer.assert_called_once_with(
+            bot.user_repo, self.other_pr)
         bot.provider.close_pull_request.assert_not_called()
 
+    def test_close_concurrently(self):
+        prs = []
+        for i in range(3):
+            pr = Mock(number=i, is_open=True, is_update=True, head_sha=None)
+            pr.canonical_title.return_value = "Update PR {}".format(i)
+            pr.get_requirement.return_value = "some-req"
+            prs.append(pr)
+        bot = bot_factory(bot_token="foo", prs=list(prs))
+        bot.provider.iter_pull_request_committer.side_effect = \
+            lambda repo, pr: [Mock()] if pr.number != 1 else []
+
+        bot.close_stale_prs(self.update, self.pr, False)
+
+        self.assertEqual(bot.provider.close_pull_request.call_count, 2)
+        self.assertEqual(bot.pull_requests, [prs[1]])
+        self.assertEqual([pr.state for pr in (prs[0], prs[2])], ["closed", "closed"])
+
+    def test_committer_stops_at_second_committer(self):
+        bot = bot_factory(bot_token="foo", prs=[self.other_pr])
+        third = Mock()
+        committers = iter([Mock(login="bot"), Mock(login="user"), third])
+        bot.provider.iter_pull_request_committer.return_value = committers
+
+        self.assertFalse(bot.is_bot_the_only_committer(self.other_pr))
+        self.assertEqual(next(committers), third)
+
+    def test_committer_verdict_cached_by_head_sha(self):
+        bot = bot_factory(bot_token="foo", prs=[self.other_pr])
+        self.other_pr.head_sha = "abc"
+        bot.provider.iter_pull_request_committer.return_value = [Mock()]
+
+        self.assertTrue(bot.is_bot_the_only_committer(self.other_pr))
+        self.assertTrue(bot.is_bot_the_only_committer(self.other_pr))
+        self.assertEqual(bot.provider.iter_pull_request_committer.call_count, 1)
+
+        self.other_pr.head_sha = "def"
+        bot.provider.iter_pull_request_committer.return_value = []
+        self.assertFalse(bot.is_bot_the_only_committer(self.other_pr))
+        self.assertEqual(bot.provider.iter_pull_request_committer.call_count, 2)
+
+    def test_committer_verdict_dropped_on_close(self):
+        bot = bot_factory(bot_token="foo", prs=[self.other_pr])
+        self.other_pr.head_sha = "abc"
+        bot.provider.iter_pull_request_committer.return_value = [Mock()]
+
+        bot.close_stale_prs(self.update, self.pr, False)
+
+        self.assertEqual(bot.provider.close_pull_request.call_count, 1)
+        self.assertIsNone(cache.committers.get(bot.committer_key(self.other_pr)))
+
+    def test_committer_verdict_cached_by_fetched_head_sha(self):
+        # GitHub listings don't know the head of a pull request, it is fetched first
+        def get_pull_request_head(repo, pr):
+            pr.head_sha = "abc"
+
+        bot = bot_factory(bot_token="foo")
+        bot.provider.get_pull_request_head.side_effect = get_pull_request_head
+        bot.provider.iter_pull_request_committer.return_value = [Mock()]
+        for _ in range(2):
+            # every run lists the pull requests again
+            self.assertTrue(bot.is_bot_the_only_committer(pullrequest_factory("Update foo")))
+        self.assertEqual(bot.provider.get_pull_request_head.call_count, 2)
+        self.assertEqual(bot.provider.iter_pull_request_committer.call_count, 1)
+
 
 class ConflictingUpdateTest(TestCase):
 
@@ -914,3 +1214,215 @@ class IgnoreSslTest(TestCase):
     def test_ignore_ssl_true(self):
         bot = Bot(repo='foo/foo', user_token='foo', ignore_ssl=True)
         self.assertTrue(bot.provider.ignore_ssl)
+
+
+class BotFingerprintTest(TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+        patcher = patch.object(settings, "cache_dir", self.cache_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        cache.fingerprints.clear()
+        self.addCleanup(cache.fingerprints.clear)
+
+    def run_bot(self, sha="sha", **kwargs):
+        bot = bot_factory()
+        bot.provider.name = "github"
+        bot.provider.get_file.return_value = None, None
+        bot.provider.get_branch_sha.return_value = sha
+        bot.get_all_requirements = Mock()
+        bot.read_kept_requirements = Mock(return_value=False)
+        bot.apply_updates = Mock()
+        req_file = RequirementFile("requirements.txt", "django==1.8")
+        req_file._requirements = [Mock(index_server=None, package=Mock(versions=["1.9"]))]
+        req_file._requirements[0].name = req_file._requirements[0].key = "django"
+        req_file._requirements[0].specs = "==1.8"
+        req_file._requirements[0].is_insecure = False
+        bot.req_bundle.append(req_file)
+        bot.update(branch="base_branch", **kwargs)
+        return bot
+
+    @patch("pyup.bot.fetch_package")
+    def test_unchanged_run_is_skipped(self, fetch_package):
+        fetch_package.return_value = Mock(versions=["1.9"])
+        self.assertTrue(self.run_bot().apply_updates.called)
+        bot = self.run_bot()
+        self.assertFalse(bot.apply_updates.called)
+        fetch_package.assert_called_once_with("django", None)
+        self.assertEqual(bot.provider.get_branch_sha.call_count, 1)
+
+    @patch("pyup.bot.fetch_package")
+    def test_new_sha(self, fetch_package):
+        fetch_package.return_value = Mock(versions=["1.9"])
+        self.run_bot()
+        self.assertTrue(self.run_bot(sha="other sha").apply_updates.called)
+
+    @patch("pyup.bot.fetch_package")
+    def test_deleted_branch(self, fetch_package):
+        fetch_package.return_value = Mock(versions=["1.9"])
+        self.run_bot()
+        # the branch of the last run is gone, e.g. the default branch was renamed
+        bot = bot_factory()
+        bot.provider.name = "github"
+        bot.provider.get_branch_sha.side_effect = BranchDoesNotExistError("base_branch")
+        self.assertFalse(bot.is_unchanged(branch="base_branch"))
+
+    @patch("pyup.bot.fetch_package")
+    def test_new_release(self, fetch_package):
+        fetch_package.return_value = Mock(versions=["1.10"])
+        self.run_bot()
+        self.assertTrue(self.run_bot().apply_updates.called)
+
+    @patch("pyup.bot.fetch_package")
+    def test_different_run(self, fetch_package):
+        fetch_package.return_value = Mock(versions=["1.9"])
+        self.run_bot()
+        self.assertTrue(self.run_bot(initial=True).apply_updates.called)
+        self.assertTrue(self.run_bot(scheduled=True).apply_updates.called)
+
+    @patch("pyup.bot.fetch_package")
+    @patch.object(settings, "api_key", "key")
+    def test_new_vulnerability(self, fetch_package):
+        fetch_package.return_value = Mock(versions=["1.9"])
+        self.run_bot()
+        with patch.object(Requirement, "is_insecure", new_callable=PropertyMock) as is_insecure:
+            is_insecure.return_value = False
+            self.assertFalse(self.run_bot().apply_updates.called)
+            is_insecure.return_value = True
+            self.assertTrue(self.run_bot().apply_updates.called)
+
+    @patch("pyup.bot.fetch_package")
+    def test_new_api_key(self, fetch_package):
+        fetch_package.return_value = Mock(versions=["1.9"])
+        self.run_bot()
+        with patch.object(settings, "api_key", "key"):
+            self.assertTrue(self.run_bot().apply_updates.called)
+
+    def test_no_cache_dir(self):
+        with patch.object(settings, "cache_dir", None):
+            self.run_bot()
+            self.assertTrue(self.run_bot().apply_updates.called)
+            self.assertEqual(len(cache.fingerprints._data), 0)
+
+
+class BotPushTest(TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+        patcher = patch.object(settings, "cache_dir", self.cache_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        for store in (cache.fingerprints, cache.requirement_files):
+            store.clear()
+            self.addCleanup(store.clear)
+        patcher = patch.object(Requirement, "package", new_callable=PropertyMock)
+        self.package = patcher.start()
+        self.package.return_value = Mock(versions=["1.0"])
+        self.addCleanup(patcher.stop)
+        patcher = patch("pyup.bot.fetch_package")
+        patcher.start().side_effect = lambda name, index_server: self.package.return_value
+        self.addCleanup(patcher.stop)
+        self.addCleanup(indexes.clear)
+        self.files = {
+            "requirements.txt": "-r requirements/base.txt\ndjango==1.8",
+            "requirements/base.txt": "flask==0.10",
+        }
+
+    def get_requirement_file(self, repo, path, branch):
+        if path in self.files:
+            return RequirementFile(path, self.files[path])
+        return None
+
+    def run_bot(self, sha, push=None):
+        bot = bot_factory()
+        bot.provider.name = "github"
+        bot.provider.get_file.return_value = None, None
+        bot.provider.get_branch_sha.return_value = sha
+        bot.provider.iter_git_tree.return_value = [("blob", path) for path in self.files]
+        bot.provider.get_requirement_file.side_effect = self.get_requirement_file
+        bot.apply_updates = Mock()
+        bot.update(branch="base_branch", push=push)
+        return bot
+
+    def push(self, paths, before="sha", after="new sha", **kwargs):
+        payload = {
+            "ref": "refs/heads/base_branch",
+            "before": before,
+            "after": after,
+            "commits": [{"added": [], "modified": paths, "removed": []}],
+        }
+        payload.update(kwargs)
+        return payload
+
+    def paths(self, bot):
+        return sorted(req_file.path for req_file in bot.req_bundle)
+
+    def fetched(self, bot):
+        return sorted(c[1]["path"] for c in bot.provider.get_requirement_file.call_args_list)
+
+    def test_only_changed_files_are_read(self):
+        self.run_bot("sha")
+        self.files["requirements/base.txt"] = "flask==1.0"
+        bot = self.run_bot("new sha", push=self.push(["requirements/base.txt", "README.md"]))
+        self.assertFalse(bot.provider.iter_git_tree.called)
+        self.assertEqual(self.fetched(bot), ["requirements/base.txt"])
+        self.assertEqual(self.paths(bot), ["requirements.txt", "requirements/base.txt"])
+        self.assertEqual(
+            [r.specs for r in bot.req_bundle.requirements if r.name == "flask"][0], "==1.0")
+        # the next push builds on this one
+        bot = self.run_bot("third sha", push=self.push(
+            ["README.md"], before="new sha", after="third sha"))
+        self.assertEqual(self.fetched(bot), [])
+        self.assertEqual(len(bot.req_bundle), 2)
+
+    def test_new_and_removed_files(self):
+        self.run_bot("sha")
+        self.files["requirements/test.txt"] = "pytest==1.0"
+        del self.files["requirements/base.txt"]
+        bot = self.run_bot("new sha", push=self.push(
+            ["requirements/test.txt", "requirements/base.txt"]))
+        self.assertFalse(bot.provider.iter_git_tree.called)
+        self.assertEqual(self.paths(bot), ["requirements.txt", "requirements/test.txt"])
+
+    def test_falls_back_to_search(self):
+        self.run_bot("sha")
+        pushes = [
+            # head moved on since the push
+            self.push(["README.md"], after="other sha"),
+            # not the run the files were kept from
+            self.push(["README.md"], before="other sha"),
+            self.push(["README.md"], ref="refs/heads/other_branch"),
+            self.push(["README.md"], forced=True),
+            self.push([".pyup.yml"]),
+        ]
+        for push in pushes:
+            bot = self.run_bot("new sha", push=push)
+            self.assertTrue(bot.provider.iter_git_tree.called)
+            self.assertEqual(len(bot.req_bundle), 2)
+            cache.requirement_files.clear()
+            self.run_bot("sha")
+
+    def test_no_files_kept(self):
+        bot = self.run_bot("new sha", push=self.push(["README.md"]))
+        self.assertTrue(bot.provider.iter_git_tree.called)
+
+    def test_files_kept_if_base_branch_unchanged(self):
+        self.run_bot("sha")
+        # a new release makes the next run go ahead
+        self.package.return_value = Mock(versions=["2.0"])
+        bot = self.run_bot("sha")
+        self.assertTrue(bot.apply_updates.called)
+        self.assertFalse(bot.provider.iter_git_tree.called)
+        self.assertEqual(self.fetched(bot), [])
+        self.assertEqual(self.paths(bot), ["requirements.txt", "requirements/base.txt"])
+
+    def test_dependents_are_indexed(self):
+        bot = self.run_bot("sha")
+        index = indexes.get(os.path.join(self.cache_dir, "dependents.sqlite"))
+        self.assertEqual(index.lookup("flask"), [{
+            "provider": "github", "repo": bot.repo_name, "branch": "base_branch",
+            "files": {"requirements/base.txt": "==0.10"}}])
+        index.close()
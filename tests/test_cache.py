@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, print_function, unicode_literals
+from unittest import TestCase
+import shutil
+import tempfile
+from pyup import cache, settings
+from mock import patch
+
+
+class CacheTest(TestCase):
+
+    def test_get_set(self):
+        c = cache.Cache()
+        self.assertEqual(c.get("foo"), None)
+        self.assertFalse("foo" in c)
+        c.set("foo", "bar")
+        self.assertEqual(c.get("foo"), "bar")
+        self.assertTrue("foo" in c)
+        self.assertEqual(len(c), 1)
+        c.clear()
+        self.assertEqual(len(c), 0)
+
+
+class StoreTest(TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+
+    def test_memory_only(self):
+        with patch.object(settings, "cache_dir", None):
+            store = cache.Store("foo")
+            store.set("key", [1, 2])
+            self.assertEqual(store.get("key"), [1, 2])
+            store.clear()
+            self.assertEqual(store.get("key"), None)
+
+    def test_persisted(self):
+        with patch.object(settings, "cache_dir", self.cache_dir):
+            cache.Store("foo").set("owner/repo", {"a": 1}, etag="xyz")
+            store = cache.Store("foo")
+            self.assertEqual(store.get("owner/repo"), {"a": 1})
+            self.assertEqual(store.get_entry("owner/repo")["etag"], "xyz")
+            store.delete("owner/repo")
+            self.assertEqual(cache.Store("foo").get("owner/repo"), None)
+
+    def test_ttl(self):
+        with patch.object(settings, "cache_dir", self.cache_dir):
+            store = cache.Store("foo", ttl=60)
+            store.set("key", "value")
+            store.get_entry("key")["stored_at"] -= 61
+            self.assertEqual(store.get("key"), None)
+            self.assertEqual(store.get("key", "default"), "default")
+            self.assertEqual(store.get_entry("key")["value"], "value")
+            store.touch("key")
+            self.assertEqual(store.get("key"), "value")
+
+    def test_changed_by_other_process(self):
+        with patch.object(settings, "cache_dir", self.cache_dir):
+            store, other = cache.Store("foo"), cache.Store("foo")
+            store.set("key", "value")
+            self.assertEqual(other.get("key"), "value")
+            store.set("key", "new value")
+            self.assertEqual(other.get("key"), "new value")
+            store.delete("key")
+            self.assertEqual(other.get("key"), None)
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, print_function, unicode_literals
+from unittest import TestCase
+from mock import patch, PropertyMock
+import os
+import shutil
+import tempfile
+
+from pyup import settings, cache
+from pyup.dependents import DependentsIndex, get_index, enqueue_dependents, indexes
+from pyup.jobs import JobQueue
+from pyup.requirements import RequirementFile, Requirement
+
+
+def bundle(**files):
+    return [RequirementFile(path, content) for path, content in sorted(files.items())]
+
+
+class DependentsIndexTest(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.index = DependentsIndex(os.path.join(self.dir, "dependents.sqlite"))
+        self.addCleanup(self.index.close)
+        patcher = patch.object(Requirement, "package", new_callable=PropertyMock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_lookup(self):
+        self.index.update("github", "foo/bar", "master", bundle(**{
+            "requirements.txt": "Django==1.8\nflask",
+            "dev.txt": "django>=1.7",
+        }))
+        self.index.update("gitlab", "baz/qux", "main", bundle(**{
+            "requirements.txt": "django<2",
+        }))
+        self.assertEqual(self.index.lookup("Django"), [
+            {"provider": "github", "repo": "foo/bar", "branch": "master",
+             "files": {"dev.txt": ">=1.7", "requirements.txt": "==1.8"}},
+            {"provider": "gitlab", "repo": "baz/qux", "branch": "main",
+             "files": {"requirements.txt": "<2"}},
+        ])
+        self.assertEqual(self.index.lookup("flask")[0]["files"], {"requirements.txt": ""})
+        self.assertEqual(self.index.lookup("requests"), [])
+
+    def test_normalized_names(self):
+        self.index.update("github", "foo/bar", "master", bundle(**{
+            "requirements.txt": "Flask_SQLAlchemy==2.5\nzope.interface",
+        }))
+        self.index.update("github", "baz/qux", "master", bundle(**{
+            "requirements.txt": "flask-sqlalchemy<3\nzope-interface",
+        }))
+        for name in ("flask-sqlalchemy", "Flask_SQLAlchemy", "flask.sqlalchemy"):
+            self.assertEqual([d["repo"] for d in self.index.lookup(name)], ["baz/qux", "foo/bar"])
+        for name in ("zope.interface", "zope_interface"):
+            self.assertEqual([d["repo"] for d in self.index.lookup(name)], ["baz/qux", "foo/bar"])
+
+    def test_update_replaces_branch(self):
+        self.index.update("github", "foo/bar", "master", bundle(**{"a.txt": "django\nflask"}))
+        self.index.update("github", "foo/bar", "dev", bundle(**{"a.txt": "flask"}))
+        self.index.update("github", "foo/bar", "master", bundle(**{"a.txt": "django"}))
+        self.assertEqual([d["branch"] for d in self.index.lookup("flask")], ["dev"])
+        self.assertEqual([d["branch"] for d in self.index.lookup("django")], ["master"])
+
+    def test_index_server(self):
+        self.index.update("github", "foo/bar", "master", bundle(**{
+            "a.txt": "-i https://pypi.example.com/simple/\ndjango"}))
+        self.assertEqual(self.index.lookup("django"), [])
+        self.assertEqual(len(self.index.lookup("django", "https://pypi.example.com/simple/")), 1)
+
+    def test_enqueue_dependents(self):
+        self.index.update("github", "foo/bar", "master", bundle(**{"a.txt": "django"}))
+        self.index.update("github", "foo/bar", "dev", bundle(**{"a.txt": "django"}))
+        self.index.update("gitlab", "baz/qux", "master", bundle(**{"a.txt": "django"}))
+        self.index.update("github", "a/b", "master", bundle(**{"a.txt": "flask"}))
+        queue = JobQueue(os.path.join(self.dir, "jobs.sqlite"))
+        self.addCleanup(queue.close)
+        queue.add(["foo/bar"])
+        queue.release(queue.claim("a"), "a", {"ok": True})
+
+        with patch.object(cache.packages, "delete") as delete:
+            dependents = enqueue_dependents(self.index, queue, "Django", provider="github")
+        delete.assert_called_once_with("django")
+        self.assertEqual([(d["repo"], d["branch"]) for d in dependents],
+                         [("foo/bar", "dev"), ("foo/bar", "master")])
+        self.assertEqual(queue.counts(), {"pending": 1})
+
+        enqueue_dependents(self.index, queue, "django", branch="master")
+        self.assertEqual(queue.counts(), {"pending": 2})
+
+        with patch.object(cache.packages, "delete") as delete:
+            enqueue_dependents(self.index, queue, "Flask_SQLAlchemy")
+        delete.assert_called_once_with("flask-sqlalchemy")
+
+
+class GetIndexTest(TestCase):
+
+    def test_get_index(self):
+        self.assertIsNone(get_index())
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        self.addCleanup(indexes.clear)
+        with patch.object(settings, "cache_dir", os.path.join(cache_dir, "new")):
+            index = get_index()
+            self.assertIs(get_index(), index)
+            self.addCleanup(index.close)
@@ -1,16 +1,19 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import, print_function, unicode_literals
 from unittest import TestCase
-from pyup.providers.github import Provider
+from pyup.providers.github import Provider, clients
 from pyup.requirements import RequirementsBundle
 from pyup import errors
 from github import GithubException, UnknownObjectException
-from mock import Mock, patch, PropertyMock
+from mock import Mock, patch, PropertyMock, ANY
+from datetime import datetime
 
 
 class ProviderTest(TestCase):
 
     def setUp(self):
+        clients.clear()
+        self.addCleanup(clients.clear)
         self.provider = Provider(bundle=Mock())
         self.provider._api = Mock()
         self.repo = Mock()
@@ -54,6 +57,49 @@ class ProviderTest(TestCase):
         prov._api(token2)
         github_mock.assert_called_with(token2, base_url=None, timeout=50, verify=True)
 
+        # switching back to the first token reuses its client
+        self.assertEqual(github_mock.call_count, 2)
+        self.assertEqual(prov._api(token1), github_mock.return_value)
+        self.assertEqual(github_mock.call_count, 2)
+
+    @patch("pyup.providers.github.Github")
+    def test_api_shared_between_providers(self, github_mock):
+        Provider(bundle=RequirementsBundle())._api("foo")
+        Provider(bundle=RequirementsBundle())._api("foo")
+        Provider(bundle=RequirementsBundle(), ignore_ssl=True)._api("foo")
+        self.assertEqual(github_mock.call_count, 2)
+
+    def test_throttle(self):
+        from github import RateLimitExceededException
+        limiter = Mock()
+        prov = Provider(bundle=RequirementsBundle(), limiter=limiter)
+        requester = Mock(rate_limiting=(42, 5000), rate_limiting_resettime=1234)
+        request = requester.requestJsonAndCheck
+        request.side_effect = [RateLimitExceededException(403, ""), "data"]
+        prov._throttle(Mock(_Github__requester=requester), "token")
+
+        self.assertEqual(requester.requestJsonAndCheck("GET", "/foo"), "data")
+        self.assertEqual(request.call_count, 2)
+        self.assertEqual(limiter.wait.call_count, 2)
+        limiter.update.assert_called_with("token", 42, 1234)
+
+        limiter.remaining.return_value = 42
+        self.assertEqual(prov.get_rate_limit("token"), 42)
+
+    def test_connection_per_thread(self):
+        import threading
+        from github import Github
+        client = Github("token")
+        self.provider._throttle(client, "token")
+        requester = client._Github__requester
+        connection = requester._Requester__createConnection()
+
+        connections = []
+        thread = threading.Thread(target=lambda: connections.append(connection.session))
+        thread.start()
+        thread.join()
+        self.assertIsNot(connection.session, connections[0])
+        self.assertIs(connection.session, connection.session)
 
     def test_get_user(self):
         self.provider.get_user("foo")
@@ -131,6 +177,38 @@ class ProviderTest(TestCase):
         with self.assertRaises(errors.BranchExistsError):
             self.provider.create_branch(self.repo, "base branch", "new branch")
 
+    def test_create_branch_with_sha(self):
+        self.provider.create_branch(self.repo, "base branch", "new branch", sha="abc")
+        self.repo.get_git_ref.assert_not_called()
+        self.repo.create_git_ref.assert_called_once_with(ref="refs/heads/new branch", sha="abc")
+
+    def test_get_branch_sha(self):
+        self.repo.get_git_ref().object.sha = "abc"
+        self.assertEqual(self.provider.get_branch_sha(self.repo, "master"), "abc")
+        self.repo.get_git_ref.assert_called_with("heads/master")
+
+        self.repo.get_git_ref.side_effect = UnknownObjectException(data="", status=404)
+        with self.assertRaises(errors.BranchDoesNotExistError):
+            self.provider.get_branch_sha(self.repo, "master")
+
+    def test_iter_branches(self):
+        ref = Mock()
+        ref.ref = "refs/heads/pyup-foo"
+        ref.object.sha = "abc"
+        self.repo.get_git_matching_refs.return_value = [ref]
+        self.assertEqual(
+            list(self.provider.iter_branches(self.repo, "pyup-")), [("pyup-foo", "abc")])
+        self.repo.get_git_matching_refs.assert_called_once_with("heads/pyup-")
+
+    def test_iter_branches_empty_repo(self):
+        self.repo.get_git_matching_refs.side_effect = GithubException(data="", status=409)
+        self.assertEqual(list(self.provider.iter_branches(self.repo, "pyup-")), [])
+
+    def test_is_empty_branch_same_sha(self):
+        self.assertTrue(self.provider.is_empty_branch(
+            self.repo, "master", "pyup-foo", prefix="pyup-", base_sha="abc", head_sha="abc"))
+        self.repo.compare.assert_not_called()
+
     def test_is_empty_branch(self):
         with self.assertRaises(AssertionError):
             self.provider.is_empty_branch(self.repo, "master", "foo", prefix="bar")
@@ -226,32 +304,79 @@ class ProviderTest(TestCase):
     def test_get_pull_request_committer(self):
         committ = Mock()
         committ.committer = "foo"
-        pr = Mock()
+        pr = Mock(head_sha=None)
         self.repo.get_pull().get_commits.return_value = [committ]
         data = self.provider.get_pull_request_committer(self.repo, pr)
         self.assertEqual(data, ["foo"])
 
         self.repo.get_pull.side_effect = UnknownObjectException(data="", status=1)
-        data = self.provider.get_pull_request_committer(self.repo, pr)
+        data = self.provider.get_pull_request_committer(self.repo, Mock(head_sha=None))
         self.assertEqual(data, [])
 
-    def test_close_pull_request(self):
-
-        pr = Mock()
-        pr.head.ref = "bla"
-        self.repo.get_pull.return_value = pr
+    def test_iter_pull_request_committer(self):
+        pr = Mock(head_ref=None, head_sha=None)
+        self.repo.get_pull().head.ref = "pyup-foo"
+        self.repo.get_pull().head.sha = "abc"
+        self.repo.get_pull().get_commits.return_value = [Mock(committer="foo")]
+        self.assertEqual(list(self.provider.iter_pull_request_committer(self.repo, pr)), ["foo"])
+        self.assertEqual(pr.head_ref, "pyup-foo")
+        self.assertEqual(pr.head_sha, "abc")
+
+    @patch("pyup.providers.github.GithubPullRequest")
+    def test_iter_pull_request_committer_known_head(self, pull_request):
+        pull_request().get_commits.return_value = [Mock(committer="foo")]
+        self.repo.get_pull.reset_mock()
+        pr = Mock(head_ref="pyup-foo", head_sha="abc")
+        self.assertEqual(list(self.provider.iter_pull_request_committer(self.repo, pr)), ["foo"])
+        self.assertFalse(self.repo.get_pull.called)
+
+    def test_get_pull_request_head(self):
+        pr = Mock(head_ref=None, head_sha=None)
+        self.repo.get_pull().head.ref = "pyup-foo"
+        self.repo.get_pull().head.sha = "abc"
+        self.provider.get_pull_request_head(self.repo, pr)
+        self.assertEqual(pr.head_ref, "pyup-foo")
+        self.assertEqual(pr.head_sha, "abc")
+
+        pr = Mock(head_ref=None, head_sha=None)
+        self.repo.get_pull.side_effect = UnknownObjectException(data="", status=1)
+        self.provider.get_pull_request_head(self.repo, pr)
+        self.assertEqual(pr.head_sha, None)
+
+    @patch("pyup.providers.github.GitRef")
+    @patch("pyup.providers.github.Issue")
+    def test_close_pull_request(self, issue, git_ref):
+        pr = Mock(head_ref=None)
+        self.repo.get_pull().head.ref = "bla"
         with self.assertRaises(AssertionError):
             self.provider.close_pull_request(self.repo, self.repo, pr, "comment", prefix="pyup-")
 
-        pr.head.ref = "pyup-bla"
+        self.repo.get_pull().head.ref = "pyup-bla"
         self.provider.close_pull_request(self.repo, self.repo, pr, "comment", prefix="pyup-")
-        self.assertEqual(self.repo.get_git_ref().delete.call_count, 1)
+        issue().create_comment.assert_called_once_with("comment")
+        issue().edit.assert_called_once_with(state="closed")
+        self.assertEqual(git_ref().delete.call_count, 1)
 
         self.repo.get_pull.side_effect = UnknownObjectException(data="", status=1)
-        data = self.provider.close_pull_request(self.repo, self.repo, Mock(), "comment",
-                                                prefix="pyup-")
+        data = self.provider.close_pull_request(self.repo, self.repo, Mock(head_ref=None),
+                                                "comment", prefix="pyup-")
         self.assertEqual(data, False)
 
+    @patch("pyup.providers.github.GitRef")
+    @patch("pyup.providers.github.Issue")
+    def test_close_pull_request_listed_head(self, issue, git_ref):
+        self.repo.url = "https://api.github.com/repos/foo/bar"
+        pr = Mock(head_ref="pyup-bla", number=3)
+        self.provider.close_pull_request(self.repo, self.repo, pr, "comment", prefix="pyup-")
+        self.repo.get_pull.assert_not_called()
+        issue.assert_called_with(self.repo._requester, {}, {
+            "url": "https://api.github.com/repos/foo/bar/issues/3", "number": 3},
+            completed=False)
+        git_ref.assert_called_with(self.repo._requester, {}, {
+            "url": "https://api.github.com/repos/foo/bar/git/refs/heads/pyup-bla"},
+            completed=False)
+        git_ref().delete.assert_called_once_with()
+
     def test_create_pull_request_with_exceeding_body(self):
         body = ''.join(["a" for i in range(0, 65536 + 1)])
         self.provider.create_pull_request(self.repo, "title", body, "master", "new", False, [])
@@ -267,18 +392,34 @@ class ProviderTest(TestCase):
         with self.assertRaises(errors.NoPermissionError):
             self.provider.create_pull_request(self.repo, "title", "body", "master", "new", False, [])
 
-    def test_create_pull_request_with_label(self):
+    @patch("pyup.providers.github.Issue")
+    def test_create_pull_request_with_label(self, issue):
         self.provider.create_pull_request(self.repo, "title", "body", "master", "new", "some-label", [])
         self.assertEqual(self.provider.bundle.get_pull_request_class.call_count, 1)
         self.assertEqual(self.provider.bundle.get_pull_request_class().call_count, 1)
+        issue().edit.assert_called_once_with(labels=["some-label"])
 
-    def test_create_pull_request_with_assignees(self):
+    @patch("pyup.providers.github.Issue")
+    def test_create_pull_request_with_assignees(self, issue):
         self.provider.create_pull_request(self.repo, "title", "body", "master", "new",
                                           None, ["some-assignee"])
         self.assertEqual(self.provider.bundle.get_pull_request_class.call_count, 1)
         self.assertEqual(self.provider.bundle.get_pull_request_class().call_count, 1)
-        self.assertEqual(self.repo.get_issue.call_count, 1)
-        self.assertEqual(self.repo.get_issue().edit.call_count, 1)
+        self.repo.get_issue.assert_not_called()
+        issue().edit.assert_called_once_with(assignees=["some-assignee"])
+
+    @patch("pyup.providers.github.Issue")
+    def test_create_pull_request_single_edit(self, issue):
+        pr = self.repo.create_pull()
+        for _ in range(2):
+            self.provider.create_pull_request(self.repo, "title", "body", "master", "new",
+                                              "some-label", ["some-assignee"])
+        issue.assert_called_with(pr._requester, {}, {"url": pr.issue_url, "number": pr.number},
+                                 completed=False)
+        issue().edit.assert_called_with(labels=["some-label"], assignees=["some-assignee"])
+        self.assertEqual(issue().edit.call_count, 2)
+        # the label is only looked up once
+        self.repo.get_label.assert_called_once_with(name="some-label")
 
     def test_create_issue(self):
         self.assertIsNot(self.provider.create_issue(self.repo, "title", "body"), False)
@@ -294,6 +435,28 @@ class ProviderTest(TestCase):
         self.repo.get_issues.return_value = [Mock(), Mock()]
         issues = list(self.provider.iter_issues(self.repo, Mock()))
         self.assertEqual(len(issues), 2)
+        self.repo.get_issues.assert_called_with(creator=ANY)
+
+    def test_iter_issues_with_label(self):
+        self.repo.get_issues.return_value = [Mock()]
+        creator = Mock(login="bot")
+        list(self.provider.iter_issues(self.repo, creator, label="pyup"))
+        self.repo.get_issues.assert_called_with(creator="bot", labels=["pyup"])
+
+        self.provider.integration = True
+        list(self.provider.iter_issues(self.repo, creator, label="pyup"))
+        self.repo.get_issues.assert_called_with(labels=["pyup"])
+
+    def test_iter_issues_since(self):
+        self.repo.get_issues.return_value = []
+        since = datetime(2020, 1, 1)
+        list(self.provider.iter_issues(self.repo, Mock(login="bot"), since=since))
+        self.repo.get_issues.assert_called_with(creator="bot", state="all", since=since)
+
+    def test_create_issue_with_label(self):
+        self.provider.create_issue(self.repo, "title", "body", label="pyup")
+        self.repo.create_issue.assert_called_once_with(
+            title="title", body="body", labels=["pyup"])
 
     def test_get_or_create_label(self):
         self.provider.get_or_create_label(self.repo, "foo-label")
@@ -2,19 +2,23 @@
 from __future__ import absolute_import, print_function, unicode_literals
 from unittest import TestCase
 from unittest import skip
-from pyup.providers.gitlab import Provider
+from pyup.providers.gitlab import Provider, clients, users
 from pyup.requirements import RequirementsBundle
 from pyup.config import Config
 from pyup import errors
 from mock import Mock, MagicMock, patch, PropertyMock, ANY
 from base64 import b64encode
+from datetime import datetime
 
-from gitlab.exceptions import GitlabGetError
+from gitlab.exceptions import GitlabGetError, GitlabCreateError
 
 
 class ProviderTest(TestCase):
 
     def setUp(self):
+        for cache in (clients, users):
+            cache.clear()
+            self.addCleanup(cache.clear)
         self.provider = Provider(bundle=Mock())
         self.provider._api = Mock()
         self.repo = Mock()
@@ -36,7 +40,8 @@ class ProviderTest(TestCase):
     def test_api(self, gitlab_mock):
         prov = Provider(bundle=RequirementsBundle())
         prov._api("foo")
-        gitlab_mock.assert_called_once_with("https://gitlab.com", "foo", ssl_verify=True)
+        gitlab_mock.assert_called_once_with("https://gitlab.com", "foo", ssl_verify=True,
+                                            session=ANY)
 
     @patch("pyup.providers.gitlab.Gitlab")
     def test_api_different_host_in_provider_url(self, gitlab_mock):
@@ -45,18 +50,30 @@ class ProviderTest(TestCase):
 
         prov = Provider(bundle=RequirementsBundle(), url=url)
         prov._api(token)
-        gitlab_mock.assert_called_once_with(url, token, ssl_verify=True)
+        gitlab_mock.assert_called_once_with(url, token, ssl_verify=True, session=ANY)
 
     @patch("pyup.providers.gitlab.Gitlab")
     def test_api_different_host_in_token(self, gitlab_mock):
         prov = Provider(bundle=RequirementsBundle())
         prov._api("foo@localhost")
-        gitlab_mock.assert_called_once_with("localhost", "foo", ssl_verify=True)
+        gitlab_mock.assert_called_once_with("localhost", "foo", ssl_verify=True, session=ANY)
 
     def test_get_user(self):
         self.provider.get_user("foo")
         self.provider._api().auth.assert_called_once_with()
 
+    def test_get_user_cached(self):
+        user = self.provider.get_user("foo")
+        self.assertEqual(Provider(bundle=Mock()).get_user("foo"), user)
+        self.provider._api().auth.assert_called_once_with()
+
+    @patch("pyup.providers.gitlab.Gitlab")
+    def test_api_shared_between_providers(self, gitlab_mock):
+        Provider(bundle=RequirementsBundle())._api("foo")
+        Provider(bundle=RequirementsBundle())._api("foo")
+        Provider(bundle=RequirementsBundle())._api("foo@localhost")
+        self.assertEqual(gitlab_mock.call_count, 2)
+
     def test_get_repo(self):
         self.provider.get_repo("token", "name")
         self.provider._api().projects.get.assert_called_once_with("name")
@@ -85,7 +102,20 @@ class ProviderTest(TestCase):
         self.repo.repository_tree.return_value = mocked_items
         items = list(self.provider.iter_git_tree(self.repo, "some branch"))
         self.repo.repository_tree.assert_called_with(ref="some branch",
-                                                     all=True,
+                                                     as_list=False,
+                                                     per_page=100,
+                                                     pagination="keyset",
+                                                     recursive=True)
+        self.assertEqual(items, [("type", "path")])
+
+    def test_iter_git_tree_without_keyset_pagination(self):
+        mocked_items = [{"type": "type", "path": "path"}]
+        self.repo.repository_tree.side_effect = [
+            GitlabGetError(response_code=405), mocked_items]
+        items = list(self.provider.iter_git_tree(self.repo, "some branch"))
+        self.repo.repository_tree.assert_called_with(ref="some branch",
+                                                     as_list=False,
+                                                     per_page=100,
                                                      recursive=True)
         self.assertEqual(items, [("type", "path")])
 
@@ -110,6 +140,31 @@ class ProviderTest(TestCase):
         self.repo.branches.create.assert_called_with(
             {"branch": "new branch", "ref": "base branch"})
 
+    def test_iter_branches(self):
+        foo = Mock(commit={"id": "abc"})
+        foo.name = "pyup-foo"
+        other = Mock(commit={"id": "def"})
+        other.name = "feature-pyup-bar"
+        self.repo.branches.list.return_value = [foo, other]
+        self.assertEqual(
+            list(self.provider.iter_branches(self.repo, "pyup-")), [("pyup-foo", "abc")])
+        self.repo.branches.list.assert_called_once_with(
+            search="^pyup-", as_list=False, per_page=100)
+
+    def test_get_branch_sha(self):
+        self.repo.branches.get().commit = {"id": "abc"}
+        self.assertEqual(self.provider.get_branch_sha(self.repo, "master"), "abc")
+        self.repo.branches.get.assert_called_with("master")
+
+        self.repo.branches.get.side_effect = GitlabGetError(response_code=404)
+        with self.assertRaises(errors.BranchDoesNotExistError):
+            self.provider.get_branch_sha(self.repo, "master")
+
+    def test_is_empty_branch_same_sha(self):
+        self.assertTrue(self.provider.is_empty_branch(
+            self.repo, "master", "pyup-foo", prefix="pyup-", base_sha="abc", head_sha="abc"))
+        self.repo.repository_compare.assert_not_called()
+
     def test_is_empty_branch(self):
         with self.assertRaises(AssertionError):
             self.provider.is_empty_branch(self.repo, "master", "foo", prefix="bar")
@@ -202,9 +257,20 @@ class ProviderTest(TestCase):
         mr.changes.__getitem__.side_effect = d.__getitem__
         mr.changes.__iter__.side_effect = d.__iter__
         mr.changes.__contains__.side_effect = d.__contains__
+        mr.head_ref = None
         self.provider.close_pull_request(self.repo, self.repo, mr, "comment", prefix="pyup-")
         self.assertEqual(self.repo.branches.get().delete.call_count, 1)
 
+    def test_close_pull_request_listed_head(self):
+        pr = Mock(head_ref="pyup-bla", number=3)
+        self.provider.close_pull_request(self.repo, self.repo, pr, "comment", prefix="pyup-")
+        self.repo.mergerequests.get.assert_called_once_with(3, lazy=True)
+        mr = self.repo.mergerequests.get()
+        mr.save.assert_called_once_with()
+        mr.notes.create.assert_called_once_with({'body': 'comment'})
+        mr.changes.assert_not_called()
+        self.repo.branches.get.assert_called_with("pyup-bla")
+
     def test_merge_pull_request(self):
         mr = Mock()
         mr.merge.return_value = True
@@ -248,14 +314,51 @@ class ProviderTest(TestCase):
         self.provider.create_pull_request(self.repo, "title", "body", "master", "new", "some-label", [], Config())
         self.assertEqual(self.provider.bundle.get_pull_request_class.call_count, 1)
         self.assertEqual(self.provider.bundle.get_pull_request_class().call_count, 1)
+        self.assertEqual(self.repo.mergerequests.create.call_args[0][0]["labels"], "some-label")
+
+    def test_create_pull_request_exists(self):
+        self.repo.mergerequests.create.side_effect = GitlabCreateError(response_code=409)
+        mr = Mock(source_branch="new", target_branch="master")
+        self.repo.mergerequests.list.return_value = [mr]
+        self.provider.create_pull_request(self.repo, "title", "body", "master", "new", False, [],
+                                          Config())
+        self.repo.mergerequests.list.assert_called_once_with(
+            state='opened', source_branch="new", target_branch="master")
+        mr.notes.create.assert_called_once_with({'body': '# title\nbody'})
 
     def test_create_issue(self):
         self.assertIsNot(self.provider.create_issue(self.repo, "title", "body"), False)
 
     def test_iter_issues(self):
         self.repo.mergerequests.list.return_value = [Mock(), Mock()]
-        issues = list(self.provider.iter_issues(self.repo, Mock()))
+        issues = list(self.provider.iter_issues(self.repo, Mock(id=42)))
         self.assertEqual(len(issues), 2)
+        self.repo.mergerequests.list.assert_called_once_with(
+            state='opened', author_id=42, as_list=False, per_page=100)
+
+    def test_iter_issues_head(self):
+        self.repo.mergerequests.list.return_value = [Mock(source_branch="pyup-foo", sha="abc")]
+        list(self.provider.iter_issues(self.repo, Mock(id=42)))
+        _, kwargs = self.provider.bundle.get_pull_request_class().call_args
+        self.assertEqual(kwargs["head_ref"], "pyup-foo")
+        self.assertEqual(kwargs["head_sha"], "abc")
+
+    def test_iter_issues_with_label(self):
+        self.repo.mergerequests.list.return_value = []
+        list(self.provider.iter_issues(self.repo, Mock(id=42), label="pyup"))
+        self.repo.mergerequests.list.assert_called_once_with(
+            state='opened', author_id=42, as_list=False, per_page=100, labels="pyup")
+
+    def test_iter_issues_since(self):
+        self.repo.mergerequests.list.return_value = []
+        list(self.provider.iter_issues(self.repo, Mock(id=42), since=datetime(2020, 1, 1)))
+        self.repo.mergerequests.list.assert_called_once_with(
+            author_id=42, as_list=False, per_page=100, updated_after="2020-01-01T00:00:00")
+
+    def test_create_issue_with_label(self):
+        self.provider.create_issue(self.repo, "title", "body", label="pyup")
+        self.repo.issues.create.assert_called_once_with(
+            {"title": "title", "description": "body", "labels": "pyup"})
 
     @patch("pyup.providers.gitlab.Gitlab")
     def test_ignore_ssl_should_be_default_false(self, gitlab_mock):
@@ -264,7 +367,7 @@ class ProviderTest(TestCase):
 
         self.assertFalse(provider.ignore_ssl)
         gitlab_mock.assert_called_once_with(
-            "https://gitlab.com", "foo", ssl_verify=True)
+            "https://gitlab.com", "foo", ssl_verify=True, session=ANY)
 
     @patch("pyup.providers.gitlab.Gitlab")
     def test_ignore_ssl(self, gitlab_mock):
@@ -274,4 +377,4 @@ class ProviderTest(TestCase):
 
         self.assertTrue(provider.ignore_ssl)
         gitlab_mock.assert_called_once_with(
-            "https://gitlab.com", "foo", ssl_verify=(not ignore_ssl))
+            "https://gitlab.com", "foo", ssl_verify=(not ignore_ssl), session=ANY)
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, print_function, unicode_literals
+from unittest import TestCase
+import json
+import os
+import shutil
+import tempfile
+
+from pyup.jobs import JobQueue
+
+
+class JobQueueTest(TestCase):
+
+    def setUp(self):
+        self.now = 1000
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.path = os.path.join(self.dir, "jobs.sqlite")
+        self.queue = self.open_queue()
+
+    def open_queue(self):
+        queue = JobQueue(self.path, lease=60, clock=lambda: self.now)
+        self.addCleanup(queue.close)
+        return queue
+
+    def test_claim(self):
+        self.queue.add(["foo/bar", "baz/qux"])
+        self.queue.add(["foo/bar"])
+        # a second process working on the same file
+        other = self.open_queue()
+        self.assertEqual(self.queue.claim("a"), "baz/qux")
+        self.assertEqual(other.claim("b"), "foo/bar")
+        self.assertEqual(self.queue.claim("a"), None)
+        self.assertEqual(self.queue.counts(), {"running": 2})
+
+    def test_release(self):
+        self.queue.add(["foo/bar", "baz/qux"])
+        self.queue.release(self.queue.claim("a"), "a", {"ok": True})
+        self.queue.release(self.queue.claim("a"), "a", {"ok": False, "error": "boom"})
+        self.assertEqual(self.queue.counts(), {"done": 1, "failed": 1})
+        result, = self.queue._db.execute("SELECT result FROM jobs WHERE status = 'failed'")
+        self.assertEqual(json.loads(result[0])["error"], "boom")
+
+        self.assertEqual(self.queue.retry_failed(), 1)
+        self.assertEqual(self.queue.claim("b"), "foo/bar")
+
+    def test_requeue(self):
+        self.queue.add(["foo/bar", "baz/qux", "a/b"])
+        self.queue.release(self.queue.claim("a"), "a", {"ok": True})
+        self.queue.release(self.queue.claim("a"), "a", {"ok": False})
+        self.assertEqual(self.queue.claim("a"), "foo/bar")
+        self.queue.requeue(["a/b", "baz/qux", "foo/bar", "new/repo"])
+        self.assertEqual(self.queue.counts(), {"pending": 3, "running": 1})
+
+    def test_expired_lease(self):
+        self.queue.add(["foo/bar"])
+        self.assertEqual(self.queue.claim("a"), "foo/bar")
+        self.now += 50
+        self.queue.heartbeat("a", ["foo/bar"])
+        self.now += 50
+        self.assertEqual(self.queue.claim("b"), None)
+
+        # the first worker died, its lease expires
+        self.now += 61
+        self.assertEqual(self.queue.claim("b"), "foo/bar")
+        # a late release by the first worker doesn't overwrite the new claim
+        self.queue.release("foo/bar", "a", {"ok": True})
+        self.assertEqual(self.queue.counts(), {"running": 1})
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, print_function, unicode_literals
+from unittest import TestCase
+from mock import patch
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import requests_mock
+
+try:
+    from xmlrpc.server import SimpleXMLRPCServer, SimpleXMLRPCRequestHandler
+except ImportError:  # pragma: no cover
+    from SimpleXMLRPCServer import SimpleXMLRPCServer, SimpleXMLRPCRequestHandler
+
+from pyup import settings
+from pyup.mirror import Mirror, get_mirror, mirrors
+from pyup.package import fetch_package
+
+with open(os.path.join(os.path.dirname(os.path.realpath(__file__)),
+                       "data", "pypi-changelog.json")) as f:
+    CHANGELOG = [tuple(event) for event in json.load(f)]
+
+
+class RequestHandler(SimpleXMLRPCRequestHandler):
+    rpc_paths = ("/pypi",)
+
+
+class IndexStandIn(object):
+    """
+    Serves the changelog feed over XML-RPC, in batches of `batch` events like PyPI does.
+    """
+
+    def __init__(self, events, batch=2):
+        self.events = events
+        self.batch = batch
+        self.calls = []
+        self.server = SimpleXMLRPCServer(("127.0.0.1", 0), requestHandler=RequestHandler,
+                                         logRequests=False, allow_none=True)
+        self.server.register_function(self.changelog_last_serial)
+        self.server.register_function(self.changelog_since_serial)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.url = "http://127.0.0.1:{}/pypi".format(self.server.server_address[1])
+
+    def changelog_last_serial(self):
+        return 1000
+
+    def changelog_since_serial(self, serial):
+        self.calls.append(serial)
+        return [event for event in self.events if event[4] > serial][:self.batch]
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class MirrorTest(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.mirror = Mirror(os.path.join(self.dir, "mirror.sqlite"))
+        self.addCleanup(self.mirror.close)
+        self.index = IndexStandIn(CHANGELOG)
+        self.addCleanup(self.index.close)
+
+    def test_sync(self):
+        self.mirror.set_versions("Django", ["1.8", "1.9a1"])
+        self.mirror.set_versions("old-package", ["1.0"])
+        self.assertEqual(self.mirror.serial, None)
+        self.assertEqual(self.mirror.sync(self.index.url), 9)
+        self.assertEqual(self.index.calls, [1000, 1002, 1004, 1006, 1008, 1009])
+        self.assertEqual(self.mirror.serial, 1009)
+        # 1.9 got yanked, 1.8 was yanked and unyanked again
+        self.assertEqual(self.mirror.get_versions("django"), ["1.8"])
+        # only mirrored packages are kept up to date
+        self.assertEqual(self.mirror.get_versions("flask"), None)
+        self.assertEqual(self.mirror.get_versions("old.package"), None)
+
+        self.index.events = CHANGELOG + [("Django", "1.9.1", 1449056000, "new release", 1010)]
+        self.assertEqual(self.mirror.sync(self.index.url), 1)
+        self.assertEqual(self.mirror.get_versions("Django"), ["1.9.1", "1.8"])
+
+    def test_invalid_versions(self):
+        self.mirror.set_versions("foo", ["1.0", "1.0.win32"])
+        self.mirror.apply([("foo", "2004d", 0, "new release", 5),
+                           ("foo", "1.1", 0, "new release", 6)])
+        self.assertEqual(self.mirror.get_versions("foo"), ["1.1", "1.0"])
+        f = io.StringIO()
+        self.mirror.write_dump(f)
+        self.assertEqual(sorted(json.loads(f.getvalue())["packages"]["foo"]), ["1.0", "1.1"])
+
+    def test_dump(self):
+        self.mirror.set_versions("Django", ["1.8", "1.9"])
+        self.mirror.set_versions("empty", [])
+        self.mirror.apply(CHANGELOG[:1])
+        f = io.StringIO()
+        self.mirror.write_dump(f)
+        other = Mirror(os.path.join(self.dir, "other.sqlite"))
+        self.addCleanup(other.close)
+        other.load_dump(io.StringIO(f.getvalue()))
+        self.assertEqual(other.serial, 1001)
+        self.assertEqual(other.get_versions("django"), ["1.9", "1.8"])
+        self.assertEqual(other.get_versions("empty"), [])
+        # picks up where the dump left off
+        other.sync(self.index.url)
+        self.assertEqual(self.index.calls[0], 1001)
+
+
+class FetchPackageMirrorTest(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        patcher = patch.object(settings, "mirror_path", os.path.join(self.dir, "m", "pypi.sqlite"))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(mirrors.clear)
+        self.addCleanup(lambda: get_mirror().close())
+
+    @requests_mock.mock()
+    def test_fetch_package(self, requests):
+        requests.get("https://pypi.org/simple/django/", json={"versions": ["1.8", "1.9"]},
+                     headers={"Content-Type": "application/vnd.pypi.simple.v1+json"})
+        self.assertEqual(fetch_package("Django").versions, ["1.9", "1.8"])
+        self.assertEqual(get_mirror().get_versions("django"), ["1.9", "1.8"])
+        # served from the mirror from now on
+        self.assertEqual(fetch_package("django").versions, ["1.9", "1.8"])
+        self.assertEqual(requests.call_count, 1)
+
+    @requests_mock.mock()
+    def test_index_server(self, requests):
+        requests.get("https://some.foo/root/pypi/Django", json={"result": {"1.8": {}}})
+        fetch_package("Django", "https://some.foo/root/pypi/")
+        fetch_package("Django", "https://some.foo/root/pypi/")
+        self.assertEqual(requests.call_count, 2)
+        self.assertEqual(get_mirror().get_versions("django"), None)
+
+    def test_no_mirror(self):
+        with patch.object(settings, "mirror_path", None):
+            self.assertIsNone(get_mirror())
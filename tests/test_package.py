@@ -3,7 +3,12 @@ from __future__ import absolute_import, print_function, unicode_literals
 from unittest import TestCase
 import requests_mock
 import os
-from pyup.package import fetch_package, Package
+from pyup.package import fetch_package, Package, get_filename_version, get_project_url
+from pyup import cache
+import hashlib
+
+SIMPLE_JSON = {"Content-Type": "application/vnd.pypi.simple.v1+json"}
+
 
 def package_factory(name, versions):
     p = Package(name=name, versions=versions)
@@ -12,6 +17,10 @@ def package_factory(name, versions):
 
 class FetchPackageTestCase(TestCase):
 
+    def setUp(self):
+        cache.hashes.clear()
+        self.addCleanup(cache.hashes.clear)
+
     @requests_mock.mock()
     def test_fetch_package_devpi(self, requests):
         with open(os.path.dirname(os.path.realpath(__file__)) + "/data/django-devpi.json") as f:
@@ -38,14 +47,17 @@ class FetchPackageTestCase(TestCase):
 
     @requests_mock.mock()
     def test_fetch_packages(self, requests):
-        with open(os.path.dirname(os.path.realpath(__file__)) + "/data/django.json") as f:
-            requests.get("https://pypi.org/pypi/Django/json", text=f.read())
+        with open(os.path.dirname(os.path.realpath(__file__)) + "/data/django-simple.json") as f:
+            requests.get("https://pypi.org/simple/django/", text=f.read(), headers=SIMPLE_JSON)
 
         package = fetch_package("Django")
         self.assertNotEqual(package, None)
+        self.assertIn("application/vnd.pypi.simple.v1+json",
+                      requests.last_request.headers["Accept"])
+        # 1.8.6 is yanked, 1.8.5 only partly
         self.assertEqual(
             package.versions,
-            ['1.9rc1', '1.9b1', '1.9a1', '1.8.6', '1.8.5', '1.8.4', '1.8.3', '1.8.2', '1.8.1',
+            ['1.9rc1', '1.9b1', '1.9a1', '1.8.5', '1.8.4', '1.8.3', '1.8.2', '1.8.1',
              '1.8', '1.8c1', '1.8b2', '1.8b1', '1.8a1', '1.7.10', '1.7.9', '1.7.8', '1.7.7',
              '1.7.6', '1.7.5', '1.7.4', '1.7.3', '1.7.2', '1.7.1', '1.7', '1.6.11', '1.6.10',
              '1.6.9', '1.6.8', '1.6.7', '1.6.6', '1.6.5', '1.6.4', '1.6.3', '1.6.2', '1.6.1',
@@ -57,18 +69,101 @@ class FetchPackageTestCase(TestCase):
              '1.2.7', '1.2.6', '1.2.5', '1.2.4', '1.2.3', '1.2.2', '1.2.1', '1.2', '1.1.4',
              '1.1.3', '1.1.2', '1.1.1', '1.1', '1.0.4', '1.0.3', '1.0.2', '1.0.1']
         )
+        # the file hashes are kept for hash-pinned requirements
+        self.assertEqual(cache.hashes.get(("django", "1.8.5")), [
+            {"hash": hashlib.sha256(b"Django-1.8.5-py2.py3-none-any.whl").hexdigest()},
+            {"hash": hashlib.sha256(b"Django-1.8.5.tar.gz").hexdigest()},
+        ])
+
+    @requests_mock.mock()
+    def test_fetch_package_private_index(self, requests):
+        requests.get("https://pypi.example.com/simple/my-package/", headers=SIMPLE_JSON, json={
+            "meta": {"api-version": "1.0"},
+            "name": "my-package",
+            "files": [
+                {"filename": "my_package-1.0.tar.gz", "hashes": {}},
+                {"filename": "my-package-1.1.zip", "hashes": {}, "yanked": "broken"},
+                {"filename": "my_package-2.0rc1-py3-none-any.whl", "hashes": {"sha256": "a"}},
+                {"filename": "my_package-2.0rc1.win32.exe", "hashes": {}},
+            ]
+        })
+        package = fetch_package("my-package", "https://pypi.example.com/simple/")
+        self.assertEqual(package.versions, ["2.0rc1", "1.0"])
+        # hashes are looked up on PyPI
+        self.assertEqual(cache.hashes.get(("my-package", "2.0rc1")), None)
+
+    @requests_mock.mock()
+    def test_fetch_package_invalid_versions(self, requests):
+        requests.get("https://pypi.org/simple/foo/", headers=SIMPLE_JSON, json={
+            "meta": {"api-version": "1.0"},
+            "name": "foo",
+            "files": [
+                {"filename": "foo-1.0.tar.gz", "hashes": {}},
+                {"filename": "foo-1.0.win32.zip", "hashes": {}},
+                {"filename": "foo-1.0.linux-x86_64.tar.gz", "hashes": {}},
+                {"filename": "foo-1.1.linux-x86_64.tar.gz", "hashes": {}},
+            ]
+        })
+        self.assertEqual(fetch_package("foo").versions, ["1.0"])
+
+    @requests_mock.mock()
+    def test_fetch_package_html(self, requests):
+        requests.get("https://pypi.org/simple/django/", headers={"Content-Type": "text/html"},
+                     text="""<!DOCTYPE html><html><body>
+                     <a href="../../packages/Django-1.8.tar.gz#sha256=abc">Django-1.8.tar.gz</a>
+                     <a href="../../packages/Django-1.9.tar.gz#sha256=def" data-yanked="">
+                       Django-1.9.tar.gz</a>
+                     <a href="../../packages/Django-1.7-py2-none-any.whl">
+                       Django-1.7-py2-none-any.whl</a>
+                     </body></html>""")
+        self.assertEqual(fetch_package("Django").versions, ["1.8", "1.7"])
+        self.assertEqual(cache.hashes.get(("django", "1.8")), [{"hash": "abc"}])
+
+    @requests_mock.mock()
+    def test_fetch_package_legacy_json(self, requests):
+        with open(os.path.dirname(os.path.realpath(__file__)) + "/data/django.json") as f:
+            requests.get("https://some.foo/pypi/Django", text=f.read(),
+                         headers={"Content-Type": "application/json"})
+        package = fetch_package("Django", "https://some.foo/pypi/")
+        self.assertEqual(package.versions[:3], ['1.9rc1', '1.9b1', '1.9a1'])
+        self.assertEqual(len(package.versions), 98)
 
     @requests_mock.mock()
     def test_fetch_packages_status_code_not_200(self, requests):
-        requests.get("https://pypi.org/pypi/Django/json", text="ERROR", status_code=500)
+        requests.get("https://pypi.org/simple/django/", text="ERROR", status_code=500)
         self.assertEqual(fetch_package("Django"), None)
 
     @requests_mock.mock()
     def test_fetch_packages_404(self, requests):
-        requests.get("https://pypi.org/pypi/Django/json", text="404", status_code=404)
+        requests.get("https://pypi.org/simple/django/", text="404", status_code=404)
         self.assertEqual(fetch_package("Django"), None)
 
 
+class ProjectUrlTestCase(TestCase):
+
+    def test_get_project_url(self):
+        self.assertEqual(get_project_url("Zope.Interface"),
+                         "https://pypi.org/simple/zope-interface/")
+        self.assertEqual(get_project_url("My_Package", "https://pypi.example.com/simple/"),
+                         "https://pypi.example.com/simple/my-package/")
+        self.assertEqual(get_project_url("My_Package", "https://pypi.example.com/simple"),
+                         "https://pypi.example.com/simple/my-package/")
+        # JSON APIs get the name as it is
+        self.assertEqual(get_project_url("Django", "https://some.foo/root/pypi/"),
+                         "https://some.foo/root/pypi/Django")
+
+
+class FilenameVersionTestCase(TestCase):
+
+    def test_get_filename_version(self):
+        self.assertEqual(get_filename_version("django", "Django-1.8.tar.gz"), "1.8")
+        self.assertEqual(get_filename_version("zope.interface", "zope.interface-4.0.zip"), "4.0")
+        self.assertEqual(get_filename_version("foo-bar", "foo_bar-1.0-py3-none-any.whl"), "1.0")
+        self.assertEqual(get_filename_version("foo-bar", "foo-bar-1.0-beta.tar.gz"), "1.0-beta")
+        self.assertEqual(get_filename_version("foo", "foo-1.0-py2.7.egg"), "1.0")
+        self.assertEqual(get_filename_version("foo", "foo-1.0.win32.exe"), None)
+
+
 class PackageVersionTestCase(TestCase):
     def test_version_normal(self):
         pkg = package_factory("django", ["1.8", "1.7"])
@@ -116,3 +116,14 @@ class PullRequestRequirementTestCase(TestCase):
         flask_prefix = pullrequest_factory(title="Some Prefix | Pin flask")
         self.assertIsNotNone(flask.get_requirement())
         self.assertEqual(flask.get_requirement(), flask_prefix.get_requirement("Some Prefix |"))
+
+
+class PullRequestSerializeTest(TestCase):
+    def test_as_dict(self):
+        pr = pullrequest_factory("Update foo", created_at=datetime(2020, 1, 1))
+        data = pr.as_dict()
+        self.assertEqual(data["created_at"], "2020-01-01T00:00:00")
+        restored = PullRequest.from_dict(data)
+        self.assertEqual(restored, pr)
+        self.assertEqual(restored.title, "Update foo")
+        self.assertTrue(restored.is_open)
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, print_function, unicode_literals
+from unittest import TestCase
+from pyup.providers.ratelimit import RateLimiter, RateLimitedSession
+from mock import Mock, patch
+
+
+class RateLimiterTest(TestCase):
+
+    def setUp(self):
+        self.sleep = Mock()
+        self.limiter = RateLimiter(reserve=5, pace_below=100, clock=lambda: 1000,
+                                   sleep=self.sleep)
+
+    def test_unknown_budget(self):
+        self.assertEqual(self.limiter.remaining("token"), None)
+        self.limiter.wait("token")
+        self.sleep.assert_not_called()
+
+    def test_update_from_headers(self):
+        self.limiter.update_from_headers("github", {
+            "X-RateLimit-Remaining": "4999", "X-RateLimit-Reset": "2000"})
+        self.limiter.update_from_headers("gitlab", {
+            "RateLimit-Remaining": "599", "RateLimit-Reset": "2000"})
+        self.limiter.update_from_headers("other", {})
+        self.assertEqual(self.limiter.remaining("github"), 4999)
+        self.assertEqual(self.limiter.remaining("gitlab"), 599)
+        self.assertEqual(self.limiter.remaining("other"), None)
+
+    def test_reset_passed(self):
+        self.limiter.update("token", 0, 999)
+        self.assertEqual(self.limiter.remaining("token"), None)
+        self.limiter.wait("token")
+        self.sleep.assert_not_called()
+
+    def test_plenty_left(self):
+        self.limiter.update("token", 1000, 2000)
+        self.limiter.wait("token")
+        self.sleep.assert_not_called()
+
+    def test_pacing(self):
+        self.limiter.update("token", 55, 1500)
+        self.limiter.wait("token")
+        self.sleep.assert_called_once_with(10)
+
+    def test_exhausted(self):
+        self.limiter.update("token", 5, 1500)
+        self.limiter.wait("token")
+        self.sleep.assert_called_once_with(501)
+        # the budget is unknown until the next response comes in
+        self.assertEqual(self.limiter.remaining("token"), None)
+
+
+class RateLimitedSessionTest(TestCase):
+
+    @patch("requests.Session.send")
+    def test_send(self, send):
+        send.return_value = Mock(headers={"RateLimit-Remaining": "10", "RateLimit-Reset": "1"})
+        limiter = Mock()
+        session = RateLimitedSession(limiter, "token")
+        self.assertEqual(session.send("request"), send.return_value)
+        limiter.wait.assert_called_once_with("token")
+        limiter.update_from_headers.assert_called_once_with(
+            "token", send.return_value.headers)
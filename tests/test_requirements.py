@@ -4,7 +4,9 @@ from unittest import TestCase
 from pyup.requirements import Requirement
 from mock import patch, PropertyMock, Mock
 from pyup.requirements import RequirementFile, RequirementsBundle
-from .test_package import package_factory
+from pyup.updates import RequirementUpdate
+from pyup import cache
+from .test_package import package_factory, SIMPLE_JSON
 import requests_mock
 import os
 
@@ -478,6 +480,11 @@ class RequirementUpdateContent(TestCase):
 
 class RequirementTestCase(TestCase):
 
+    def setUp(self):
+        for store in (cache.packages, cache.vulnerabilities):
+            store.clear()
+            self.addCleanup(store.clear)
+
     @patch("pyup.requirements.Requirement.package", return_value="pkg")
     def test_is_outdated(self, _):
         with patch('pyup.requirements.Requirement.latest_version_within_specs',
@@ -838,8 +845,8 @@ class RequirementTestCase(TestCase):
 
     @requests_mock.mock()
     def test_package_found(self, requests):
-        with open(os.path.dirname(os.path.realpath(__file__)) + "/data/django.json") as f:
-            requests.get("https://pypi.org/pypi/Django/json", text=f.read())
+        with open(os.path.dirname(os.path.realpath(__file__)) + "/data/django-simple.json") as f:
+            requests.get("https://pypi.org/simple/django/", text=f.read(), headers=SIMPLE_JSON)
         r = Requirement.parse("Django==1.9rc1", 0)
         self.assertEqual(r._fetched_package, False)
         self.assertEqual(r._package, None)
@@ -849,9 +856,30 @@ class RequirementTestCase(TestCase):
         self.assertEqual(r._fetched_package, True)
         self.assertNotEqual(r._package, None)
 
+    @requests_mock.mock()
+    def test_package_shared(self, requests):
+        with open(os.path.dirname(os.path.realpath(__file__)) + "/data/django-simple.json") as f:
+            requests.get("https://pypi.org/simple/django/", text=f.read(), headers=SIMPLE_JSON)
+        first = Requirement.parse("Django==1.9rc1", 0).package
+        second = Requirement.parse("Django>=1.8", 0).package
+        self.assertEqual(requests.call_count, 1)
+        self.assertEqual(first.versions, second.versions)
+
+        requests.get("https://pypi.org/simple/fango/", text="404", status_code=404)
+        self.assertEqual(Requirement.parse("Fango", 0).package, None)
+        self.assertEqual(Requirement.parse("Fango", 0).package, None)
+        self.assertEqual(requests.call_count, 2)
+
+        # other spellings of the same project share the entry
+        requests.get("https://pypi.org/simple/zope-interface/", headers=SIMPLE_JSON,
+                     json={"versions": ["5.0"], "files": []})
+        self.assertEqual(Requirement.parse("zope.interface", 0).package.versions, ["5.0"])
+        self.assertEqual(Requirement.parse("Zope_Interface", 0).package.versions, ["5.0"])
+        self.assertEqual(requests.call_count, 3)
+
     @requests_mock.mock()
     def test_package_not_found(self, requests):
-        requests.get("https://pypi.org/pypi/Fango/json", text="404", status_code=404)
+        requests.get("https://pypi.org/simple/fango/", text="404", status_code=404)
         r = Requirement.parse("Fango", 0)
         self.assertEqual(r._fetched_package, False)
         self.assertEqual(r._package, None)
@@ -887,9 +915,24 @@ class RequirementTestCase(TestCase):
             packages=(r,)
         )
 
+    @patch("pyup.requirements.safety")
+    @patch("pyup.requirements.settings")
+    def test_is_insecure_shared(self, settings, safety):
+        settings.api_key = "foo"
+        safety.check.return_value = [Mock()]
+        self.assertTrue(Requirement.parse("Django==1.9", 0).is_insecure)
+        self.assertTrue(Requirement.parse("Django==1.9", 0).is_insecure)
+        self.assertEqual(safety.check.call_count, 1)
+
+        safety.check.return_value = []
+        self.assertFalse(Requirement.parse("Django==1.10", 0).is_insecure)
+        self.assertEqual(safety.check.call_count, 2)
+
     @requests_mock.mock()
     @patch("pyup.requirements.settings")
     def test_changelogs(self, requests, settings):
+        cache.changelogs.clear()
+        self.addCleanup(cache.changelogs.clear)
         # test that the api is not called if the api key is not set
         settings.api_key = None
         r = Requirement.parse("pyupio", 0)
@@ -906,10 +949,36 @@ class RequirementTestCase(TestCase):
             log = r.changelog
             self.assertEqual(len(log), 6)
 
+    @requests_mock.mock()
+    @patch("pyup.requirements.settings")
+    def test_changelog_store(self, requests, settings):
+        cache.changelogs.clear()
+        self.addCleanup(cache.changelogs.clear)
+        settings.api_key = "foo"
+        url = "https://pyup.io/api/v1/changelogs/pyupio/"
+        with open(os.path.dirname(os.path.realpath(__file__)) + "/data/pyup-changelog.json") as f:
+            requests.get(url, text=f.read(), headers={"ETag": '"abc"'})
+
+        r = Requirement.parse("pyupio", 0)
+        releases = r.fetch_changelog()
+        self.assertEqual(releases[0][0], "0.7.0")
+        # fresh entries are served from the store
+        self.assertEqual(Requirement.parse("pyupio", 0).fetch_changelog(), releases)
+        self.assertEqual(requests.call_count, 1)
+
+        # expired entries are revalidated with the stored ETag
+        entry = cache.changelogs.get_entry("pyupio")
+        entry["stored_at"] -= cache.changelogs.ttl
+        requests.get(url, status_code=304)
+        self.assertEqual(Requirement.parse("pyupio", 0).fetch_changelog(), releases)
+        self.assertEqual(requests.call_count, 2)
+        self.assertEqual(requests.last_request.headers["If-None-Match"], '"abc"')
+        self.assertTrue(cache.changelogs.is_fresh(cache.changelogs.get_entry("pyupio")))
+
     @requests_mock.mock()
     def test_needs_update(self, requests):
-        with open(os.path.dirname(os.path.realpath(__file__)) + "/data/django.json") as f:
-            requests.get("https://pypi.org/pypi/Django/json", text=f.read())
+        with open(os.path.dirname(os.path.realpath(__file__)) + "/data/django-simple.json") as f:
+            requests.get("https://pypi.org/simple/django/", text=f.read(), headers=SIMPLE_JSON)
 
             # is pinned and on latest
             r = Requirement.parse("Django==1.9rc1", 0)
@@ -1232,6 +1301,23 @@ class RequirementsBundleTestCase(TestCase):
         reqs.append(RequirementFile(path="foo.txt", content=''))
         self.assertEqual(reqs[0].path, "foo.txt")
 
+    @patch("pyup.requirements.Requirement.package", return_value="pkg")
+    @patch("pyup.requirements.Requirement.latest_version_within_specs",
+           new_callable=PropertyMock, return_value="1.10")
+    def test_as_dict(self, *_):
+        reqs = RequirementsBundle()
+        reqs.append(RequirementFile(path="foo.txt", content='Django==1.9\nflask'))
+        reqs[0].requirements[0].pull_request = Mock(url="https://example.com/pr/1")
+        self.assertEqual(reqs.as_dict(), {"files": [{
+            "path": "foo.txt",
+            "requirements": [
+                {"name": "Django", "specs": "==1.9", "latest_version_within_specs": "1.10",
+                 "pull_request": "https://example.com/pr/1"},
+                {"name": "flask", "specs": "", "latest_version_within_specs": "1.10",
+                 "pull_request": None},
+            ],
+        }]})
+
     def test_get_initial_update_class(self):
         req = RequirementsBundle()
         klass = req.get_update_class(
@@ -1287,3 +1373,30 @@ class RequirementsBundleTestCase(TestCase):
                 [r for r in reqs.requirements]
             )
 
+    def test_resolve_hashes(self):
+        cache.hashes.clear()
+        self.addCleanup(cache.hashes.clear)
+        with patch('pyup.requirements.Requirement.latest_version_within_specs',
+                   new_callable=PropertyMock,
+                   return_value="1.4.2"), \
+                patch('pyup.requirements.Requirement.package', return_value=Mock()), \
+                patch('pyup.requirements.Requirement.fetch_hashes',
+                      return_value=[{"hash": "123"}]) as fetch_hashes:
+            reqs = RequirementsBundle()
+            req_file = RequirementFile(
+                path="r.txt", content="alembic==0.8.9 \\\n    --hash=sha256:abcde\nfoo==1.0")
+            updates = [
+                RequirementUpdate(requirement_file=req_file, requirement=req, commit_message="")
+                for req in req_file.requirements
+            ]
+            # the same package/version pair in a second file is only fetched once
+            updates.append(updates[0])
+            reqs.resolve_hashes(updates)
+
+            fetch_hashes.assert_called_once_with("1.4.2")
+            self.assertEqual(cache.hashes.get(("alembic", "1.4.2")), [{"hash": "123"}])
+
+            # served from the cache from now on
+            self.assertEqual(updates[0].requirement.get_hashes("1.4.2"), [{"hash": "123"}])
+            reqs.resolve_hashes(updates)
+            self.assertEqual(fetch_hashes.call_count, 1)
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, print_function, unicode_literals
+from unittest import TestCase
+from mock import Mock
+import json
+import os
+import shutil
+import socket
+import tempfile
+import threading
+
+try:
+    from http.client import HTTPConnection
+except ImportError:  # pragma: no cover
+    from httplib import HTTPConnection
+
+from pyup.server import make_server
+from pyup.requirements import RequirementsBundle
+
+
+class ServerTest(TestCase):
+
+    def setUp(self):
+        self.bots = []
+
+    def create_bot(self, job):
+        bot = Mock(skipped=False, postponed=[])
+        bot.update.return_value = RequirementsBundle()
+        if job["repo"] == "broken/repo":
+            bot.update.side_effect = ValueError("broken")
+        self.bots.append((job, bot))
+        return bot
+
+    def start(self, **kwargs):
+        server = make_server(self.create_bot, **kwargs)
+        thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05})
+        thread.daemon = True
+        thread.start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server
+
+    def request(self, server, method, path, body=None):
+        connection = HTTPConnection("127.0.0.1", server.server_port)
+        self.addCleanup(connection.close)
+        connection.request(method, path, body=json.dumps(body) if body is not None else None)
+        response = connection.getresponse()
+        return response.status, json.loads(response.read().decode("utf-8"))
+
+    def test_update(self):
+        server = self.start(port=0)
+        status, result = self.request(server, "POST", "/update", {
+            "repo": "foo/bar", "branch": "master", "initial": True, "ignored": 1})
+        self.assertEqual(status, 200)
+        self.assertEqual(result["repo"], "foo/bar")
+        self.assertEqual(result["ok"], True)
+        self.assertEqual(result["files"], [])
+        job, bot = self.bots[0]
+        bot.update.assert_called_once_with(branch="master", initial=True)
+
+    def test_failed_update(self):
+        server = self.start(port=0)
+        status, result = self.request(server, "POST", "/update", {"repo": "broken/repo"})
+        self.assertEqual(status, 500)
+        self.assertEqual(result["error"], "ValueError: broken")
+
+    def test_busy_repo_keeps_no_slot(self):
+        release = threading.Event()
+
+        def update(**kwargs):
+            release.wait(5)
+            return RequirementsBundle()
+
+        def create_bot(job):
+            bot = self.create_bot(job)
+            if job["repo"] == "slow/repo":
+                bot.update.side_effect = update
+            return bot
+
+        server = make_server(create_bot, port=0, workers=2)
+        self.addCleanup(server.server_close)
+        threads = [threading.Thread(target=server.run_job, args=({"repo": "slow/repo"},))
+                   for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        # the queued jobs of slow/repo wait for its lock, not for a slot
+        other = threading.Thread(target=server.run_job, args=({"repo": "foo/bar"},))
+        other.start()
+        other.join(2)
+        self.assertFalse(other.is_alive())
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(self.bots), 4)
+        self.assertEqual(server._repo_locks, {})
+
+    def test_bad_requests(self):
+        server = self.start(port=0)
+        self.assertEqual(self.request(server, "POST", "/update", {"branch": "master"})[0], 400)
+        self.assertEqual(self.request(server, "POST", "/update", ["foo"])[0], 400)
+        self.assertEqual(self.request(server, "POST", "/other", {"repo": "foo/bar"})[0], 404)
+        self.assertEqual(self.request(server, "GET", "/health"), (200, {"ok": True}))
+        self.assertEqual(self.bots, [])
+
+    def test_unix_socket(self):
+        path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, path)
+        socket_path = os.path.join(path, "pyup.sock")
+        self.start(socket_path=socket_path)
+
+        body = json.dumps({"repo": "foo/bar"}).encode("utf-8")
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.addCleanup(client.close)
+        client.connect(socket_path)
+        client.sendall(
+            b"POST /update HTTP/1.0\r\nContent-Length: " + str(len(body)).encode("ascii") +
+            b"\r\n\r\n" + body)
+        response = b""
+        while True:
+            data = client.recv(4096)
+            if not data:
+                break
+            response += data
+        head, _, body = response.partition(b"\r\n\r\n")
+        self.assertIn(b" 200 ", head.split(b"\r\n")[0])
+        self.assertEqual(json.loads(body.decode("utf-8"))["repo"], "foo/bar")
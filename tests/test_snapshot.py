@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, print_function, unicode_literals
+from unittest import TestCase
+from mock import Mock, patch
+import json
+import os
+import shutil
+import tempfile
+import requests_mock
+
+from pyup import settings, cache
+from pyup.bot import DryBot
+from pyup.errors import SnapshotMissError
+from pyup.requirements import RequirementFile, Requirement
+from pyup.snapshot import Snapshot, get_snapshot, from_snapshot, snapshots
+from .test_bot import bot_factory
+
+SNAPSHOT = {
+    "packages": {"django": ["1.9", "1.8"], "nope": None},
+    "hashes": {"django==1.9": [{"hash": "123"}]},
+    "changelogs": {"django": [["1.9", "Changes"], ["1.8", "Old changes"]]},
+    "vulnerabilities": {"django==1.8": True},
+}
+
+
+class SnapshotTest(TestCase):
+
+    def test_lookup(self):
+        snapshot = Snapshot(SNAPSHOT)
+        fetch = Mock()
+        self.assertEqual(snapshot.lookup("packages", "django", fetch), ["1.9", "1.8"])
+        self.assertEqual(snapshot.lookup("packages", "nope", fetch), None)
+        with self.assertRaises(SnapshotMissError) as e:
+            snapshot.lookup("hashes", "django==1.8", fetch)
+        self.assertEqual(e.exception.section, "hashes")
+        self.assertFalse(fetch.called)
+
+    def test_record(self):
+        path = os.path.join(tempfile.mkdtemp(), "snapshot.json")
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+        snapshot = Snapshot.load(path, record=True)
+        self.assertEqual(snapshot.lookup("packages", "flask", lambda: ["1.0"]), ["1.0"])
+        self.assertEqual(snapshot.lookup("packages", "flask", Mock()), ["1.0"])
+        snapshot.save(path)
+        self.assertEqual(Snapshot.load(path).lookup("packages", "flask", None), ["1.0"])
+
+    def test_no_snapshot(self):
+        self.assertIsNone(get_snapshot())
+        self.assertEqual(from_snapshot("packages", "django", lambda: ["1.0"]), ["1.0"])
+
+
+class OfflineRunTest(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        path = os.path.join(self.dir, "snapshot.json")
+        with open(path, "w") as f:
+            json.dump(SNAPSHOT, f)
+        for name, value in (("snapshot_path", path), ("api_key", "key"), ("cache_dir", None)):
+            patcher = patch.object(settings, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(snapshots.clear)
+        self.addCleanup(cache.hashes.clear)
+
+    def run_bot(self, content):
+        bot = bot_factory(bot_class=DryBot)
+        bot.provider.get_file.return_value = None, None
+        bot.provider.iter_git_tree.return_value = [("blob", "requirements.txt")]
+        bot.provider.get_requirement_file.return_value = RequirementFile(
+            "requirements.txt", content)
+        bot.update(branch="base_branch")
+        return bot
+
+    @requests_mock.mock()
+    def test_update(self, requests):
+        bot = self.run_bot("django==1.8 --hash=sha256:abc\nnope==1.0")
+        requirement, = bot.req_bundle.requirements
+        self.assertEqual(requirement.latest_version_within_specs, "1.9")
+        self.assertTrue(requirement.is_insecure)
+        self.assertEqual(list(requirement.changelog.items()), [("1.9", "Changes")])
+        self.assertEqual(requirement.get_hashes("1.9"), [{"hash": "123"}])
+        self.assertFalse(requests.called)
+
+    @requests_mock.mock()
+    def test_miss(self, requests):
+        with self.assertRaises(SnapshotMissError):
+            self.run_bot("flask==1.0")
+        self.assertFalse(requests.called)
+
+    @requests_mock.mock()
+    def test_record_package(self, requests):
+        requests.get("https://pypi.org/simple/zope-interface/", json={"versions": ["5.0"]},
+                     headers={"Content-Type": "application/vnd.pypi.simple.v1+json"})
+        cache.packages.clear()
+        self.addCleanup(cache.packages.clear)
+        with patch.object(settings, "record_snapshot", True):
+            snapshots.clear()
+            self.assertEqual(Requirement.parse("Zope_Interface", 0).package.versions, ["5.0"])
+        # recorded once, under the normalized name
+        packages = get_snapshot().data["packages"]
+        self.assertEqual([key for key in packages if "zope" in key], ["zope-interface"])
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, print_function, unicode_literals
+from unittest import TestCase
+from pyup.webhooks import parse_push_event, NULL_SHA
+
+
+def push_payload(**kwargs):
+    payload = {
+        "ref": "refs/heads/master",
+        "before": "a" * 40,
+        "after": "b" * 40,
+        "commits": [
+            {"added": ["requirements/dev.txt"], "modified": ["setup.py"], "removed": []},
+            {"added": [], "modified": ["requirements.txt"], "removed": ["old.txt"]},
+        ],
+    }
+    payload.update(kwargs)
+    return payload
+
+
+class ParsePushEventTest(TestCase):
+
+    def test_github(self):
+        event = parse_push_event(push_payload(forced=False))
+        self.assertEqual(event.branch, "master")
+        self.assertEqual(event.before, "a" * 40)
+        self.assertEqual(event.after, "b" * 40)
+        self.assertEqual(event.paths, {
+            "requirements/dev.txt", "setup.py", "requirements.txt", "old.txt"})
+
+    def test_gitlab(self):
+        event = parse_push_event(push_payload(total_commits_count=2))
+        self.assertEqual(len(event.paths), 4)
+
+    def test_gitlab_truncated_commits(self):
+        self.assertIsNone(parse_push_event(push_payload(total_commits_count=21)).paths)
+
+    def test_forced(self):
+        self.assertIsNone(parse_push_event(push_payload(forced=True)).paths)
+
+    def test_new_branch(self):
+        self.assertIsNone(parse_push_event(push_payload(before=NULL_SHA)).paths)
+
+    def test_no_commits(self):
+        self.assertEqual(parse_push_event(push_payload(commits=[])).paths, set())
+
+    def test_tag(self):
+        self.assertIsNone(parse_push_event(push_payload(ref="refs/tags/1.0")))
+        self.assertIsNone(parse_push_event({}))